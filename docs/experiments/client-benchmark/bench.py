@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Memobase client benchmark: many concurrent users against one server.
+
+Every simulated user creates itself, then repeats insert -> context -> profile.
+Prints throughput and latency percentiles of each call, so connection-pool,
+HTTP/2 and retry settings of the SDK clients can be compared.
+"""
+
+import time
+import uuid
+import asyncio
+import argparse
+import threading
+import statistics
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from memobase import MemoBaseClient, AsyncMemoBaseClient, ChatBlob
+
+MESSAGES = [
+    {"role": "user", "content": "I'm planning a trip to Kyoto next spring."},
+    {
+        "role": "assistant",
+        "content": "Nice! Cherry blossom season is busy, book early.",
+    },
+]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, op: str, start: float, error: Exception = None):
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            if error is not None:
+                self.errors[op] += 1
+            else:
+                self.latencies[op].append(elapsed)
+
+    def report(self, elapsed: float):
+        total = sum(len(v) for v in self.latencies.values())
+        print(f"{total} calls in {elapsed:.2f}s, {total / elapsed:.1f} calls/s")
+        print(f"{'op':<10}{'count':>8}{'errors':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for op in sorted(set(self.latencies) | set(self.errors)):
+            values = self.latencies[op]
+            if len(values) > 1:
+                q = statistics.quantiles(values, n=100)
+                p50, p95, p99 = q[49], q[94], q[98]
+            else:
+                p50 = p95 = p99 = values[0] if values else 0.0
+            print(
+                f"{op:<10}{len(values):>8}{self.errors[op]:>8}"
+                f"{p50:>9.1f}ms{p95:>8.1f}ms{p99:>8.1f}ms"
+            )
+
+
+def client_options(args) -> dict:
+    return dict(
+        api_key=args.api_key,
+        project_url=args.project_url,
+        max_connections=args.max_connections,
+        max_keepalive_connections=args.max_keepalive_connections,
+        http2=args.http2,
+        max_retries=args.max_retries,
+    )
+
+
+def run_sync_user(client: MemoBaseClient, recorder: Recorder, rounds: int):
+    def timed(op, fn):
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            recorder.record(op, start, e)
+        else:
+            recorder.record(op, start)
+
+    user_id = str(uuid.uuid4())
+    timed("create", lambda: client.get_or_create_user(user_id))
+    u = client.get_user(user_id, no_get=True)
+    for _ in range(rounds):
+        timed("insert", lambda: u.insert(ChatBlob(messages=MESSAGES)))
+        timed("context", lambda: u.context(max_token_size=500))
+        timed("profile", lambda: u.profile())
+    timed("delete", lambda: client.delete_user(user_id))
+
+
+async def run_async_user(client: AsyncMemoBaseClient, recorder: Recorder, rounds: int):
+    async def timed(op, coro):
+        start = time.perf_counter()
+        try:
+            await coro
+        except Exception as e:
+            recorder.record(op, start, e)
+        else:
+            recorder.record(op, start)
+
+    user_id = str(uuid.uuid4())
+    await timed("create", client.get_or_create_user(user_id))
+    u = await client.get_user(user_id, no_get=True)
+    for _ in range(rounds):
+        await timed("insert", u.insert(ChatBlob(messages=MESSAGES)))
+        await timed("context", u.context(max_token_size=500))
+        await timed("profile", u.profile())
+    await timed("delete", client.delete_user(user_id))
+
+
+def bench_sync(args) -> tuple[Recorder, float]:
+    recorder = Recorder()
+    with MemoBaseClient(**client_options(args)) as client:
+        assert client.ping(), "Memobase server is not reachable"
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.users) as pool:
+            for _ in range(args.users):
+                pool.submit(run_sync_user, client, recorder, args.rounds)
+        return recorder, time.perf_counter() - start
+
+
+async def bench_async(args) -> tuple[Recorder, float]:
+    recorder = Recorder()
+    async with AsyncMemoBaseClient(**client_options(args)) as client:
+        assert await client.ping(), "Memobase server is not reachable"
+        start = time.perf_counter()
+        await asyncio.gather(
+            *[run_async_user(client, recorder, args.rounds) for _ in range(args.users)]
+        )
+        return recorder, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--project-url", default="http://localhost:8019")
+    parser.add_argument("--api-key", default="secret")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--max-connections", type=int, default=100)
+    parser.add_argument("--max-keepalive-connections", type=int, default=20)
+    parser.add_argument("--max-retries", type=int, default=2)
+    parser.add_argument("--http2", action="store_true")
+    parser.add_argument(
+        "--sync", action="store_true", help="Use threads and MemoBaseClient"
+    )
+    args = parser.parse_args()
+
+    if args.sync:
+        recorder, elapsed = bench_sync(args)
+    else:
+        recorder, elapsed = asyncio.run(bench_async(args))
+    recorder.report(elapsed)
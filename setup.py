@@ -41,4 +41,5 @@ setuptools.setup(
     ],
     python_requires=">=3.11",
     install_requires=deps,
+    extras_require={"http2": ["httpx[http2]"]},
 )
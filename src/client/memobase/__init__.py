@@ -2,6 +2,7 @@ from .core.entry import MemoBaseClient, User, ChatBlob
 from .core.blob import SummaryBlob
 from .core.entry import MemoBaseClient as Memobase
 from .core.async_entry import AsyncMemoBaseClient, AsyncUser
+from .core.batch import BatchInserter, AsyncBatchInserter
 
 __author__ = "memobase.io"
 __version__ = "0.0.27"
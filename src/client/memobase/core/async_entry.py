@@ -1,14 +1,26 @@
 import os
 import json
+import time
 import httpx
 from collections import defaultdict
-from typing import Optional, Literal
+from typing import Optional, Literal, Iterable, AsyncIterator
 from pydantic import HttpUrl, ValidationError
 from dataclasses import dataclass
 from urllib.parse import quote_plus
 from .blob import BlobData, Blob, BlobType, ChatBlob, OpenAICompatibleMessage
 from .user import UserProfile, UserProfileData, UserEventData, UserEventGistData
-from ..network import unpack_response
+from .cache import ContextCache, KnownUsers
+from ..network import (
+    unpack_response,
+    export_params,
+    aiter_ndjson,
+    andjson_chunks,
+    NDJSON_HEADERS,
+    request_timeout,
+    require_http2,
+    RetryPolicy,
+    AsyncRetryTransport,
+)
 from ..error import ServerError
 from ..utils import LOG
 
@@ -30,6 +42,16 @@ class AsyncMemoBaseClient:
     api_key: Optional[str] = None
     api_version: str = "api/v1"
     project_url: str = "https://api.memobase.dev"
+    context_cache_ttl: Optional[float] = None
+    context_cache_max_items: int = 1000
+    known_users_max_size: int = 10000
+    timeout: float = 60
+    max_connections: Optional[int] = 100
+    max_keepalive_connections: Optional[int] = 20
+    keepalive_expiry: Optional[float] = 30
+    http2: bool = False
+    max_retries: int = 2
+    retry_backoff: float = 0.5
 
     def __post_init__(self):
         self.api_key = self.api_key or os.getenv("MEMOBASE_API_KEY")
@@ -38,18 +60,43 @@ class AsyncMemoBaseClient:
         ), "api_key of memobase client is required, pass it as argument or set it as environment variable(MEMOBASE_API_KEY)"
         self.base_url = str(HttpUrl(self.project_url)) + self.api_version.strip("/")
 
+        if self.http2:
+            require_http2()
+        transport = httpx.AsyncHTTPTransport(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+        )
         self._client = httpx.AsyncClient(
             base_url=self.base_url,
             headers={
                 "Authorization": f"Bearer {self.api_key}",
             },
-            timeout=60,
+            timeout=self.timeout,
+            transport=AsyncRetryTransport(
+                transport, RetryPolicy(self.max_retries, self.retry_backoff)
+            ),
+        )
+        # Opt-in, contexts are only cached when a TTL is given
+        self._context_cache = (
+            ContextCache(self.context_cache_ttl, self.context_cache_max_items)
+            if self.context_cache_ttl
+            else None
         )
+        # Users confirmed or created by this client, get_or_create_user skips them
+        self._known_users = KnownUsers(self.known_users_max_size)
 
     @property
     def client(self) -> httpx.AsyncClient:
         return self._client
 
+    def request_timeout(self, seconds: float):
+        """Override `timeout` for the calls made inside the block, e.g. `with client.request_timeout(5): ...`"""
+        return request_timeout(seconds)
+
     async def ping(self) -> bool:
         try:
             unpack_response(await self._client.get("/healthcheck"))
@@ -65,6 +112,11 @@ class AsyncMemoBaseClient:
         r = unpack_response(await self._client.get("/project/billing"))
         return r.data
 
+    def drop_cached_context(self, user_id: str):
+        """Forget the cached contexts of a user whose memory changed elsewhere"""
+        if self._context_cache is not None:
+            self._context_cache.invalidate(user_id)
+
     async def get_config(self) -> str:
         r = unpack_response(await self._client.get("/project/profile_config"))
         return r.data["profile_config"]
@@ -81,6 +133,7 @@ class AsyncMemoBaseClient:
         r = unpack_response(
             await self._client.post("/users", json={"data": data, "id": id})
         )
+        self._known_users.add(r.data["id"])
         return r.data["id"]
 
     async def update_user(self, user_id: str, data: dict = None) -> str:
@@ -92,6 +145,7 @@ class AsyncMemoBaseClient:
     async def get_user(self, user_id: str, no_get=False) -> "AsyncUser":
         if not no_get:
             r = unpack_response(await self._client.get(f"/users/{user_id}"))
+            self._known_users.add(user_id)
             return AsyncUser(
                 user_id=user_id,
                 project_client=self,
@@ -100,14 +154,28 @@ class AsyncMemoBaseClient:
         return AsyncUser(user_id=user_id, project_client=self)
 
     async def get_or_create_user(self, user_id: str) -> "AsyncUser":
+        """Returns the user, creating it if it's not known yet.
+
+        Users this client already knows are returned without their fields and
+        without a request.
+        """
+        if user_id in self._known_users:
+            return AsyncUser(user_id=user_id, project_client=self)
         try:
+            # Create-if-absent on the server, it answers with the stored user
+            r = unpack_response(
+                await self._client.post("/users", json={"data": None, "id": user_id})
+            )
+        except (ServerError, httpx.HTTPStatusError):
+            # Servers before idempotent creation reject existing ids
             return await self.get_user(user_id)
-        except ServerError:
-            await self.add_user(id=user_id)
-        return AsyncUser(user_id=user_id, project_client=self)
+        self._known_users.add(user_id)
+        return AsyncUser(user_id=user_id, project_client=self, fields=r.data)
 
     async def delete_user(self, user_id: str) -> bool:
         r = unpack_response(await self._client.delete(f"/users/{user_id}"))
+        self.drop_cached_context(user_id)
+        self._known_users.discard(user_id)
         return True
 
     async def get_all_users(
@@ -125,6 +193,122 @@ class AsyncMemoBaseClient:
         )
         return r.data["users"]
 
+    async def iter_users(
+        self, search: str = "", order_desc: bool = True, page_size: int = 100
+    ) -> AsyncIterator[dict]:
+        """Walk all users of the project in creation order with cursor pagination."""
+        params = {
+            "search": search,
+            "order_by": "created_at",
+            "order_desc": order_desc,
+            "limit": page_size,
+        }
+        while True:
+            r = unpack_response(await self._client.get("/project/users", params=params))
+            for user in r.data["users"]:
+                yield user
+            if not r.data.get("next_cursor"):
+                break
+            params["cursor"] = r.data["next_cursor"]
+
+    async def export(
+        self, types: list[str] = None, include_embeddings: bool = False
+    ) -> AsyncIterator[dict]:
+        """Stream all records of the project: users, blobs, profiles, events and gists.
+
+        Records are yielded as they arrive, parents before children.
+        """
+        async for record in aiter_ndjson(
+            self._client, "/project/export", export_params(types, include_embeddings)
+        ):
+            yield record
+
+    async def import_records(self, records: Iterable[dict]) -> dict:
+        """Bulk load records in the format of `export`, returns the import counts.
+
+        Records whose ID already exists are skipped, a failed import can be sent again.
+        """
+        r = unpack_response(
+            await self._client.post(
+                "/project/import",
+                content=andjson_chunks(records),
+                headers=NDJSON_HEADERS,
+            )
+        )
+        return r.data
+
+    async def wait_flush_job(self, job_id: str, timeout: float = 30) -> dict:
+        """Wait for a background flush started with `User.start_flush`, returns the job
+        with its `status` (pending/done/failed) once it finished or `timeout` passed.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            # The server holds the request at most `max_flush_job_wait` seconds
+            left = max(deadline - time.monotonic(), 0)
+            r = unpack_response(
+                await self._client.get(
+                    f"/users/buffer/jobs/{job_id}",
+                    params={"timeout": left},
+                    timeout=left + 10,
+                )
+            )
+            if r.data["status"] != "pending" or left <= 0:
+                return r.data
+
+    async def batch_profile(
+        self,
+        user_ids: list[str],
+        max_token_size: int = 1000,
+        chats: list[OpenAICompatibleMessage] = None,
+        need_json: bool = False,
+        **options,
+    ) -> dict[str, list[UserProfile]]:
+        """Profiles of many users in one request, `options` are the ones of `User.profile`."""
+        r = unpack_response(
+            await self._client.post(
+                "/users/profile/batch",
+                json={
+                    "user_ids": [str(u) for u in user_ids],
+                    "max_token_size": max_token_size,
+                    "chats": chats or [],
+                    **{k: v for k, v in options.items() if v is not None},
+                },
+            )
+        )
+        results = {}
+        for user in r.data["users"]:
+            ds_profiles = [
+                UserProfileData.model_validate(p).to_ds() for p in user["profiles"]
+            ]
+            results[user["user_id"]] = (
+                profiles_to_json(ds_profiles) if need_json else ds_profiles
+            )
+        return results
+
+    async def batch_context(
+        self,
+        user_ids: list[str],
+        max_token_size: int = 1000,
+        chats: list[OpenAICompatibleMessage] = None,
+        **options,
+    ) -> dict[str, str]:
+        """Contexts of many users in one request, `options` are the ones of `User.context`.
+
+        The chats are embedded once and shared by all users, for group chats.
+        """
+        r = unpack_response(
+            await self._client.post(
+                "/users/context/batch",
+                json={
+                    "user_ids": [str(u) for u in user_ids],
+                    "max_token_size": max_token_size,
+                    "chats": chats or [],
+                    **{k: v for k, v in options.items() if v is not None},
+                },
+            )
+        )
+        return {user["user_id"]: user["context"] for user in r.data["users"]}
+
     async def get_daily_usage(self, days: int = 7) -> dict:
         r = unpack_response(await self._client.get(f"/project/usage?last_days={days}"))
         return r.data
@@ -170,18 +354,58 @@ class AsyncUser:
         )
         return r.data["ids"]
 
+    async def iter_all(
+        self, blob_type: BlobType, page_size: int = 100
+    ) -> AsyncIterator[str]:
+        """Walk the ids of all blobs of this type with cursor pagination."""
+        params = {"page_size": page_size}
+        while True:
+            r = unpack_response(
+                await self.project_client.client.get(
+                    f"/users/blobs/{self.user_id}/{blob_type}", params=params
+                )
+            )
+            for blob_id in r.data["ids"]:
+                yield blob_id
+            if not r.data.get("next_cursor"):
+                break
+            params["cursor"] = r.data["next_cursor"]
+
+    async def export(
+        self, types: list[str] = None, include_embeddings: bool = False
+    ) -> AsyncIterator[dict]:
+        """Stream all records of this user, like `AsyncMemoBaseClient.export`."""
+        async for record in aiter_ndjson(
+            self.project_client.client,
+            f"/users/{self.user_id}/export",
+            export_params(types, include_embeddings),
+        ):
+            yield record
+
     async def delete(self, blob_id: str) -> bool:
         r = unpack_response(
             await self.project_client.client.delete(f"/blobs/{self.user_id}/{blob_id}")
         )
         return True
 
+    async def start_flush(self, blob_type: BlobType = BlobType.chat) -> Optional[str]:
+        """Flush the buffer in the background, returns the job to pass to
+        `wait_flush_job`, `None` when the buffer was empty.
+        """
+        response = await self.project_client.client.post(
+            f"/users/buffer/{self.user_id}/{blob_type}?wait_process=false"
+        )
+        unpack_response(response)
+        self.project_client.drop_cached_context(self.user_id)
+        return response.json().get("flush_job_id")
+
     async def flush(self, blob_type: BlobType = BlobType.chat, sync=False) -> bool:
         r = unpack_response(
             await self.project_client.client.post(
                 f"/users/buffer/{self.user_id}/{blob_type}?wait_process={sync}"
             )
         )
+        self.project_client.drop_cached_context(self.user_id)
         return True
 
     async def add_profile(self, content: str, topic: str, sub_topic: str) -> str:
@@ -194,6 +418,7 @@ class AsyncUser:
                 },
             )
         )
+        self.project_client.drop_cached_context(self.user_id)
         return r.data["id"]
 
     async def buffer(
@@ -260,6 +485,7 @@ class AsyncUser:
                 },
             )
         )
+        self.project_client.drop_cached_context(self.user_id)
         return True
 
     async def delete_profile(self, profile_id: str) -> bool:
@@ -268,6 +494,7 @@ class AsyncUser:
                 f"/users/profile/{self.user_id}/{profile_id}"
             )
         )
+        self.project_client.drop_cached_context(self.user_id)
         return True
 
     async def event(
@@ -283,12 +510,28 @@ class AsyncUser:
         )
         return [UserEventData.model_validate(e) for e in r.data["events"]]
 
+    async def iter_events(self, page_size: int = 100) -> AsyncIterator[UserEventData]:
+        """Walk all of the user's events, newest first, with cursor pagination."""
+        params = {"topk": page_size, "time_range_in_days": 0}
+        while True:
+            r = unpack_response(
+                await self.project_client.client.get(
+                    f"/users/event/{self.user_id}", params=params
+                )
+            )
+            for e in r.data["events"]:
+                yield UserEventData.model_validate(e)
+            if not r.data.get("next_cursor"):
+                break
+            params["cursor"] = r.data["next_cursor"]
+
     async def delete_event(self, event_id: str) -> bool:
         r = unpack_response(
             await self.project_client.client.delete(
                 f"/users/event/{self.user_id}/{event_id}"
             )
         )
+        self.project_client.drop_cached_context(self.user_id)
         return True
 
     async def update_event(self, event_id: str, event_data: dict) -> bool:
@@ -297,6 +540,7 @@ class AsyncUser:
                 f"/users/event/{self.user_id}/{event_id}", json=event_data
             )
         )
+        self.project_client.drop_cached_context(self.user_id)
         return True
 
     async def search_event(
@@ -305,8 +549,14 @@ class AsyncUser:
         topk: int = 10,
         similarity_threshold: float = 0.5,
         time_range_in_days: int = 180,
+        recency_half_life_days: Optional[float] = None,
+        recency_weight: Optional[float] = None,
     ) -> list[UserEventData]:
         params = f"?query={query}&topk={topk}&similarity_threshold={similarity_threshold}&time_range_in_days={time_range_in_days}"
+        if recency_half_life_days is not None:
+            params += f"&recency_half_life_days={recency_half_life_days}"
+        if recency_weight is not None:
+            params += f"&recency_weight={recency_weight}"
         r = unpack_response(
             await self.project_client.client.get(
                 f"/users/event/search/{self.user_id}{params}"
@@ -320,8 +570,17 @@ class AsyncUser:
         topk: int = 10,
         similarity_threshold: float = 0.2,
         time_range_in_days: int = 180,
+        search_method: Optional[Literal["vector", "lexical", "hybrid"]] = None,
+        recency_half_life_days: Optional[float] = None,
+        recency_weight: Optional[float] = None,
     ) -> list[UserEventData]:
         params = f"?query={query}&topk={topk}&similarity_threshold={similarity_threshold}&time_range_in_days={time_range_in_days}"
+        if search_method is not None:
+            params += f"&search_method={search_method}"
+        if recency_half_life_days is not None:
+            params += f"&recency_half_life_days={recency_half_life_days}"
+        if recency_weight is not None:
+            params += f"&recency_weight={recency_weight}"
         r = unpack_response(
             await self.project_client.client.get(
                 f"/users/event_gist/search/{self.user_id}{params}"
@@ -344,8 +603,14 @@ class AsyncUser:
         time_range_in_days: int = None,
         full_profile_and_only_search_event: bool = None,
         fill_window_with_events: bool = None,
+        event_recency_half_life_days: float = None,
+        event_recency_weight: float = None,
     ) -> str:
         params = f"?max_token_size={max_token_size}"
+        if event_recency_half_life_days is not None:
+            params += f"&event_recency_half_life_days={event_recency_half_life_days}"
+        if event_recency_weight is not None:
+            params += f"&event_recency_weight={event_recency_weight}"
         if prefer_topics:
             prefer_topics_query = [f"&prefer_topics={pt}" for pt in prefer_topics]
             params += "&".join(prefer_topics_query)
@@ -382,9 +647,21 @@ class AsyncUser:
             params += f"&full_profile_and_only_search_event={'true' if full_profile_and_only_search_event else 'false'}"
         if fill_window_with_events is not None:
             params += f"&fill_window_with_events={'true' if fill_window_with_events else 'false'}"
-        r = unpack_response(
-            await self.project_client.client.get(
-                f"/users/context/{self.user_id}{params}"
-            )
+        # Contexts searched with recent chats change every turn, not worth caching
+        cache = None if chats else self.project_client._context_cache
+        entry = cache.get(self.user_id, params) if cache is not None else None
+        if entry is not None and cache.is_fresh(entry):
+            return entry.context
+        headers = {"If-None-Match": entry.etag} if entry and entry.etag else None
+        response = await self.project_client.client.get(
+            f"/users/context/{self.user_id}{params}", headers=headers
         )
+        if entry is not None and response.status_code == 304:
+            cache.touch(entry)
+            return entry.context
+        r = unpack_response(response)
+        if cache is not None:
+            cache.set(
+                self.user_id, params, r.data["context"], response.headers.get("etag")
+            )
         return r.data["context"]
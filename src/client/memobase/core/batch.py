@@ -0,0 +1,273 @@
+import uuid
+import time
+import queue
+import atexit
+import asyncio
+import threading
+import httpx
+from typing import Optional
+from .blob import Blob
+from .entry import MemoBaseClient
+from .async_entry import AsyncMemoBaseClient
+from ..network import retry_delay
+from ..utils import LOG
+
+BATCH_INSERT_PATH = "/blobs/insert/batch"
+
+
+def batch_item(user_id: str, blob: Blob) -> dict:
+    # Client-generated ids let the server skip blobs of a retried batch
+    return {**blob.to_request(), "id": str(uuid.uuid4()), "user_id": user_id}
+
+
+def should_retry(response: Optional[httpx.Response]) -> bool:
+    """Retry transport errors and server-side failures, never rejected requests"""
+    if response is None:
+        return True
+    if response.status_code == 429 or response.status_code >= 500:
+        return True
+    if response.status_code >= 400:
+        return False
+    try:
+        return response.json()["errno"] >= 500
+    except Exception:
+        return False
+
+
+def batch_succeeded(response: httpx.Response) -> bool:
+    try:
+        return response.status_code == 200 and response.json()["errno"] == 0
+    except Exception:
+        return False
+
+
+class BatchInserter:
+    """Buffers blobs of many users and sends them in batches from a background thread.
+
+    A batch is sent once it holds `max_batch_size` blobs or its first blob has
+    waited `flush_interval` seconds. At most `max_pending` blobs are held, then
+    `insert` blocks, or raises `queue.Full` when `block=False`. Failed batches
+    are retried with jittered exponential backoff. Pending blobs are sent on
+    `close()`, which also runs at interpreter exit.
+    """
+
+    def __init__(
+        self,
+        client: MemoBaseClient,
+        max_batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_pending: int = 10000,
+        max_retries: int = 5,
+        retry_backoff: float = 0.5,
+        max_retry_backoff: float = 30.0,
+    ):
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._sender = threading.Thread(
+            target=self._run, name="memobase-batch-insert", daemon=True
+        )
+        self._sender.start()
+        atexit.register(self.close)
+
+    def insert(
+        self, user_id: str, blob: Blob, block: bool = True, timeout: float = None
+    ) -> str:
+        """Queue a blob and return its id, the user is created if it doesn't exist"""
+        if self._closed:
+            raise RuntimeError("BatchInserter is closed")
+        item = batch_item(user_id, blob)
+        self._queue.put(item, block=block, timeout=timeout)
+        return item["id"]
+
+    def flush(self):
+        """Block until every queued blob has been sent or given up on"""
+        self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+        self._queue.put(None)
+        self._sender.join()
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _next_batch(self) -> list[dict | None]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while batch[-1] is not None and len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            items = [item for item in batch if item is not None]
+            if items:
+                try:
+                    self._send(items)
+                except Exception as e:
+                    LOG.error(f"Dropped a batch of {len(items)} blobs: {e}")
+            for _ in batch:
+                self._queue.task_done()
+            if len(items) < len(batch):
+                return
+
+    def _send(self, items: list[dict]):
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = self.client.client.post(
+                    BATCH_INSERT_PATH, json={"blobs": items}
+                )
+            except httpx.TransportError as e:
+                LOG.warning(f"Batch insert failed: {e}")
+            if response is not None and batch_succeeded(response):
+                for user_id in dict.fromkeys(item["user_id"] for item in items):
+                    self.client._known_users.add(user_id)
+                return
+            if not should_retry(response) or attempt == self.max_retries:
+                break
+            time.sleep(retry_delay(attempt, self.retry_backoff, self.max_retry_backoff))
+        LOG.error(
+            f"Dropped a batch of {len(items)} blobs: "
+            f"{response.text if response is not None else 'no response'}"
+        )
+
+
+class AsyncBatchInserter:
+    """The asyncio version of `BatchInserter`, sending from a task on the running loop.
+
+    `insert` waits for room once `max_pending` blobs are held, `insert_nowait`
+    raises `asyncio.QueueFull` instead. Await `close()` before the loop stops,
+    the pending blobs are lost otherwise.
+    """
+
+    def __init__(
+        self,
+        client: AsyncMemoBaseClient,
+        max_batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_pending: int = 10000,
+        max_retries: int = 5,
+        retry_backoff: float = 0.5,
+        max_retry_backoff: float = 30.0,
+    ):
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self._loop = None
+        self._queue: asyncio.Queue = None
+        self._sender: asyncio.Task = None
+        self._closed = False
+
+    def _ensure_sender(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._sender.done():
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._sender = loop.create_task(self._run())
+
+    async def insert(self, user_id: str, blob: Blob) -> str:
+        """Queue a blob and return its id, the user is created if it doesn't exist"""
+        if self._closed:
+            raise RuntimeError("AsyncBatchInserter is closed")
+        self._ensure_sender()
+        item = batch_item(user_id, blob)
+        await self._queue.put(item)
+        return item["id"]
+
+    def insert_nowait(self, user_id: str, blob: Blob) -> str:
+        if self._closed:
+            raise RuntimeError("AsyncBatchInserter is closed")
+        self._ensure_sender()
+        item = batch_item(user_id, blob)
+        self._queue.put_nowait(item)
+        return item["id"]
+
+    async def flush(self):
+        """Wait until every queued blob has been sent or given up on"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        await self.flush()
+        if self._sender is not None:
+            self._sender.cancel()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def _next_batch(self) -> list[dict]:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.flush_interval
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._send(batch)
+            except Exception as e:
+                LOG.error(f"Dropped a batch of {len(batch)} blobs: {e}")
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _send(self, items: list[dict]):
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = await self.client.client.post(
+                    BATCH_INSERT_PATH, json={"blobs": items}
+                )
+            except httpx.TransportError as e:
+                LOG.warning(f"Batch insert failed: {e}")
+            if response is not None and batch_succeeded(response):
+                for user_id in dict.fromkeys(item["user_id"] for item in items):
+                    self.client._known_users.add(user_id)
+                return
+            if not should_retry(response) or attempt == self.max_retries:
+                break
+            await asyncio.sleep(
+                retry_delay(attempt, self.retry_backoff, self.max_retry_backoff)
+            )
+        LOG.error(
+            f"Dropped a batch of {len(items)} blobs: "
+            f"{response.text if response is not None else 'no response'}"
+        )
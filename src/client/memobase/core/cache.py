@@ -0,0 +1,82 @@
+import time
+import threading
+from typing import Optional
+from dataclasses import dataclass
+from collections import OrderedDict
+
+
+@dataclass
+class CachedContext:
+    context: str
+    etag: Optional[str]
+    checked_at: float
+
+
+class ContextCache:
+    """Contexts of recent `User.context` calls, keyed by user and query params.
+
+    An entry is served as is for `ttl` seconds, after that it's revalidated with
+    the server's ETag, so an unchanged memory costs a 304 instead of a rebuild.
+    """
+
+    def __init__(self, ttl: float, max_items: int = 1000):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._entries: OrderedDict[tuple[str, str], CachedContext] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str, params: str) -> Optional[CachedContext]:
+        with self._lock:
+            entry = self._entries.get((user_id, params))
+            if entry is not None:
+                self._entries.move_to_end((user_id, params))
+            return entry
+
+    def is_fresh(self, entry: CachedContext) -> bool:
+        return time.monotonic() - entry.checked_at < self.ttl
+
+    def set(self, user_id: str, params: str, context: str, etag: Optional[str]):
+        with self._lock:
+            self._entries[(user_id, params)] = CachedContext(
+                context=context, etag=etag, checked_at=time.monotonic()
+            )
+            self._entries.move_to_end((user_id, params))
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def touch(self, entry: CachedContext):
+        entry.checked_at = time.monotonic()
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == user_id]:
+                del self._entries[key]
+
+
+class KnownUsers:
+    """Bounded LRU of user ids known to exist on the server, shared by threads and tasks"""
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._ids: OrderedDict[str, None] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, user_id: str) -> bool:
+        with self._lock:
+            if user_id in self._ids:
+                self._ids.move_to_end(user_id)
+                return True
+            return False
+
+    def add(self, user_id: str):
+        if not self.max_size:
+            return
+        with self._lock:
+            self._ids[user_id] = None
+            self._ids.move_to_end(user_id)
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+
+    def discard(self, user_id: str):
+        with self._lock:
+            self._ids.pop(user_id, None)
@@ -81,3 +81,6 @@ class UserEventGistData(BaseModel):
         None, description="Timestamp when the event gist was last updated"
     )
     similarity: Optional[float] = Field(None, description="Similarity score")
+    score: Optional[float] = Field(
+        None, description="Reciprocal-rank fused score of the search"
+    )
@@ -1,11 +1,231 @@
+import json
+import time
+import random
+import asyncio
+import httpx
+from typing import Optional, Iterable, Iterator, AsyncIterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
 from httpx import Response
 from .core.type import BaseResponse
 
 PREFIX = "/api/v1"
 
+# Safe to send twice, other methods are only retried when the request never left
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+MAX_RETRY_AFTER = 30.0
+
+_request_timeout: ContextVar[Optional[httpx.Timeout]] = ContextVar(
+    "memobase_request_timeout", default=None
+)
+
 
 def unpack_response(response: Response) -> BaseResponse:
     response.raise_for_status()  # This will raise an HTTPError if the status is 4xx, 5xx
     r = BaseResponse.model_validate(response.json())
     r.raise_for_status()
     return r
+
+
+def export_params(types: Optional[list[str]], include_embeddings: bool) -> dict:
+    params = {"include_embeddings": include_embeddings}
+    if types:
+        params["types"] = types
+    return params
+
+
+def is_ndjson(response: Response) -> bool:
+    # Errors come back as a JSON body instead of a stream
+    return response.headers.get("content-type", "").startswith("application/x-ndjson")
+
+
+def iter_ndjson(client: httpx.Client, path: str, params: dict) -> Iterator[dict]:
+    with client.stream("GET", path, params=params) as response:
+        if not is_ndjson(response):
+            response.read()
+            unpack_response(response)
+            return
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+
+
+async def aiter_ndjson(
+    client: httpx.AsyncClient, path: str, params: dict
+) -> AsyncIterator[dict]:
+    async with client.stream("GET", path, params=params) as response:
+        if not is_ndjson(response):
+            await response.aread()
+            unpack_response(response)
+            return
+        async for line in response.aiter_lines():
+            if line:
+                yield json.loads(line)
+
+
+def ndjson_chunks(
+    records: Iterable[dict], chunk_size: int = 64 * 1024
+) -> Iterator[bytes]:
+    # Streamed in chunks, the whole import never has to fit in memory
+    chunk = []
+    size = 0
+    for record in records:
+        line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode()
+        chunk.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield b"".join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield b"".join(chunk)
+
+
+async def andjson_chunks(records: Iterable[dict]) -> AsyncIterator[bytes]:
+    for chunk in ndjson_chunks(records):
+        yield chunk
+
+
+NDJSON_HEADERS = {"Content-Type": "application/x-ndjson"}
+
+
+def retry_delay(attempt: int, backoff: float, max_backoff: float) -> float:
+    # Full jitter, so that clients retrying the same outage spread out
+    return random.uniform(0, min(max_backoff, backoff * 2**attempt))
+
+
+def retry_after(response: Response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+@contextmanager
+def request_timeout(seconds: float | httpx.Timeout):
+    """Override the client timeout of every request sent inside the block.
+
+    The override is held in a context variable, so it only applies to the
+    current thread or asyncio task.
+    """
+    token = _request_timeout.set(httpx.Timeout(seconds))
+    try:
+        yield
+    finally:
+        _request_timeout.reset(token)
+
+
+def require_http2():
+    # httpx only checks for `h2` when it builds its own transport
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        raise ImportError(
+            "http2=True needs the `h2` package, install it with `pip install memobase[http2]`"
+        ) from None
+
+
+class RetryPolicy:
+    def __init__(self, max_retries: int = 2, retry_backoff: float = 0.5):
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+    def prepare(self, request: httpx.Request):
+        timeout = _request_timeout.get()
+        if timeout is not None:
+            request.extensions = {**request.extensions, "timeout": timeout.as_dict()}
+
+    def retry_on_error(
+        self, request: httpx.Request, error: httpx.TransportError, attempt: int
+    ) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        # The server never saw the request, any method is safe to resend
+        if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)):
+            return True
+        return request.method in IDEMPOTENT_METHODS and isinstance(
+            error, (httpx.ReadError, httpx.RemoteProtocolError, httpx.WriteError)
+        )
+
+    def retry_on_response(
+        self, request: httpx.Request, response: Response, attempt: int
+    ) -> bool:
+        return (
+            attempt < self.max_retries
+            and request.method in IDEMPOTENT_METHODS
+            and response.status_code in RETRY_STATUS_CODES
+        )
+
+    def delay(self, attempt: int, response: Optional[Response] = None) -> float:
+        if response is not None:
+            seconds = retry_after(response)
+            if seconds is not None:
+                return seconds
+        return retry_delay(attempt, self.retry_backoff, MAX_RETRY_AFTER)
+
+
+class RetryTransport(httpx.BaseTransport):
+    """Retries transient failures of the wrapped transport with jittered backoff.
+
+    Connection failures are retried for every method. Dropped connections and
+    429/502/503/504 responses are retried only for idempotent methods, a POST
+    that may have reached the server is never sent twice.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, policy: RetryPolicy):
+        self.transport = transport
+        self.policy = policy
+
+    def handle_request(self, request: httpx.Request) -> Response:
+        self.policy.prepare(request)
+        attempt = 0
+        while True:
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.TransportError as e:
+                if not self.policy.retry_on_error(request, e, attempt):
+                    raise
+                time.sleep(self.policy.delay(attempt))
+            else:
+                if not self.policy.retry_on_response(request, response, attempt):
+                    return response
+                response.close()
+                time.sleep(self.policy.delay(attempt, response))
+            attempt += 1
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport, policy: RetryPolicy):
+        self.transport = transport
+        self.policy = policy
+
+    async def handle_async_request(self, request: httpx.Request) -> Response:
+        self.policy.prepare(request)
+        attempt = 0
+        while True:
+            try:
+                response = await self.transport.handle_async_request(request)
+            except httpx.TransportError as e:
+                if not self.policy.retry_on_error(request, e, attempt):
+                    raise
+                await asyncio.sleep(self.policy.delay(attempt))
+            else:
+                if not self.policy.retry_on_response(request, response, attempt):
+                    return response
+                await response.aclose()
+                await asyncio.sleep(self.policy.delay(attempt, response))
+            attempt += 1
+
+    async def aclose(self):
+        await self.transport.aclose()
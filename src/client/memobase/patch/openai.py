@@ -1,12 +1,14 @@
-import threading
+import queue
+import asyncio
 from openai import OpenAI, AsyncOpenAI
 from openai.types.chat.chat_completion import ChatCompletion
 from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
-from openai._streaming import Stream
+from openai._streaming import Stream, AsyncStream
 from ..core.entry import MemoBaseClient, User, ChatBlob
+from ..core.async_entry import AsyncMemoBaseClient
+from ..core.batch import BatchInserter, AsyncBatchInserter
 from ..core.user import UserProfile
 from ..utils import string_to_uuid, LOG
-from ..error import ServerError
 
 PROMPT = """
 
@@ -18,30 +20,97 @@ PROMPT = """
 
 def openai_memory(
     openai_client: OpenAI | AsyncOpenAI,
-    mb_client: MemoBaseClient,
+    mb_client: MemoBaseClient | AsyncMemoBaseClient,
     additional_memory_prompt: str = "Make sure the user's query needs the memory, otherwise just return the answer directly.",
     max_context_size: int = 1000,
+    max_queue_size: int = 1000,
+    insert_batch_size: int = 32,
 ) -> OpenAI | AsyncOpenAI:
     if hasattr(openai_client, "_memobase_patched"):
         return openai_client
 
     openai_client._memobase_patched = True
-    openai_client.get_profile = _get_profile(mb_client)
-    openai_client.get_memory_prompt = _get_memory_prompt(
-        mb_client, max_context_size, additional_memory_prompt
-    )
-    openai_client.flush = _flush(mb_client)
     if isinstance(openai_client, OpenAI):
+        assert isinstance(
+            mb_client, MemoBaseClient
+        ), "OpenAI needs a MemoBaseClient, use AsyncMemoBaseClient with AsyncOpenAI"
+        insert_queue = InsertQueue(mb_client, max_queue_size, insert_batch_size)
+        openai_client.get_profile = _get_profile(mb_client)
+        openai_client.get_memory_prompt = _get_memory_prompt(
+            mb_client, max_context_size, additional_memory_prompt
+        )
+        openai_client.flush = _flush(mb_client, insert_queue)
         openai_client.chat.completions.create = _sync_chat(
-            openai_client, mb_client, additional_memory_prompt, max_context_size
+            openai_client,
+            insert_queue,
+            additional_memory_prompt,
+            max_context_size,
         )
     elif isinstance(openai_client, AsyncOpenAI):
-        raise ValueError(f"AsyncOpenAI is not supported yet")
+        assert isinstance(
+            mb_client, AsyncMemoBaseClient
+        ), "AsyncOpenAI needs an AsyncMemoBaseClient"
+        insert_queue = AsyncInsertQueue(mb_client, max_queue_size, insert_batch_size)
+        openai_client.get_profile = _async_get_profile(mb_client)
+        openai_client.get_memory_prompt = _async_get_memory_prompt(
+            mb_client, max_context_size, additional_memory_prompt
+        )
+        openai_client.flush = _async_flush(mb_client, insert_queue)
+        openai_client.chat.completions.create = _async_chat(
+            openai_client,
+            insert_queue,
+            additional_memory_prompt,
+            max_context_size,
+        )
     else:
         raise ValueError(f"Invalid openai_client type: {type(openai_client)}")
+    openai_client.memobase_insert_queue = insert_queue
     return openai_client
 
 
+class InsertQueue:
+    """Chats of a patched client go through one `BatchInserter`.
+
+    Completions only enqueue, they never wait on Memobase, and a chat is dropped
+    with a warning when the queue is full. The batch endpoint creates missing
+    users, so the completion path needs one call for the context only.
+    """
+
+    def __init__(self, mb_client: MemoBaseClient, max_size: int, batch_size: int):
+        self.mb_client = mb_client
+        self.inserter = BatchInserter(
+            mb_client, max_batch_size=batch_size, max_pending=max_size
+        )
+
+    def put(self, user_id: str, blob: ChatBlob):
+        try:
+            self.inserter.insert(user_id, blob, block=False)
+        except queue.Full:
+            LOG.warning(f"Memobase insert queue is full, dropping a chat of {user_id}")
+
+    def join(self):
+        """Block until every queued chat has been sent"""
+        self.inserter.flush()
+
+
+class AsyncInsertQueue:
+    def __init__(self, mb_client: AsyncMemoBaseClient, max_size: int, batch_size: int):
+        self.mb_client = mb_client
+        self.inserter = AsyncBatchInserter(
+            mb_client, max_batch_size=batch_size, max_pending=max_size
+        )
+
+    def put(self, user_id: str, blob: ChatBlob):
+        try:
+            self.inserter.insert_nowait(user_id, blob)
+        except asyncio.QueueFull:
+            LOG.warning(f"Memobase insert queue is full, dropping a chat of {user_id}")
+
+    async def join(self):
+        """Wait until every queued chat has been sent"""
+        await self.inserter.flush()
+
+
 def _get_profile(mb_client: MemoBaseClient):
     def get_profile(u_string) -> list[UserProfile]:
         uid = string_to_uuid(u_string)
@@ -50,12 +119,21 @@ def _get_profile(mb_client: MemoBaseClient):
     return get_profile
 
 
+def _async_get_profile(mb_client: AsyncMemoBaseClient):
+    async def get_profile(u_string) -> list[UserProfile]:
+        uid = string_to_uuid(u_string)
+        u = await mb_client.get_user(uid, no_get=True)
+        return await u.profile()
+
+    return get_profile
+
+
 def _get_memory_prompt(
     mb_client: MemoBaseClient,
     max_context_size: int = 1000,
     additional_memory_prompt: str = "",
 ):
-    def get_memory(u_string) -> list[UserProfile]:
+    def get_memory(u_string) -> str:
         uid = string_to_uuid(u_string)
         u = mb_client.get_user(uid, no_get=True)
         context = u.context(max_token_size=max_context_size)
@@ -67,50 +145,110 @@ def _get_memory_prompt(
     return get_memory
 
 
-def _flush(mb_client: MemoBaseClient):
-    def flush(u_string) -> list[UserProfile]:
+def _async_get_memory_prompt(
+    mb_client: AsyncMemoBaseClient,
+    max_context_size: int = 1000,
+    additional_memory_prompt: str = "",
+):
+    async def get_memory(u_string) -> str:
         uid = string_to_uuid(u_string)
+        u = await mb_client.get_user(uid, no_get=True)
+        context = await u.context(max_token_size=max_context_size)
+        sys_prompt = PROMPT.format(
+            user_context=context, additional_memory_prompt=additional_memory_prompt
+        )
+        return sys_prompt
+
+    return get_memory
+
+
+def _flush(mb_client: MemoBaseClient, insert_queue: InsertQueue):
+    def flush(u_string) -> bool:
+        uid = string_to_uuid(u_string)
+        # Queued chats have to reach the buffer before it's flushed
+        insert_queue.join()
         return mb_client.get_user(uid, no_get=True).flush()
 
     return flush
 
 
-def add_message_to_user(messages: ChatBlob, user: User):
-    try:
-        r = user.insert(messages)
-        LOG.debug(f"Insert {messages}")
-    except ServerError as e:
-        LOG.error(f"Failed to insert message: {e}")
+def _async_flush(mb_client: AsyncMemoBaseClient, insert_queue: AsyncInsertQueue):
+    async def flush(u_string) -> bool:
+        uid = string_to_uuid(u_string)
+        # Queued chats have to reach the buffer before it's flushed
+        await insert_queue.join()
+        u = await mb_client.get_user(uid, no_get=True)
+        return await u.flush()
 
+    return flush
 
-def user_context_insert(
-    messages, u: User, additional_memory_prompt: str, max_context_size: int
-):
-    context = u.context(max_token_size=max_context_size)
+
+def memory_messages(
+    messages: list[dict],
+    context: str,
+    additional_memory_prompt: str,
+) -> list[dict]:
     if not len(context):
         return messages
     sys_prompt = PROMPT.format(
         user_context=context, additional_memory_prompt=additional_memory_prompt
     )
+    # Copy, the caller keeps its own history untouched
+    messages = list(messages)
     if messages[0]["role"] == "system":
-        messages[0]["content"] += sys_prompt
+        messages[0] = {**messages[0], "content": messages[0]["content"] + sys_prompt}
     else:
         messages.insert(0, {"role": "system", "content": sys_prompt.strip()})
     return messages
 
 
+def user_context(u: User, max_context_size: int) -> str:
+    # A missing memory shouldn't fail the completion
+    try:
+        return u.context(max_token_size=max_context_size)
+    except Exception as e:
+        LOG.warning(f"Failed to get memory context of {u.user_id}: {e}")
+        return ""
+
+
+async def async_user_context(
+    mb_client: AsyncMemoBaseClient, user_id: str, max_context_size: int
+) -> str:
+    try:
+        u = await mb_client.get_user(user_id, no_get=True)
+        return await u.context(max_token_size=max_context_size)
+    except Exception as e:
+        LOG.warning(f"Failed to get memory context of {user_id}: {e}")
+        return ""
+
+
+def chat_to_insert(user_query: dict, r_role: str, r_string: str) -> ChatBlob | None:
+    if not r_string:
+        return None
+    if r_role != "assistant":
+        LOG.warning(f"Last response is not assistant response: {r_role}")
+        return None
+    return ChatBlob(
+        messages=[
+            {"role": "user", "content": user_query["content"]},
+            {"role": "assistant", "content": r_string},
+        ]
+    )
+
+
 def _sync_chat(
     client: OpenAI,
-    mb_client: MemoBaseClient,
+    insert_queue: InsertQueue,
     additional_memory_prompt: str,
     max_context_size: int = 1000,
 ):
     _create_chat = client.chat.completions.create
+    mb_client = insert_queue.mb_client
 
     def sync_chat(*args, **kwargs) -> ChatCompletion | Stream[ChatCompletionChunk]:
         is_streaming = kwargs.get("stream", False)
         if kwargs.get("user_id", None) is None:
-            kwargs.pop("user_id")
+            kwargs.pop("user_id", None)
             if not is_streaming:
                 return _create_chat(*args, **kwargs)
             else:
@@ -125,9 +263,11 @@ def _sync_chat(
             else:
                 return (r for r in _create_chat(*args, **kwargs))
 
-        u = mb_client.get_or_create_user(user_id)
-        kwargs["messages"] = user_context_insert(
-            kwargs["messages"], u, additional_memory_prompt, max_context_size
+        u = mb_client.get_user(user_id, no_get=True)
+        kwargs["messages"] = memory_messages(
+            kwargs["messages"],
+            user_context(u, max_context_size),
+            additional_memory_prompt,
         )
         response = _create_chat(*args, **kwargs)
 
@@ -145,38 +285,94 @@ def _sync_chat(
                         total_response += r_string or ""
                     except Exception:
                         continue
-                if not len(total_response):
-                    return
-                if r_role != "assistant":
-                    LOG.warning(f"Last response is not assistant response: {r_role}")
-                    return response
-
-                messages = ChatBlob(
-                    messages=[
-                        {"role": "user", "content": user_query["content"]},
-                        {"role": "assistant", "content": total_response},
-                    ]
-                )
-                threading.Thread(target=add_message_to_user, args=(messages, u)).start()
+                blob = chat_to_insert(user_query, r_role, total_response)
+                if blob is not None:
+                    insert_queue.put(user_id, blob)
 
             return yield_response_and_log()
 
         else:
-            r_role = response.choices[0].message.role
-            if r_role != "assistant":
-                LOG.warning(f"Last response is not assistant response: {r_role}")
-                return response
-            r_string = response.choices[0].message.content
-            messages = ChatBlob(
-                messages=[
-                    {"role": "user", "content": user_query["content"]},
-                    {"role": "assistant", "content": r_string},
-                ]
+            blob = chat_to_insert(
+                user_query,
+                response.choices[0].message.role,
+                response.choices[0].message.content,
             )
-            threading.Thread(target=add_message_to_user, args=(messages, u)).start()
+            if blob is not None:
+                insert_queue.put(user_id, blob)
             return response
 
     return sync_chat
 
 
-# TODO support async openai
+def _async_chat(
+    client: AsyncOpenAI,
+    insert_queue: AsyncInsertQueue,
+    additional_memory_prompt: str,
+    max_context_size: int = 1000,
+):
+    _create_chat = client.chat.completions.create
+    mb_client = insert_queue.mb_client
+
+    async def passthrough(*args, **kwargs):
+        response = await _create_chat(*args, **kwargs)
+        if not kwargs.get("stream", False):
+            return response
+
+        async def yield_response():
+            async for r in response:
+                yield r
+
+        return yield_response()
+
+    async def async_chat(
+        *args, **kwargs
+    ) -> ChatCompletion | AsyncStream[ChatCompletionChunk]:
+        is_streaming = kwargs.get("stream", False)
+        if kwargs.get("user_id", None) is None:
+            kwargs.pop("user_id", None)
+            return await passthrough(*args, **kwargs)
+
+        user_id = string_to_uuid(kwargs.pop("user_id"))
+        user_query = kwargs["messages"][-1]
+        if user_query["role"] != "user":
+            LOG.warning(f"Last query is not user query: {user_query}")
+            return await passthrough(*args, **kwargs)
+
+        kwargs["messages"] = memory_messages(
+            kwargs["messages"],
+            await async_user_context(mb_client, user_id, max_context_size),
+            additional_memory_prompt,
+        )
+        response = await _create_chat(*args, **kwargs)
+
+        if is_streaming:
+
+            async def yield_response_and_log():
+                total_response = ""
+                r_role = None
+
+                async for r in response:
+                    yield r
+                    try:
+                        r_string = r.choices[0].delta.content
+                        r_role = r_role or r.choices[0].delta.role
+                        total_response += r_string or ""
+                    except Exception:
+                        continue
+                blob = chat_to_insert(user_query, r_role, total_response)
+                if blob is not None:
+                    insert_queue.put(user_id, blob)
+
+            return yield_response_and_log()
+
+        else:
+            blob = chat_to_insert(
+                user_query,
+                response.choices[0].message.role,
+                response.choices[0].message.content,
+            )
+            if blob is not None:
+                insert_queue.put(user_id, blob)
+            return response
+
+    return async_chat
@@ -1,6 +1,8 @@
+import httpx
 import pytest
 from memobase import MemoBaseClient, AsyncMemoBaseClient
 from memobase.error import ServerError
+from memobase.network import RetryTransport, RetryPolicy
 
 
 @pytest.fixture(scope="session")
@@ -23,3 +25,36 @@ def api_async_client():
     # if not await client.ping():
     #     return pytest.skip("API not available")
     return client
+
+
+@pytest.fixture
+def mock_client():
+    """`mock_client(handler)` is a client whose requests are answered by `handler`,
+    through the SDK retry transport when a `RetryPolicy` is given.
+    """
+
+    def make(handler, retry_policy: RetryPolicy = None) -> MemoBaseClient:
+        client = MemoBaseClient(api_key="secret", project_url="http://localhost:8019/")
+        transport = httpx.MockTransport(handler)
+        if retry_policy is not None:
+            transport = RetryTransport(transport, retry_policy)
+        client._client = httpx.Client(base_url=client.base_url, transport=transport)
+        return client
+
+    return make
+
+
+@pytest.fixture
+def mock_async_client():
+    """`mock_async_client(handler)`, the `AsyncMemoBaseClient` of `mock_client`"""
+
+    def make(handler) -> AsyncMemoBaseClient:
+        client = AsyncMemoBaseClient(
+            api_key="secret", project_url="http://localhost:8019/"
+        )
+        client._client = httpx.AsyncClient(
+            base_url=client.base_url, transport=httpx.MockTransport(handler)
+        )
+        return client
+
+    return make
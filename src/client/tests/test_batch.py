@@ -0,0 +1,31 @@
+import json
+import httpx
+from memobase import BatchInserter, ChatBlob
+
+
+def test_batch_inserter_retries(mock_client):
+    requests = []
+    responses = [
+        httpx.Response(502),
+        httpx.Response(200, json={"data": None, "errno": 500, "errmsg": "retry"}),
+        httpx.Response(200, json={"data": {"ids": []}, "errno": 0, "errmsg": ""}),
+        httpx.Response(200, json={"data": None, "errno": 400, "errmsg": "bad"}),
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content)["blobs"])
+        return responses[len(requests) - 1]
+
+    client = mock_client(handler)
+    blob = ChatBlob(messages=[{"role": "user", "content": "hi"}])
+    with BatchInserter(client, flush_interval=0.05, retry_backoff=0.01) as inserter:
+        ids = [inserter.insert(uid, blob) for uid in ["u1", "u2", "u1"]]
+        inserter.flush()
+        # Rejected batches are dropped without retrying
+        inserter.insert("u3", blob)
+
+    assert len(requests) == 4
+    assert [b["id"] for b in requests[2]] == ids
+    assert requests[0] == requests[2]
+    assert "u1" in client._known_users and "u2" in client._known_users
+    assert "u3" not in client._known_users
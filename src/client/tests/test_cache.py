@@ -0,0 +1,34 @@
+import time
+from memobase.core.cache import ContextCache, KnownUsers
+
+
+def test_context_cache():
+    cache = ContextCache(ttl=0.05, max_items=2)
+    cache.set("u1", "?a", "ctx1", 'W/"1"')
+    entry = cache.get("u1", "?a")
+    assert entry.context == "ctx1" and cache.is_fresh(entry)
+    time.sleep(0.06)
+    assert not cache.is_fresh(entry)
+    cache.touch(entry)
+    assert cache.is_fresh(entry)
+
+    cache.set("u1", "?b", "ctx2", None)
+    cache.set("u2", "?a", "ctx3", None)
+    # Least recently used entry is evicted first
+    assert cache.get("u1", "?a") is None
+    cache.invalidate("u1")
+    assert cache.get("u1", "?b") is None
+    assert cache.get("u2", "?a").context == "ctx3"
+
+
+def test_known_users():
+    known = KnownUsers(max_size=2)
+    known.add("u1")
+    known.add("u2")
+    assert "u1" in known
+    known.add("u3")
+    # u2 is the least recently used after the lookup of u1
+    assert "u2" not in known
+    assert "u1" in known and "u3" in known
+    known.discard("u1")
+    assert "u1" not in known
@@ -0,0 +1,70 @@
+import httpx
+import pytest
+from memobase import MemoBaseClient
+from memobase.network import RetryTransport, RetryPolicy
+
+NO_BACKOFF = RetryPolicy(max_retries=2, retry_backoff=0)
+
+
+def test_retry_transport_idempotent_only(mock_client):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.method)
+        if len(calls) == 1 and request.method == "GET":
+            return httpx.Response(503, headers={"Retry-After": "0"})
+        if request.method == "POST":
+            return httpx.Response(502)
+        return httpx.Response(200)
+
+    client = mock_client(handler, NO_BACKOFF).client
+    assert client.get("/users/u1").status_code == 200
+    assert calls == ["GET", "GET"]
+    # A POST may have been applied, it's never sent twice
+    calls.clear()
+    assert client.post("/blobs/insert/u1", json={}).status_code == 502
+    assert calls == ["POST"]
+
+
+def test_retry_transport_connect_errors(mock_client):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.method)
+        if len(calls) <= 2:
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(200)
+
+    client = mock_client(handler, NO_BACKOFF).client
+    assert client.post("/users", json={}).status_code == 200
+    assert len(calls) == 3
+
+    def refused(request: httpx.Request) -> httpx.Response:
+        calls.append(request.method)
+        raise httpx.ConnectError("connection refused", request=request)
+
+    calls.clear()
+    with pytest.raises(httpx.ConnectError):
+        mock_client(refused, NO_BACKOFF).client.get("/healthcheck")
+    assert len(calls) == 3
+
+
+def test_request_timeout_override(mock_client):
+    timeouts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        timeouts.append(request.extensions["timeout"]["read"])
+        return httpx.Response(200)
+
+    assert isinstance(
+        MemoBaseClient(
+            api_key="secret", project_url="http://localhost:8019/"
+        ).client._transport,
+        RetryTransport,
+    )
+    client = mock_client(handler, NO_BACKOFF)
+    client.client.get("/healthcheck")
+    with client.request_timeout(2):
+        client.client.get("/healthcheck")
+    client.client.get("/healthcheck")
+    assert timeouts == [5, 2, 5]
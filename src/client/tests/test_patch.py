@@ -0,0 +1,174 @@
+import json
+import httpx
+import pytest
+from openai import OpenAI, AsyncOpenAI
+from openai.types.chat.chat_completion import ChatCompletion
+from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
+from memobase.patch.openai import openai_memory, memory_messages
+
+MESSAGES = [
+    {"role": "system", "content": "You are a helpful assistant."},
+    {"role": "user", "content": "What pet should I get?"},
+]
+
+
+def completion(content: str) -> ChatCompletion:
+    return ChatCompletion.model_validate(
+        {
+            "id": "c1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-4o-mini",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }
+            ],
+        }
+    )
+
+
+def chunk(delta: dict) -> ChatCompletionChunk:
+    return ChatCompletionChunk.model_validate(
+        {
+            "id": "c1",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "delta": delta}],
+        }
+    )
+
+
+class MemobaseServer:
+    """Answers the SDK calls of the patch and records what it stored"""
+
+    def __init__(self, context: str = "Gus has a cat"):
+        self.context = context
+        self.inserted = []
+        self.flushed = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if "/users/context/" in path:
+            if self.context is None:
+                return httpx.Response(500)
+            return ok({"context": self.context})
+        if path.endswith("/blobs/insert/batch"):
+            self.inserted.extend(json.loads(request.content)["blobs"])
+            return ok({"ids": []})
+        if "/users/buffer/" in path:
+            self.flushed.append(path.rsplit("/", 2)[-2])
+            return ok(None)
+        return httpx.Response(404)
+
+
+def ok(data) -> httpx.Response:
+    return httpx.Response(200, json={"data": data, "errno": 0, "errmsg": ""})
+
+
+def inserted_chat(server: MemobaseServer) -> list[str]:
+    return [m["content"] for b in server.inserted for m in b["blob_data"]["messages"]]
+
+
+def test_memory_messages():
+    messages = memory_messages(MESSAGES, "Gus has a cat", "")
+    assert messages[0]["content"].startswith("You are a helpful assistant.")
+    assert "Gus has a cat" in messages[0]["content"]
+    # The caller's history is left untouched
+    assert MESSAGES[0]["content"] == "You are a helpful assistant."
+    messages = memory_messages(MESSAGES[1:], "Gus has a cat", "")
+    assert messages[0]["role"] == "system" and len(messages) == 2
+    assert memory_messages(MESSAGES, "", "") is MESSAGES
+
+
+def test_sync_chat(mock_client):
+    server = MemobaseServer()
+    sent = []
+
+    def create(*args, **kwargs):
+        sent.append(kwargs["messages"])
+        return completion("A cat")
+
+    openai_client = OpenAI(api_key="secret")
+    openai_client.chat.completions.create = create
+    client = openai_memory(openai_client, mock_client(server))
+
+    response = client.chat.completions.create(
+        messages=MESSAGES, model="m", user_id="gus"
+    )
+    assert response.choices[0].message.content == "A cat"
+    assert "Gus has a cat" in sent[0][0]["content"]
+    client.flush("gus")
+    assert inserted_chat(server) == ["What pet should I get?", "A cat"]
+    assert server.flushed == [server.inserted[0]["user_id"]]
+
+    # Without a user_id the call goes straight through
+    client.chat.completions.create(messages=MESSAGES, model="m")
+    assert sent[1] == MESSAGES
+    client.memobase_insert_queue.inserter.close()
+
+
+@pytest.mark.asyncio
+async def test_async_chat(mock_async_client):
+    server = MemobaseServer()
+    sent = []
+
+    async def create(*args, **kwargs):
+        sent.append(kwargs["messages"])
+        if not kwargs.get("stream"):
+            return completion("A cat")
+
+        async def stream():
+            yield chunk({"role": "assistant", "content": "A "})
+            yield chunk({"content": "dog"})
+
+        return stream()
+
+    openai_client = AsyncOpenAI(api_key="secret")
+    openai_client.chat.completions.create = create
+    client = openai_memory(openai_client, mock_async_client(server))
+
+    response = await client.chat.completions.create(
+        messages=MESSAGES, model="m", user_id="gus"
+    )
+    assert response.choices[0].message.content == "A cat"
+    assert "Gus has a cat" in sent[0][0]["content"]
+
+    response = await client.chat.completions.create(
+        messages=MESSAGES, model="m", user_id="gus", stream=True
+    )
+    assert [c.choices[0].delta.content async for c in response] == ["A ", "dog"]
+
+    await client.flush("gus")
+    assert inserted_chat(server) == [
+        "What pet should I get?",
+        "A cat",
+        "What pet should I get?",
+        "A dog",
+    ]
+    assert len(server.flushed) == 1
+    await client.memobase_insert_queue.inserter.close()
+
+
+@pytest.mark.asyncio
+async def test_async_chat_without_memory(mock_async_client):
+    # A failing context fetch doesn't fail the completion
+    server = MemobaseServer(context=None)
+    sent = []
+
+    async def create(*args, **kwargs):
+        sent.append(kwargs["messages"])
+        return completion("A cat")
+
+    openai_client = AsyncOpenAI(api_key="secret")
+    openai_client.chat.completions.create = create
+    client = openai_memory(openai_client, mock_async_client(server))
+    response = await client.chat.completions.create(
+        messages=MESSAGES, model="m", user_id="gus"
+    )
+    assert response.choices[0].message.content == "A cat"
+    assert sent == [MESSAGES]
+    await client.memobase_insert_queue.inserter.close()
@@ -1,3 +1,5 @@
+import json
+import httpx
 import pytest
 from time import time
 from memobase.error import ServerError
@@ -97,3 +99,92 @@ def test_user_event_curd_client(api_client):
     assert len(ets) == 0
 
     a.delete_user(uid)
+
+
+def test_export_stream(mock_client):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/project/export"):
+            assert request.url.params.get_list("types") == ["user", "profile"]
+            return httpx.Response(
+                200,
+                content=b'{"type":"user","id":"u1"}\n\n{"type":"profile","id":"p1"}\n',
+                headers={"Content-Type": "application/x-ndjson"},
+            )
+        return httpx.Response(
+            200, json={"data": None, "errno": 404, "errmsg": "User not found"}
+        )
+
+    client = mock_client(handler)
+    records = list(client.export(types=["user", "profile"]))
+    assert [r["id"] for r in records] == ["u1", "p1"]
+    with pytest.raises(ServerError):
+        list(client.get_user("u1", no_get=True).export())
+
+
+def test_import_records(mock_client):
+    bodies = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.headers["content-type"] == "application/x-ndjson"
+        bodies.append(request.read())
+        return httpx.Response(
+            200, json={"data": {"profiles": 2}, "errno": 0, "errmsg": ""}
+        )
+
+    client = mock_client(handler)
+    records = ({"type": "profile", "content": f"p{i}"} for i in range(2))
+    assert client.import_records(records) == {"profiles": 2}
+    lines = bodies[0].decode().splitlines()
+    assert [json.loads(line)["content"] for line in lines] == ["p0", "p1"]
+
+
+def test_get_or_create_user(mock_client):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.method)
+        user = {"id": json.loads(request.content)["id"], "data": {"name": "Gus"}}
+        return httpx.Response(200, json={"data": user, "errno": 0, "errmsg": ""})
+
+    client = mock_client(handler)
+    user = client.get_or_create_user("u1")
+    # The stored fields come with the create-if-absent answer
+    assert user.fields["data"] == {"name": "Gus"}
+    assert client.get_or_create_user("u1").fields is None
+    assert requests == ["POST"]
+
+
+def event_pages(request: httpx.Request) -> httpx.Response:
+    """Three pages of events, the second one emptied by the token budget"""
+    assert request.url.params["time_range_in_days"] == "0"
+    pages = {None: (["e1"], "c1"), "c1": ([], "c2"), "c2": (["e2"], None)}
+    ids, next_cursor = pages[request.url.params.get("cursor")]
+    events = [
+        {
+            "id": string_to_uuid(i),
+            "event_data": {"event_tip": i, "profile_delta": []},
+            "created_at": "2025-01-01T00:00:00Z",
+        }
+        for i in ids
+    ]
+    return httpx.Response(
+        200,
+        json={
+            "data": {"events": events, "next_cursor": next_cursor},
+            "errno": 0,
+            "errmsg": "",
+        },
+    )
+
+
+def test_iter_events(mock_client):
+    user = mock_client(event_pages).get_user("u1", no_get=True)
+    events = list(user.iter_events(page_size=1))
+    assert [e.event_data.event_tip for e in events] == ["e1", "e2"]
+
+
+@pytest.mark.asyncio
+async def test_async_iter_events(mock_async_client):
+    user = await mock_async_client(event_pages).get_user("u1", no_get=True)
+    events = [e async for e in user.iter_events(page_size=1)]
+    assert [e.event_data.event_tip for e in events] == ["e1", "e2"]
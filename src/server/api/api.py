@@ -6,12 +6,13 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, APIRouter
 from fastapi.openapi.utils import get_openapi
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from memobase_server.connectors import (
     close_connection,
     init_redis_pool,
 )
 from memobase_server import api_layer
-from memobase_server.env import LOG, TRACE_LOG
+from memobase_server.env import LOG, TRACE_LOG, CONFIG
 from memobase_server.llms.embeddings import check_embedding_sanity
 from memobase_server.llms import llm_sanity_check
 from memobase_server.api_layer.docs import API_X_CODE_DOCS
@@ -28,8 +29,10 @@ async def lifespan(app: FastAPI):
     await close_connection()
 
 
+# orjson renders the large profile and event listings several times faster
 app = FastAPI(
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS configuration
@@ -132,6 +135,23 @@ router.get(
 )(api_layer.project.get_project_usage)
 
 
+router.get(
+    "/project/export",
+    tags=["project"],
+    openapi_extra=API_X_CODE_DOCS["GET /project/export"],
+)(api_layer.export.export_project)
+
+
+router.post(
+    "/project/import",
+    tags=["project"],
+    openapi_extra={
+        **API_X_CODE_DOCS["POST /project/import"],
+        **api_layer.bulk_import.IMPORT_REQUEST_BODY,
+    },
+)(api_layer.bulk_import.import_project)
+
+
 router.post(
     "/users",
     tags=["user"],
@@ -159,6 +179,13 @@ router.delete(
 )(api_layer.user.delete_user)
 
 
+router.get(
+    "/users/{user_id}/export",
+    tags=["user"],
+    openapi_extra=API_X_CODE_DOCS["GET /users/{user_id}/export"],
+)(api_layer.export.export_user)
+
+
 router.get(
     "/users/blobs/{user_id}/{blob_type}",
     tags=["user"],
@@ -166,6 +193,14 @@ router.get(
 )(api_layer.user.get_user_all_blobs)
 
 
+# Registered before /blobs/insert/{user_id}, which would capture "batch"
+router.post(
+    "/blobs/insert/batch",
+    tags=["blob"],
+    openapi_extra=API_X_CODE_DOCS["POST /blobs/insert/batch"],
+)(api_layer.blob.insert_blobs)
+
+
 router.post(
     "/blobs/insert/{user_id}",
     tags=["blob"],
@@ -187,6 +222,14 @@ router.delete(
 )(api_layer.blob.delete_blob)
 
 
+# Registered before /users/profile/{user_id}, which would capture "batch"
+router.post(
+    "/users/profile/batch",
+    tags=["profile"],
+    openapi_extra=API_X_CODE_DOCS["POST /users/profile/batch"],
+)(api_layer.profile.get_users_profile_batch)
+
+
 router.get(
     "/users/profile/{user_id}",
     tags=["profile"],
@@ -228,6 +271,12 @@ router.get(
     openapi_extra=API_X_CODE_DOCS["GET /users/buffer/capacity/{user_id}/{buffer_type}"],
 )(api_layer.buffer.get_processing_buffer_ids)
 
+router.get(
+    "/users/buffer/jobs/{job_id}",
+    tags=["buffer"],
+    openapi_extra=API_X_CODE_DOCS["GET /users/buffer/jobs/{job_id}"],
+)(api_layer.buffer.get_flush_job)
+
 router.get(
     "/users/event/{user_id}",
     tags=["event"],
@@ -271,6 +320,13 @@ router.get(
 )(api_layer.context.get_user_context)
 
 
+router.post(
+    "/users/context/batch",
+    tags=["context"],
+    openapi_extra=API_X_CODE_DOCS["POST /users/context/batch"],
+)(api_layer.context.get_users_context_batch)
+
+
 router.post(
     "/users/roleplay/proactive/{user_id}",
     tags=["roleplay"],
@@ -285,5 +341,13 @@ async def global_wrapper_middleware(request, call_next):
 
 app.include_router(router)
 app.add_middleware(api_layer.middleware.AuthMiddleware)
+if CONFIG.enable_response_compression:
+    # Outermost, so that every response is compressed
+    app.add_middleware(
+        api_layer.compression.CompressionMiddleware,
+        minimum_size=CONFIG.response_compression_min_size,
+        gzip_level=CONFIG.response_gzip_level,
+        brotli_quality=CONFIG.response_brotli_quality,
+    )
 
 FastAPIInstrumentor.instrument_app(app)
@@ -7,4 +7,7 @@ from . import buffer
 from . import event
 from . import context
 from . import middleware
+from . import compression
+from . import export
+from . import bulk_import
 from . import roleplay
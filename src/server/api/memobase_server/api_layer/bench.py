@@ -0,0 +1,115 @@
+"""
+Microbenchmark of response encoding for `/users/profile` and `/users/event` payloads:
+CPU of the stdlib and orjson renderers, and bytes on the wire per compression.
+
+    python -m memobase_server.api_layer.bench [--profiles 300] [--events 200] [--rounds 5]
+"""
+
+import json
+import gzip
+import time
+import uuid
+import argparse
+from datetime import datetime, timezone
+from fastapi.responses import JSONResponse, ORJSONResponse
+from ..models import response as res
+from .compression import brotli
+
+
+def timeit(fn, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def profiles_payload(size: int) -> res.UserProfileResponse:
+    now = datetime.now(timezone.utc)
+    return res.UserProfileResponse(
+        data=res.UserProfilesData(
+            profiles=[
+                res.ProfileData(
+                    id=uuid.uuid4(),
+                    content=f"user mentioned preference number {i}, likes hiking and jazz",
+                    created_at=now,
+                    updated_at=now,
+                    attributes={"topic": f"topic_{i % 12}", "sub_topic": f"sub_{i}"},
+                )
+                for i in range(size)
+            ]
+        )
+    )
+
+
+def events_payload(size: int) -> res.UserEventsDataResponse:
+    now = datetime.now(timezone.utc)
+    return res.UserEventsDataResponse(
+        data=res.UserEventsData(
+            events=[
+                res.UserEventData(
+                    id=uuid.uuid4(),
+                    event_data=res.EventData(
+                        profile_delta=[
+                            res.ProfileDelta(
+                                content=f"went to a concert with friends on day {i}",
+                                attributes={"topic": "interest", "sub_topic": "music"},
+                            )
+                        ],
+                        event_tip=f"User seems relaxed, talked about weekend plans {i}",
+                        event_tags=[res.EventTag(tag="emotion", value="happy")],
+                    ),
+                    created_at=now,
+                    updated_at=now,
+                )
+                for i in range(size)
+            ]
+        )
+    )
+
+
+def bench_payload(name: str, payload: res.BaseResponse, rounds: int):
+    # The same steps FastAPI takes: dump the returned model, then render it
+    content = payload.model_dump(mode="json")
+    dump_ms = timeit(lambda: payload.model_dump(mode="json"), rounds)
+    stdlib_ms = timeit(lambda: JSONResponse(content), rounds)
+    orjson_ms = timeit(lambda: ORJSONResponse(content), rounds)
+    body = ORJSONResponse(content).body
+    # Same document, orjson only formats it differently
+    assert json.loads(body) == json.loads(JSONResponse(content).body)
+
+    print(f"{name}: {len(body) / 1024:.1f} KB raw")
+    print(
+        f"  model dump {dump_ms:.2f}ms, render stdlib {stdlib_ms:.2f}ms, "
+        f"orjson {orjson_ms:.2f}ms ({stdlib_ms / orjson_ms:.1f}x)"
+    )
+    codecs = {
+        f"gzip-{level}": lambda level=level: gzip.compress(body, level)
+        for level in (1, 6, 9)
+    }
+    if brotli is not None:
+        for quality in (1, 4, 11):
+            codecs[f"br-{quality}"] = lambda quality=quality: brotli.compress(
+                body, quality=quality
+            )
+    for codec, compress in codecs.items():
+        compressed_ms = timeit(compress, rounds)
+        ratio = len(body) / len(compress())
+        print(
+            f"  {codec:<8} {len(compress()) / 1024:8.1f} KB, "
+            f"{ratio:5.1f}x smaller, {compressed_ms:.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--profiles", type=int, default=300)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    if brotli is None:
+        print("brotli is not installed, only gzip is measured")
+    bench_payload("/users/profile", profiles_payload(args.profiles), args.rounds)
+    bench_payload("/users/event", events_payload(args.events), args.rounds)
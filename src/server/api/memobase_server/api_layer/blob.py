@@ -4,13 +4,30 @@ import traceback
 
 from ..controllers import full as controllers
 
-from ..env import TelemetryKeyName, TRACE_LOG
+from ..env import TelemetryKeyName, TRACE_LOG, CONFIG
 from ..models.response import CODE, UUID
 from ..models.utils import Promise
 from ..models import response as res
 from ..telemetry.capture_key import capture_int_key
 
 
+async def check_project_quota(project_id: str) -> Promise[None]:
+    p = await controllers.billing.get_project_billing(project_id)
+    if not p.ok():
+        return p
+    billing = p.data()
+
+    if billing.token_left is not None and billing.token_left < 0:
+        return Promise.reject(
+            CODE.SERVICE_UNAVAILABLE,
+            f"Your project reaches Memobase token limit, "
+            f"Left: {billing.token_left}, this project used: {billing.project_token_cost_month}. "
+            f"Your quota will be refilled on {billing.next_refill_at}. "
+            "\nhttps://www.memobase.io/pricing for more information.",
+        )
+    return Promise.resolve(None)
+
+
 async def insert_blob(
     request: Request,
     user_id: UUID = Path(..., description="The ID of the user to insert the blob for"),
@@ -25,19 +42,9 @@ async def insert_blob(
         capture_int_key, TelemetryKeyName.insert_blob_request, project_id=project_id
     )
 
-    p = await controllers.billing.get_project_billing(project_id)
+    p = await check_project_quota(project_id)
     if not p.ok():
         return p.to_response(res.IdResponse)
-    billing = p.data()
-
-    if billing.token_left is not None and billing.token_left < 0:
-        return Promise.reject(
-            CODE.SERVICE_UNAVAILABLE,
-            f"Your project reaches Memobase token limit, "
-            f"Left: {billing.token_left}, this project used: {billing.project_token_cost_month}. "
-            f"Your quota will be refilled on {billing.next_refill_at}. "
-            "\nhttps://www.memobase.io/pricing for more information.",
-        ).to_response(res.IdResponse)
 
     try:
         insert_result = await controllers.blob.insert_blob(
@@ -60,6 +67,7 @@ async def insert_blob(
             return process_ids.to_response(res.BaseResponse)
 
         final_results = []
+        flush_job_id = None
         # need to process buffer
         if process_ids.data() is not None and len(process_ids.data().ids):
             if wait_process:
@@ -73,12 +81,16 @@ async def insert_blob(
                     final_results.append(p.data())
             else:
                 # async
+                flush_job_id = await controllers.flush_job.create_flush_job(
+                    user_id, project_id, blob_data.blob_type
+                )
                 background_tasks.add_task(
                     controllers.buffer_background.flush_buffer_by_ids_in_background,
                     user_id,
                     project_id,
                     blob_data.blob_type,
                     process_ids.data().ids,
+                    flush_job_id,
                 )
     except Exception as e:
         TRACE_LOG.error(
@@ -94,8 +106,88 @@ async def insert_blob(
         project_id=project_id,
     )
     return res.BlobInsertResponse(
-        data={**insert_result.data().model_dump(), "chat_results": final_results}
+        data={
+            **insert_result.data().model_dump(),
+            "chat_results": final_results,
+            "flush_job_id": flush_job_id,
+        }
+    )
+
+
+async def insert_blobs(
+    request: Request,
+    blob_batch: res.BatchBlobData = Body(
+        ..., description="The blobs to insert, of one or more users"
+    ),
+    background_tasks: BackgroundTasks = BackgroundTasks(),
+) -> res.BlobsInsertResponse:
+    """Insert blobs of many users in one request, creating the users that don't exist.
+
+    Each blob is buffered like a single insert, and full buffers are processed in
+    the background. Pass client-generated blob IDs to make retries safe.
+    """
+    project_id = request.state.memobase_project_id
+    blobs = blob_batch.blobs
+    background_tasks.add_task(
+        capture_int_key,
+        TelemetryKeyName.insert_blob_request,
+        len(blobs),
+        project_id=project_id,
+    )
+    if len(blobs) > CONFIG.max_batch_insert_blobs:
+        return Promise.reject(
+            CODE.BAD_REQUEST,
+            f"Too many blobs in one batch, {len(blobs)} > {CONFIG.max_batch_insert_blobs}",
+        ).to_response(res.BlobsInsertResponse)
+
+    p = await check_project_quota(project_id)
+    if not p.ok():
+        return p.to_response(res.BlobsInsertResponse)
+
+    try:
+        insert_result = await controllers.blob.insert_blobs(project_id, blobs)
+        if not insert_result.ok():
+            return insert_result.to_response(res.BlobsInsertResponse)
+
+        flush_job_ids = []
+        for user_id, blob_type in dict.fromkeys(
+            (b.user_id, b.blob_type) for b in blobs
+        ):
+            process_ids = await controllers.buffer.detect_buffer_full_or_not(
+                user_id, project_id, blob_type
+            )
+            if not process_ids.ok():
+                return process_ids.to_response(res.BlobsInsertResponse)
+            if process_ids.data() is not None and len(process_ids.data().ids):
+                flush_job_id = await controllers.flush_job.create_flush_job(
+                    user_id, project_id, blob_type
+                )
+                flush_job_ids.append(flush_job_id)
+                background_tasks.add_task(
+                    controllers.buffer_background.flush_buffer_by_ids_in_background,
+                    user_id,
+                    project_id,
+                    blob_type,
+                    process_ids.data().ids,
+                    flush_job_id,
+                )
+    except Exception as e:
+        TRACE_LOG.error(
+            project_id, None, f"Error inserting blobs: {e}, {traceback.format_exc()}"
+        )
+        return Promise.reject(
+            CODE.INTERNAL_SERVER_ERROR, f"Error inserting blobs: {e}"
+        ).to_response(res.BlobsInsertResponse)
+
+    background_tasks.add_task(
+        capture_int_key,
+        TelemetryKeyName.insert_blob_success_request,
+        len(blobs),
+        project_id=project_id,
     )
+    return Promise.resolve(
+        res.BlobsInsertData(ids=insert_result.data().ids, flush_job_ids=flush_job_ids)
+    ).to_response(res.BlobsInsertResponse)
 
 
 async def get_blob(
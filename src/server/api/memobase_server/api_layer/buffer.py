@@ -1,5 +1,6 @@
 from ..controllers import full as controllers
 from ..models.response import UUID, IdsResponse
+from ..env import CONFIG
 from ..models.blob import BlobType
 from ..models import response as res
 from typing import Literal
@@ -15,8 +16,12 @@ async def flush_buffer(
         False, description="Whether to wait for the buffer to be processed"
     ),
     background_tasks: BackgroundTasks = BackgroundTasks(),
-) -> res.ChatModalAPIResponse:
-    """Flush unprocessed blobs into Memory"""
+) -> res.FlushBufferResponse:
+    """Flush unprocessed blobs into Memory.
+
+    Without `wait_process`, the flush runs in the background and its `flush_job_id`
+    is returned, wait for it with `GET /users/buffer/jobs/{job_id}`.
+    """
     project_id = request.state.memobase_project_id
     # p = await controllers.buffer.wait_insert_done_then_flush(
     #     user_id, project_id, buffer_type
@@ -28,7 +33,7 @@ async def flush_buffer(
     if not p.ok():
         return p.to_response(res.BaseResponse)
     if not len(p.data().ids):
-        return res.ChatModalAPIResponse(data=[])
+        return res.FlushBufferResponse(data=[])
     if wait_process:
         p = await controllers.buffer.flush_buffer_by_ids(
             user_id, project_id, buffer_type, p.data().ids
@@ -36,16 +41,20 @@ async def flush_buffer(
         if not p.ok():
             return p.to_response(res.BaseResponse)
         if p.data() is not None:
-            return res.ChatModalAPIResponse(data=[p.data()])
+            return res.FlushBufferResponse(data=[p.data()])
     else:
+        flush_job_id = await controllers.flush_job.create_flush_job(
+            user_id, project_id, buffer_type
+        )
         background_tasks.add_task(
             controllers.buffer_background.flush_buffer_by_ids_in_background,
             user_id,
             project_id,
             buffer_type,
             p.data().ids,
+            flush_job_id,
         )
-        return res.ChatModalAPIResponse(data=None)
+        return res.FlushBufferResponse(data=None, flush_job_id=flush_job_id)
 
 
 async def get_processing_buffer_ids(
@@ -62,3 +71,25 @@ async def get_processing_buffer_ids(
         user_id, project_id, buffer_type, select_status=status
     )
     return p.to_response(IdsResponse)
+
+
+async def get_flush_job(
+    request: Request,
+    job_id: UUID = Path(..., description="The ID of the flush job"),
+    timeout: float = Query(
+        0,
+        ge=0,
+        description="Seconds to wait for a pending job to finish, capped by the `max_flush_job_wait` config. 0 returns immediately",
+    ),
+) -> res.FlushJobResponse:
+    """
+    Get a background flush job, or long-poll it until it has finished.
+    Once done, `result` holds the memory changes of the flush.
+    """
+    project_id = request.state.memobase_project_id
+    timeout = min(timeout, CONFIG.max_flush_job_wait)
+    if timeout > 0:
+        p = await controllers.flush_job.wait_flush_job(project_id, job_id, timeout)
+    else:
+        p = await controllers.flush_job.get_flush_job(project_id, job_id)
+    return p.to_response(res.FlushJobResponse)
@@ -0,0 +1,49 @@
+import zlib
+from typing import AsyncIterator
+from ..controllers import full as controllers
+
+from ..models.utils import Promise
+from ..models.response import CODE
+from ..models import response as res
+from fastapi import Request
+
+
+async def gunzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+    async for chunk in chunks:
+        yield decompressor.decompress(chunk)
+    yield decompressor.flush()
+
+
+# The body is read as a stream, a `Body` parameter would buffer all of it first
+IMPORT_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "description": "NDJSON records in the format of `GET /project/export`",
+        "content": {"application/x-ndjson": {"schema": {"type": "string"}}},
+    }
+}
+
+
+async def import_project(request: Request) -> res.ImportResponse:
+    """
+    Bulk load users, profiles, events and event gists from NDJSON, for example
+    the output of an export. Records whose ID already exists are skipped, so a
+    failed import can be sent again. Send `Content-Encoding: gzip` for a gzipped body.
+    """
+    project_id = request.state.memobase_project_id
+    encoding = request.headers.get("content-encoding", "identity").lower()
+    if encoding not in ("identity", "gzip"):
+        return Promise.reject(
+            CODE.BAD_REQUEST, f"Unsupported content encoding: {encoding}"
+        ).to_response(res.ImportResponse)
+    chunks = request.stream()
+    if encoding == "gzip":
+        chunks = gunzip_chunks(chunks)
+    try:
+        p = await controllers.bulk_import.import_records(
+            project_id, controllers.bulk_import.iter_ndjson_lines(chunks)
+        )
+    except zlib.error as e:
+        p = Promise.reject(CODE.BAD_REQUEST, f"Invalid gzip body: {e}")
+    return p.to_response(res.ImportResponse)
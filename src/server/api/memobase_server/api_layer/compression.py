@@ -0,0 +1,129 @@
+"""
+Response compression negotiated from `Accept-Encoding`: brotli when the client
+accepts it and the `brotli` package is installed, gzip otherwise.
+"""
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import (
+    GZipResponder,
+    IdentityResponder,
+    DEFAULT_EXCLUDED_CONTENT_TYPES,
+)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip())
+    return accepted
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int = 4) -> None:
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        # Flush every chunk, a streamed response shouldn't stall in the compressor
+        body = self.compressor.process(body)
+        if more_body:
+            return body + self.compressor.flush()
+        return body + self.compressor.finish()
+
+
+class BodyCoalescer:
+    """Holds body chunks until `minimum_size` bytes or the end of the body.
+
+    `@app.middleware("http")` streams every response, the responders would see
+    small bodies as streams and compress them regardless of their size.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        chunks: list[bytes] = []
+        size = 0
+        passthrough = False
+
+        async def coalescing_send(message: Message) -> None:
+            nonlocal size, passthrough
+            if message["type"] == "http.response.start":
+                # Events must go out as soon as they're produced
+                passthrough = (
+                    Headers(raw=message["headers"])
+                    .get("content-type", "")
+                    .startswith(DEFAULT_EXCLUDED_CONTENT_TYPES)
+                )
+                await send(message)
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            more_body = message.get("more_body", False)
+            if more_body and size < self.minimum_size:
+                return
+            passthrough = True
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": b"".join(chunks),
+                    "more_body": more_body,
+                }
+            )
+
+        await self.app(scope, receive, coalescing_send)
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = accepted_encodings(Headers(scope=scope).get("Accept-Encoding", ""))
+        app = BodyCoalescer(self.app, self.minimum_size)
+        responder: ASGIApp
+        if brotli is not None and "br" in accepted:
+            responder = BrotliResponder(
+                app, self.minimum_size, quality=self.brotli_quality
+            )
+        elif "gzip" in accepted:
+            responder = GZipResponder(
+                app, self.minimum_size, compresslevel=self.gzip_level
+            )
+        else:
+            responder = IdentityResponder(app, self.minimum_size)
+        await responder(scope, receive, send)
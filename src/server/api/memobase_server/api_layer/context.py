@@ -5,12 +5,14 @@ from ..controllers import full as controllers
 from ..models.response import CODE, UUID
 from ..models.utils import Promise
 from ..models import response as res
-from fastapi import Request
-from fastapi import Path, Query
+from ..env import CONFIG
+from fastapi import Request, Response
+from fastapi import Path, Query, Body
 
 
 async def get_user_context(
     request: Request,
+    response: Response,
     user_id: UUID = Path(..., description="The ID of the user"),
     max_token_size: int = Query(
         1000,
@@ -91,6 +93,17 @@ Unless the user has relevant queries, do not actively mention those memories in
         False,
         description="If set to `True`, Memobase will fill the token window with the rest events.",
     ),
+    event_recency_half_life_days: float = Query(
+        None,
+        gt=0,
+        description="Half-life in days of the recency decay blended into event search scores. When set, `time_range_in_days` no longer hard-filters searched events. Defaults to the `event_search_recency_half_life_days` config",
+    ),
+    event_recency_weight: float = Query(
+        None,
+        ge=0,
+        le=1,
+        description="Weight of the recency decay against relevance, between 0 and 1. Defaults to the `event_search_recency_weight` config",
+    ),
 ) -> res.UserContextDataResponse:
     project_id = request.state.memobase_project_id
     topic_limits_json = topic_limits_json or "{}"
@@ -102,6 +115,34 @@ Unless the user has relevant queries, do not actively mention those memories in
         return Promise.reject(CODE.BAD_REQUEST, f"Invalid JSON: {e}").to_response(
             res.UserContextDataResponse
         )
+    # Time-ranged and recency-weighted contexts age by date even without new memory
+    etag = await controllers.context_snapshot.user_memory_etag(
+        user_id,
+        project_id,
+        {
+            "max_token_size": max_token_size,
+            "prefer_topics": prefer_topics,
+            "only_topics": only_topics,
+            "max_subtopic_size": max_subtopic_size,
+            "topic_limits": topic_limits,
+            "profile_event_ratio": profile_event_ratio,
+            "require_event_summary": require_event_summary,
+            "chats": [c.model_dump() for c in chats],
+            "event_similarity_threshold": event_similarity_threshold,
+            "time_range_in_days": time_range_in_days,
+            "customize_context_prompt": customize_context_prompt,
+            "full_profile_and_only_search_event": full_profile_and_only_search_event,
+            "fill_window_with_events": fill_window_with_events,
+            "event_recency_half_life_days": event_recency_half_life_days,
+            "event_recency_weight": event_recency_weight,
+        },
+        daily=True,
+    )
+    if controllers.context_snapshot.etag_matches(
+        request.headers.get("if-none-match"), etag
+    ):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     p = await controllers.context.get_user_context(
         user_id,
         project_id,
@@ -118,5 +159,55 @@ Unless the user has relevant queries, do not actively mention those memories in
         customize_context_prompt=customize_context_prompt,
         full_profile_and_only_search_event=full_profile_and_only_search_event,
         fill_window_with_events=fill_window_with_events,
+        event_recency_half_life_days=event_recency_half_life_days,
+        event_recency_weight=event_recency_weight,
     )
     return p.to_response(res.UserContextDataResponse)
+
+
+async def get_users_context_batch(
+    request: Request,
+    query: res.BatchContextQuery = Body(
+        ..., description="The users and the shared context parameters"
+    ),
+) -> res.UsersContextResponse:
+    """
+    Get the contexts of many users at once, for group chats and multi-agent apps.
+    The parameters are the ones of `GET /users/context/{user_id}`, the chats are
+    embedded once and shared by all users.
+    """
+    project_id = request.state.memobase_project_id
+    if len(query.user_ids) > CONFIG.max_batch_context_users:
+        return Promise.reject(
+            CODE.BAD_REQUEST,
+            f"Too many users in one batch, {len(query.user_ids)} > {CONFIG.max_batch_context_users}",
+        ).to_response(res.UsersContextResponse)
+    p = await controllers.context.get_users_context(
+        query.user_ids,
+        project_id,
+        query.max_token_size,
+        query.prefer_topics,
+        query.only_topics,
+        query.max_subtopic_size,
+        query.topic_limits,
+        query.profile_event_ratio,
+        query.require_event_summary,
+        query.chats,
+        query.event_similarity_threshold,
+        query.time_range_in_days,
+        customize_context_prompt=query.customize_context_prompt,
+        full_profile_and_only_search_event=query.full_profile_and_only_search_event,
+        fill_window_with_events=query.fill_window_with_events,
+        event_recency_half_life_days=query.event_recency_half_life_days,
+        event_recency_weight=query.event_recency_weight,
+    )
+    if not p.ok():
+        return p.to_response(res.UsersContextResponse)
+    return Promise.resolve(
+        res.UsersContextData(
+            users=[
+                res.UserContextItem(user_id=user_id, context=context.context)
+                for user_id, context in p.data().items()
+            ]
+        )
+    ).to_response(res.UsersContextResponse)
@@ -170,6 +170,34 @@ func main() {
     ),
 )
 
+# Insert blobs in batch
+add_api_code_docs(
+    "POST",
+    "/blobs/insert/batch",
+    py_code(
+        """
+from memobase import MemoBaseClient, BatchInserter
+from memobase.core.blob import ChatBlob
+
+client = MemoBaseClient(project_url='PROJECT_URL', api_key='PROJECT_TOKEN')
+
+# Blobs are buffered and sent in batches from a background thread,
+# the remaining ones are sent when the inserter is closed
+with BatchInserter(client) as inserter:
+    inserter.insert(uid, ChatBlob(messages=[
+        {
+            "role": "user",
+            "content": "Hi, I'm here again"
+        },
+        {
+            "role": "assistant",
+            "content": "Hi, Gus! How can I help you?"
+        }
+    ]))
+"""
+    ),
+)
+
 # Get blob
 add_api_code_docs(
     "GET",
@@ -422,3 +450,23 @@ func main() {
 """
     ),
 )
+
+# Wait for a background flush
+add_api_code_docs(
+    "GET",
+    "/users/buffer/jobs/{job_id}",
+    py_code(
+        """
+from memobase import MemoBaseClient
+from memobase.core.blob import BlobType
+
+client = MemoBaseClient(project_url='PROJECT_URL', api_key='PROJECT_TOKEN')
+
+user = client.get_user('user_id')
+job_id = user.start_flush(BlobType.chat)
+if job_id is not None:
+    job = client.wait_flush_job(job_id, timeout=120)
+    print(job["status"], job["result"])
+"""
+    ),
+)
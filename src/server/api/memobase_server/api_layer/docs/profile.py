@@ -242,3 +242,19 @@ func main() {
 """
     ),
 )
+
+# Batch profile endpoint
+add_api_code_docs(
+    "POST",
+    "/users/profile/batch",
+    py_code(
+        """
+from memobase import MemoBaseClient
+
+client = MemoBaseClient(project_url='PROJECT_URL', api_key='PROJECT_TOKEN')
+
+profiles = client.batch_profile([uid_1, uid_2, uid_3], max_token_size=500)
+print(profiles[uid_1])
+"""
+    ),
+)
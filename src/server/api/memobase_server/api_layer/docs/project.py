@@ -295,3 +295,41 @@ func main() {
 """
     ),
 )
+
+# Project export endpoint
+add_api_code_docs(
+    "GET",
+    "/project/export",
+    py_code(
+        """
+import json
+from memobase import MemoBaseClient
+
+memobase = MemoBaseClient(project_url='PROJECT_URL', api_key='PROJECT_TOKEN')
+
+# Records are streamed, the whole project never has to fit in memory
+with open("memobase-export.ndjson", "w") as f:
+    for record in memobase.export(types=["user", "profile", "event"]):
+        f.write(json.dumps(record) + "\\n")
+"""
+    ),
+)
+
+# Project import endpoint
+add_api_code_docs(
+    "POST",
+    "/project/import",
+    py_code(
+        """
+import json
+from memobase import MemoBaseClient
+
+memobase = MemoBaseClient(project_url='PROJECT_URL', api_key='PROJECT_TOKEN')
+
+# Records are sent as they are read, in the format of the export
+with open("memobase-export.ndjson") as f:
+    counts = memobase.import_records(json.loads(line) for line in f if line.strip())
+print(counts)
+"""
+    ),
+)
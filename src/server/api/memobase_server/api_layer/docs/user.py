@@ -284,3 +284,41 @@ func main() {
 """
     ),
 )
+
+# Export user endpoint
+add_api_code_docs(
+    "GET",
+    "/users/{user_id}/export",
+    py_code(
+        """
+from memobase import MemoBaseClient
+
+client = MemoBaseClient(project_url='PROJECT_URL', api_key='PROJECT_TOKEN')
+
+u = client.get_user(uid)
+for record in u.export():
+    print(record["type"], record["id"])
+"""
+    ),
+)
+
+# Batch context endpoint
+add_api_code_docs(
+    "POST",
+    "/users/context/batch",
+    py_code(
+        """
+from memobase import MemoBaseClient
+
+client = MemoBaseClient(project_url='PROJECT_URL', api_key='PROJECT_TOKEN')
+
+# One request for everyone in the group chat, the chats are embedded once
+contexts = client.batch_context(
+    [uid_1, uid_2, uid_3],
+    max_token_size=500,
+    chats=[{"role": "user", "content": "Where should we go for dinner?"}],
+)
+print(contexts[uid_1])
+"""
+    ),
+)
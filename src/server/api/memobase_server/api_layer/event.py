@@ -1,3 +1,4 @@
+from typing import Literal
 from ..controllers import full as controllers
 from ..controllers import event_gist
 from ..models import response as res
@@ -18,10 +19,23 @@ async def get_user_events(
         False,
         description="Whether to return events with summaries",
     ),
+    time_range_in_days: int = Query(
+        21,
+        description="Only allow events within the past few days, default is 21, 0 allows all",
+    ),
+    cursor: str = Query(
+        None,
+        description="Cursor returned by the previous page to continue listing",
+    ),
 ) -> res.UserEventsDataResponse:
     project_id = request.state.memobase_project_id
     p = await controllers.event.get_user_events(
-        user_id, project_id, topk=topk, need_summary=need_summary
+        user_id,
+        project_id,
+        topk=topk,
+        need_summary=need_summary,
+        time_range_in_days=time_range_in_days,
+        cursor=cursor,
     )
     if not p.ok():
         return p.to_response(res.UserEventsDataResponse)
@@ -66,17 +80,47 @@ async def search_user_events(
     use_gists: bool = Query(
         True, description="Whether to search event gists (default) or event tip"
     ),
+    search_method: Literal["vector", "lexical", "hybrid"] = Query(
+        None,
+        description="How event gists are retrieved, defaults to the `event_search_method` config",
+    ),
+    recency_half_life_days: float = Query(
+        None,
+        gt=0,
+        description="Half-life in days of the recency decay blended into the score. When set, `time_range_in_days` no longer hard-filters events. Defaults to the `event_search_recency_half_life_days` config",
+    ),
+    recency_weight: float = Query(
+        None,
+        ge=0,
+        le=1,
+        description="Weight of the recency decay against relevance, between 0 and 1. Defaults to the `event_search_recency_weight` config",
+    ),
 ) -> res.UserEventGistsDataResponse |res.UserEventsDataResponse:
     project_id = request.state.memobase_project_id
     
     if use_gists:
         p = await controllers.event_gist.search_user_event_gists(
-            user_id, project_id, query, topk, similarity_threshold, time_range_in_days
+            user_id,
+            project_id,
+            query,
+            topk,
+            similarity_threshold,
+            time_range_in_days,
+            search_method,
+            recency_half_life_days,
+            recency_weight,
         )
         return p.to_response(res.UserEventGistsDataResponse)
     else:
         p = await controllers.event.search_user_events(
-            user_id, project_id, query, topk, similarity_threshold, time_range_in_days
+            user_id,
+            project_id,
+            query,
+            topk,
+            similarity_threshold,
+            time_range_in_days,
+            recency_half_life_days,
+            recency_weight,
         )
         return p.to_response(res.UserEventsDataResponse)
 
@@ -92,10 +136,33 @@ async def search_user_event_gists(
     time_range_in_days: int = Query(
         180, description="Only allow events within the past few days, default is 180"
     ),
+    search_method: Literal["vector", "lexical", "hybrid"] = Query(
+        None,
+        description="How event gists are retrieved, defaults to the `event_search_method` config",
+    ),
+    recency_half_life_days: float = Query(
+        None,
+        gt=0,
+        description="Half-life in days of the recency decay blended into the score. When set, `time_range_in_days` no longer hard-filters events. Defaults to the `event_search_recency_half_life_days` config",
+    ),
+    recency_weight: float = Query(
+        None,
+        ge=0,
+        le=1,
+        description="Weight of the recency decay against relevance, between 0 and 1. Defaults to the `event_search_recency_weight` config",
+    ),
 ) -> res.UserEventGistsDataResponse:
     project_id = request.state.memobase_project_id
     p = await controllers.event_gist.search_user_event_gists(
-        user_id, project_id, query, topk, similarity_threshold, time_range_in_days
+        user_id,
+        project_id,
+        query,
+        topk,
+        similarity_threshold,
+        time_range_in_days,
+        search_method,
+        recency_half_life_days,
+        recency_weight,
     )
     return p.to_response(res.UserEventGistsDataResponse)
 
@@ -0,0 +1,66 @@
+from ..controllers import full as controllers
+from ..controllers.export import ExportRecordType
+
+from ..models.response import UUID
+from ..models import response as res
+from fastapi import Request, Path, Query
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def ndjson_response(lines, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        lines,
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+async def export_project(
+    request: Request,
+    types: list[ExportRecordType] = Query(
+        None,
+        description="Only export these record types, default is all of user, blob, profile, event and gist",
+    ),
+    include_embeddings: bool = Query(
+        False, description="Include the embeddings of events and gists"
+    ),
+) -> StreamingResponse:
+    """
+    Stream all the memory of the project as NDJSON, one record per line.
+    Send `Accept-Encoding: gzip` to receive it gzipped.
+    """
+    project_id = request.state.memobase_project_id
+    lines = controllers.export.iter_export_lines(
+        project_id, record_types=types, include_embeddings=include_embeddings
+    )
+    return ndjson_response(lines, f"memobase-{project_id}.ndjson")
+
+
+async def export_user(
+    request: Request,
+    user_id: UUID = Path(..., description="The ID of the user"),
+    types: list[ExportRecordType] = Query(
+        None,
+        description="Only export these record types, default is all of user, blob, profile, event and gist",
+    ),
+    include_embeddings: bool = Query(
+        False, description="Include the embeddings of events and gists"
+    ),
+) -> StreamingResponse:
+    """
+    Stream all the memory of a user as NDJSON, one record per line.
+    Send `Accept-Encoding: gzip` to receive it gzipped.
+    """
+    project_id = request.state.memobase_project_id
+    p = await controllers.user.get_user(user_id, project_id)
+    if not p.ok():
+        return p.to_response(res.BaseResponse)
+    lines = controllers.export.iter_export_lines(
+        project_id,
+        user_id=user_id,
+        record_types=types,
+        include_embeddings=include_embeddings,
+    )
+    return ndjson_response(lines, f"memobase-{user_id}.ndjson")
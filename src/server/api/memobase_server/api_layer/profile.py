@@ -1,5 +1,6 @@
 import json
-from fastapi import Request
+import asyncio
+from fastapi import Request, Response
 from fastapi import Path, Query, Body
 from datetime import datetime
 from ..controllers import full as controllers
@@ -9,10 +10,12 @@ from ..models.response import CODE, UUID
 from ..models.utils import Promise
 from ..models.blob import BlobType
 from ..models import response as res
+from ..env import CONFIG
 
 
 async def get_user_profile(
     request: Request,
+    response: Response,
     user_id: UUID = Path(..., description="The ID of the user to get profiles for"),
     topk: int = Query(
         None, description="Number of profiles to retrieve, default is all"
@@ -53,6 +56,24 @@ async def get_user_profile(
         return Promise.reject(
             CODE.BAD_REQUEST, f"Invalid JSON requests: {e}"
         ).to_response(res.UserProfileResponse)
+    etag = await controllers.context_snapshot.user_memory_etag(
+        user_id,
+        project_id,
+        {
+            "topk": topk,
+            "max_token_size": max_token_size,
+            "prefer_topics": prefer_topics,
+            "only_topics": only_topics,
+            "max_subtopic_size": max_subtopic_size,
+            "topic_limits": topic_limits,
+            "chats": [c.model_dump() for c in chats],
+        },
+    )
+    if controllers.context_snapshot.etag_matches(
+        request.headers.get("if-none-match"), etag
+    ):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     p = await controllers.profile.get_user_profiles(user_id, project_id)
     if not p.ok():
         return p.to_response(res.UserProfileResponse)
@@ -80,6 +101,63 @@ async def get_user_profile(
     return p.to_response(res.UserProfileResponse)
 
 
+async def get_users_profile_batch(
+    request: Request,
+    query: res.BatchProfileQuery = Body(
+        ..., description="The users and the shared filtering parameters"
+    ),
+) -> res.UsersProfilesResponse:
+    """Get the real-time profiles of many users at once, filtered like `GET /users/profile/{user_id}`"""
+    project_id = request.state.memobase_project_id
+    if len(query.user_ids) > CONFIG.max_batch_context_users:
+        return Promise.reject(
+            CODE.BAD_REQUEST,
+            f"Too many users in one batch, {len(query.user_ids)} > {CONFIG.max_batch_context_users}",
+        ).to_response(res.UsersProfilesResponse)
+    p = await controllers.profile.get_users_profiles(query.user_ids, project_id)
+    if not p.ok():
+        return p.to_response(res.UsersProfilesResponse)
+
+    async def filter_user_profiles(
+        user_id: str, total_profiles: res.UserProfilesData
+    ) -> Promise[res.UserProfilesData]:
+        if query.chats:
+            p = await filter_profiles_with_chats(
+                user_id,
+                project_id,
+                total_profiles,
+                query.chats,
+                only_topics=query.only_topics,
+            )
+            if p.ok():
+                total_profiles.profiles = p.data()["profiles"]
+        return await controllers.profile.truncate_profiles(
+            total_profiles,
+            prefer_topics=query.prefer_topics,
+            topk=query.topk,
+            max_token_size=query.max_token_size,
+            only_topics=query.only_topics,
+            max_subtopic_size=query.max_subtopic_size,
+            topic_limits=query.topic_limits,
+        )
+
+    users_profiles = p.data()
+    results = await asyncio.gather(
+        *[
+            filter_user_profiles(user_id, profiles)
+            for user_id, profiles in users_profiles.items()
+        ]
+    )
+    users = []
+    for user_id, p in zip(users_profiles, results):
+        if not p.ok():
+            return p.to_response(res.UsersProfilesResponse)
+        users.append(res.UserProfilesItem(user_id=user_id, profiles=p.data().profiles))
+    return Promise.resolve(res.UsersProfilesData(users=users)).to_response(
+        res.UsersProfilesResponse
+    )
+
+
 async def delete_user_profile(
     request: Request,
     user_id: UUID = Path(..., description="The ID of the user"),
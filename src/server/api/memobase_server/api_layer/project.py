@@ -42,19 +42,23 @@ async def get_project_billing(request: Request) -> res.BillingResponse:
 async def get_project_users(
     request: Request,
     search: str = Query("", description="Search string in username field"),
-    order_by: Literal["updated_at", "profile_count", "event_count"] = Query(
-        "updated_at", description="Order by field"
+    order_by: Literal["updated_at", "created_at", "profile_count", "event_count"] = (
+        Query("updated_at", description="Order by field")
     ),
     order_desc: bool = Query(True, description="Order descending or ascending"),
     limit: int = Query(10, description="Limit the number of results returned"),
     offset: int = Query(0, description="Offset the starting point for pagination"),
+    cursor: str = Query(
+        None,
+        description="Cursor returned by the previous page, requires order_by=created_at",
+    ),
 ) -> res.ProjectUsersDataResponse:
     """
     Get the users of a project in different orders
     """
     project_id = request.state.memobase_project_id
     users = await controllers.project.get_project_users(
-        project_id, search, limit, offset, order_by, order_desc
+        project_id, search, limit, offset, order_by, order_desc, cursor=cursor
     )
     return users.to_response(res.ProjectUsersDataResponse)
 
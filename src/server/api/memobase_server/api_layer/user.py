@@ -12,11 +12,11 @@ async def create_user(
     user_data: res.UserData = Body(
         ..., description="User data for creating a new user"
     ),
-) -> res.IdResponse:
-    """Create a new user with additional data"""
+) -> res.UserDataResponse:
+    """Create a new user with additional data. Creating an existing user ID is a no-op that returns the stored user"""
     project_id = request.state.memobase_project_id
     p = await controllers.user.create_user(user_data, project_id)
-    return p.to_response(res.IdResponse)
+    return p.to_response(res.UserDataResponse)
 
 
 async def get_user(
@@ -53,9 +53,13 @@ async def get_user_all_blobs(
     blob_type: BlobType = Path(..., description="The type of blobs to retrieve"),
     page: int = Query(0, description="Page number for pagination, starting from 0"),
     page_size: int = Query(10, description="Number of items per page, default is 10"),
-) -> res.IdsResponse:
+    cursor: str = Query(
+        None,
+        description="Cursor returned by the previous page, takes precedence over page",
+    ),
+) -> res.PagedIdsResponse:
     project_id = request.state.memobase_project_id
     p = await controllers.user.get_user_all_blobs(
-        user_id, project_id, blob_type, page, page_size
+        user_id, project_id, blob_type, page, page_size, cursor=cursor
     )
-    return p.to_response(res.IdsResponse)
+    return p.to_response(res.PagedIdsResponse)
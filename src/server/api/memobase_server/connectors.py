@@ -2,12 +2,22 @@ import os
 import asyncio
 import redis.exceptions as redis_exceptions
 import redis.asyncio as redis
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import OperationalError
 from uuid import uuid4
-from .env import LOG
-from .models.database import REG, Project, UserEvent, UserEventGist
+from .env import CONFIG, LOG
+from .models.database import (
+    REG,
+    Project,
+    User,
+    UserEvent,
+    UserEventGist,
+    UserEventTag,
+)
+from .maintenance.partitions import setup_partitions
+from .maintenance.embeddings import setup_embedding_storage
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 REDIS_URL = os.getenv("REDIS_URL")
@@ -48,12 +58,131 @@ def create_pgvector_extension():
         LOG.error(f"Failed to create pgvector extension: {e}")
 
 
+def create_missing_indexes(engine=DB_ENGINE):
+    """`create_all` skips new indexes on existing tables, build them without blocking writes.
+
+    Workers starting together take turns under a session advisory lock, so only one
+    builds while the others find the indexes valid. Builds still running outside of
+    this lock are left alone.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # A session lock, transaction locks don't outlive AUTOCOMMIT statements
+        conn.execute(
+            text("SELECT pg_advisory_lock(hashtext('create_missing_indexes'))")
+        )
+        try:
+            build_missing_indexes(conn)
+        finally:
+            conn.execute(
+                text("SELECT pg_advisory_unlock(hashtext('create_missing_indexes'))")
+            )
+
+
+def build_missing_indexes(conn):
+    for table in REG.metadata.sorted_tables:
+        rows = conn.execute(
+            text("""
+            SELECT c.relname, i.indisvalid, t.relkind = 'p', EXISTS (
+                SELECT 1 FROM pg_stat_progress_create_index p
+                WHERE p.index_relid = i.indexrelid
+            )
+            FROM pg_class t
+            JOIN pg_namespace n ON n.oid = t.relnamespace
+            LEFT JOIN pg_index i ON i.indrelid = t.oid
+            LEFT JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE t.relname = :table_name AND n.nspname = current_schema();
+            """),
+            {"table_name": table.name},
+        ).all()
+        if not rows:
+            continue
+        partitioned = rows[0][2]
+        valid = {name: is_valid for name, is_valid, _, _ in rows if name}
+        building = {name for name, _, _, in_progress in rows if in_progress}
+        columns = {c["name"] for c in inspect(conn).get_columns(table.name)}
+        for index in table.indexes:
+            if valid.get(index.name):
+                continue
+            if not {c.name for c in index.columns} <= columns:
+                # Its column is added by a maintenance command
+                continue
+            if index.name in building:
+                # Invalid until the other session finishes, don't drop it under it
+                LOG.info(f"Index {index.name} is still being built, skipping")
+                continue
+            ddl = str(CreateIndex(index).compile(dialect=conn.dialect))
+            columns = ddl.split(f" ON {table.name} ", 1)[1]
+            LOG.info(f"Building index {index.name} on {table.name}")
+            try:
+                if partitioned:
+                    # CONCURRENTLY isn't supported on partitioned tables:
+                    # build each partition concurrently, then attach them
+                    conn.execute(
+                        text(
+                            f"CREATE INDEX IF NOT EXISTS {index.name} "
+                            f"ON ONLY {table.name} {columns}"
+                        )
+                    )
+                    partitions = (
+                        conn.execute(
+                            text(
+                                "SELECT CAST(inhrelid AS regclass)::text FROM pg_inherits "
+                                "WHERE inhparent = CAST(:table_name AS regclass)"
+                            ),
+                            {"table_name": table.name},
+                        )
+                        .scalars()
+                        .all()
+                    )
+                    for partition in partitions:
+                        suffix = index.name.removeprefix(f"idx_{table.name}_")
+                        child = f"{partition}_{suffix}"[:63]
+                        conn.execute(
+                            text(
+                                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} "
+                                f"ON {partition} {columns}"
+                            )
+                        )
+                        conn.execute(
+                            text(f"ALTER INDEX {index.name} ATTACH PARTITION {child}")
+                        )
+                else:
+                    if index.name in valid:
+                        # Left invalid by an interrupted concurrent build
+                        conn.execute(
+                            text(f"DROP INDEX CONCURRENTLY IF EXISTS {index.name}")
+                        )
+                    conn.execute(
+                        text(
+                            f"CREATE {'UNIQUE ' if index.unique else ''}INDEX "
+                            f"CONCURRENTLY IF NOT EXISTS {index.name} "
+                            f"ON {table.name} {columns}"
+                        )
+                    )
+            except Exception as e:
+                LOG.error(f"Failed to build index {index.name}: {e}")
+
+
 def create_tables():
     create_pgvector_extension()
 
     REG.metadata.create_all(DB_ENGINE)
     with Session() as session:
         Project.initialize_root_project(session)
+        if not UserEventGist.install_search_vector(session):
+            LOG.warning(
+                "user_event_gists.search_vector is missing, lexical and hybrid search "
+                "fail until `python -m memobase_server.maintenance search-vector` adds it"
+            )
+        if CONFIG.enable_event_partitioning:
+            setup_partitions(session)
+        setup_embedding_storage(session)
+    create_missing_indexes()
+    with Session() as session:
+        UserEventTag.install_cleanup(session)
+        UserEventTag.backfill(session)
+        User.install_counters(session)
+        User.install_id_search_index(session)
         UserEvent.check_legal_embedding_dim(session)
         UserEventGist.check_legal_embedding_dim(session)
     LOG.info("Database tables created successfully")
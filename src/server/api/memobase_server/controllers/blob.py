@@ -1,9 +1,14 @@
+import uuid
 import pydantic
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.dialects.postgresql import insert
 from ..models.utils import Promise
-from ..models.database import GeneralBlob, DEFAULT_PROJECT_ID
-from ..models.response import CODE, BlobData, IdData
+from ..models.database import GeneralBlob, BufferZone, User, DEFAULT_PROJECT_ID
+from ..models.response import CODE, BlobData, IdData, IdsData, UserBlobData
 from ..models.blob import ChatBlob, DocBlob, BlobType
 from ..connectors import Session
+from ..env import BufferStatus
+from ..utils import get_blob_token_size
 
 
 async def insert_blob(user_id: str, project_id: str, blob: BlobData) -> Promise[IdData]:
@@ -25,6 +30,72 @@ async def insert_blob(user_id: str, project_id: str, blob: BlobData) -> Promise[
     return Promise.resolve(IdData(id=b_id))
 
 
+async def insert_blobs(project_id: str, blobs: list[UserBlobData]) -> Promise[IdsData]:
+    """Insert blobs of many users and buffer them in one transaction.
+
+    Missing users are created. Blobs whose client-generated ID already exists are
+    skipped, so a retried batch doesn't buffer anything twice.
+    """
+    try:
+        parsed = [b.to_blob() for b in blobs]
+    except pydantic.ValidationError as e:
+        return Promise.reject(CODE.BAD_REQUEST, f"Unable to parse blob: {e}")
+    ids = [b.id or uuid.uuid4() for b in blobs]
+    # Buffers are flushed in created_at order, keep the order of the batch
+    start = datetime.now(timezone.utc)
+    rows = [
+        {
+            "id": bid,
+            "user_id": b.user_id,
+            "project_id": project_id,
+            "blob_type": blob.type,
+            "blob_data": blob.get_blob_data(),
+            "additional_fields": blob.fields,
+            "created_at": start + timedelta(microseconds=i),
+        }
+        for i, (bid, b, blob) in enumerate(zip(ids, blobs, parsed))
+    ]
+    with Session() as session:
+        session.execute(
+            insert(User)
+            .values(
+                [
+                    {"id": user_id, "project_id": project_id}
+                    for user_id in dict.fromkeys(b.user_id for b in blobs)
+                ]
+            )
+            .on_conflict_do_nothing(index_elements=[User.id, User.project_id])
+        )
+        inserted = set(
+            session.execute(
+                insert(GeneralBlob)
+                .values(rows)
+                .on_conflict_do_nothing(
+                    index_elements=[GeneralBlob.id, GeneralBlob.project_id]
+                )
+                .returning(GeneralBlob.id)
+            ).scalars()
+        )
+        buffers = [
+            {
+                "id": uuid.uuid4(),
+                "user_id": row["user_id"],
+                "blob_id": row["id"],
+                "blob_type": row["blob_type"],
+                "token_size": get_blob_token_size(blob),
+                "project_id": project_id,
+                "status": BufferStatus.idle,
+                "created_at": row["created_at"],
+            }
+            for row, blob in zip(rows, parsed)
+            if row["id"] in inserted
+        ]
+        if buffers:
+            session.execute(insert(BufferZone), buffers)
+        session.commit()
+    return Promise.resolve(IdsData(ids=ids))
+
+
 async def get_blob(user_id: str, project_id: str, blob_id: str) -> Promise[BlobData]:
     with Session() as session:
         blob_db = (
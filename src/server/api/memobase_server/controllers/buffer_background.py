@@ -11,6 +11,7 @@ from ..models.blob import BlobType, Blob
 from ..connectors import Session, PROJECT_ID, get_redis_client
 from .modal import BLOBS_PROCESS
 from .buffer import flush_buffer_by_ids
+from .flush_job import finish_flush_job
 
 REDIS_LUA_CHECK_AND_DELETE_LOCK = """
 if redis.call("get", KEYS[1]) == ARGV[1] then
@@ -29,20 +30,29 @@ def get_user_buffer_queue_key(user_id: str, project_id: str, scope: str) -> str:
     return f"memobase:user_buffer_queue:{PROJECT_ID}:{scope}:{project_id}:{user_id}"
 
 
-def pack_ids_to_str(ids: list[str]) -> str:
-    return "::".join([str(i) for i in ids])
+def pack_ids_to_str(ids: list[str], job_id: str = None) -> str:
+    ids_str = "::".join([str(i) for i in ids])
+    if job_id is not None:
+        return f"{job_id}|{ids_str}"
+    return ids_str
 
 
-def unpack_ids_from_str(ids_str: str) -> list[str]:
-    return [i.strip() for i in ids_str.split("::") if i.strip()]
+def unpack_ids_from_str(ids_str: str) -> tuple[str | None, list[str]]:
+    # Entries queued without a flush job have no `job_id|` prefix
+    job_id, _, ids_str = ids_str.rpartition("|")
+    return job_id or None, [i.strip() for i in ids_str.split("::") if i.strip()]
 
 
 async def flush_buffer_by_ids_in_background(
-    user_id: str, project_id: str, blob_type: BlobType, buffer_ids: list[str]
+    user_id: str,
+    project_id: str,
+    blob_type: BlobType,
+    buffer_ids: list[str],
+    job_id: str = None,
 ) -> None:
-    if not len(buffer_ids):
-        return
-    if blob_type not in BLOBS_PROCESS:
+    if not len(buffer_ids) or blob_type not in BLOBS_PROCESS:
+        if job_id is not None:
+            await finish_flush_job(project_id, job_id, Promise.resolve(None))
         return
 
     # 1. mark buffer as processing
@@ -61,6 +71,9 @@ async def flush_buffer_by_ids_in_background(
         )
         actual_buffer_ids = [row.id for row in buffer_blob_data]
         if not len(actual_buffer_ids):
+            # Taken by a concurrent flush, nothing is left for this job
+            if job_id is not None:
+                await finish_flush_job(project_id, job_id, Promise.resolve(None))
             return
         session.query(BufferZone).filter(
             BufferZone.id.in_(actual_buffer_ids),
@@ -75,7 +88,7 @@ async def flush_buffer_by_ids_in_background(
     buffer_queue_key = get_user_buffer_queue_key(
         user_id, project_id, f"flush_buffer_background_{blob_type}"
     )
-    buffer_ids_str = pack_ids_to_str(actual_buffer_ids)
+    buffer_ids_str = pack_ids_to_str(actual_buffer_ids, job_id)
 
     try:
         async with get_redis_client() as redis_client:
@@ -96,6 +109,14 @@ async def flush_buffer_by_ids_in_background(
             user_id,
             f"[background] Error enqueue buffer ids: {e}: {traceback.format_exc()}",
         )
+        if job_id is not None:
+            await finish_flush_job(
+                project_id,
+                job_id,
+                Promise.reject(
+                    CODE.INTERNAL_SERVER_ERROR, f"Error enqueue buffer ids: {e}"
+                ),
+            )
 
 
 async def flush_buffer_background_running(
@@ -177,7 +198,7 @@ async def flush_buffer_background_running(
                 f"[background]({iteration_count}/{max_iterations}) Processing buffer (left queue size: {current_queue_size})",
             )
 
-            buffer_ids = unpack_ids_from_str(buffer_ids_str or "")
+            job_id, buffer_ids = unpack_ids_from_str(buffer_ids_str or "")
             if not buffer_ids:
                 continue
 
@@ -194,6 +215,8 @@ async def flush_buffer_background_running(
                 )
 
                 processing_time = asyncio.get_event_loop().time() - processing_start
+                if job_id is not None:
+                    await finish_flush_job(project_id, job_id, p)
 
                 if not p.ok():
                     consecutive_errors += 1
@@ -226,6 +249,15 @@ async def flush_buffer_background_running(
                     user_id,
                     f"[background] Unknown Error flushing buffer by ids: {e}\n{traceback.format_exc()}",
                 )
+                if job_id is not None:
+                    await finish_flush_job(
+                        project_id,
+                        job_id,
+                        Promise.reject(
+                            CODE.INTERNAL_SERVER_ERROR,
+                            f"Unknown Error flushing buffer by ids: {e}",
+                        ),
+                    )
 
                 # Stop if too many consecutive errors
                 if consecutive_errors >= max_consecutive_errors:
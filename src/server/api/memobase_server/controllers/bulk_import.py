@@ -0,0 +1,302 @@
+import uuid
+from typing import AsyncIterator
+from datetime import datetime, timezone
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from ..models.utils import Promise
+from ..models.database import User, UserProfile, UserEvent, UserEventGist
+from ..models.response import (
+    ImportData,
+    ImportRecord,
+    ImportUserRecord,
+    ImportProfileRecord,
+    ImportEventRecord,
+    ImportGistRecord,
+)
+from ..connectors import Session, get_redis_client
+from ..env import CONFIG, TRACE_LOG
+from .event import event_tag_rows
+from .profile import get_user_profiles_version, user_profiles_cache_key
+from .context_snapshot import get_user_memory_version, user_context_snapshot_key
+
+IMPORT_RECORD = TypeAdapter(ImportRecord)
+
+# Only the first errors are reported, a broken file would flood the response
+MAX_IMPORT_ERRORS = 100
+
+
+class ImportBatch:
+    def __init__(self):
+        self.users: list[ImportUserRecord] = []
+        self.profiles: list[ImportProfileRecord] = []
+        self.events: list[ImportEventRecord] = []
+        self.gists: list[ImportGistRecord] = []
+
+    def add(self, record) -> None:
+        {
+            "user": self.users,
+            "profile": self.profiles,
+            "event": self.events,
+            "gist": self.gists,
+        }[record.type].append(record)
+
+    def __len__(self) -> int:
+        return len(self.users) + len(self.profiles) + len(self.events) + len(self.gists)
+
+
+async def iter_ndjson_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+def timestamps(record, now: datetime) -> dict:
+    created_at = record.created_at or now
+    return {"created_at": created_at, "updated_at": record.updated_at or created_at}
+
+
+def check_embedding(record) -> str | None:
+    embedding = getattr(record, "embedding", None)
+    if embedding is not None and len(embedding) != CONFIG.embedding_dim:
+        return f"embedding dimension {len(embedding)} != {CONFIG.embedding_dim}"
+    return None
+
+
+def insert_new_rows(session, model, project_id: str, rows: list[dict]) -> set:
+    """Insert the rows whose ID isn't stored yet, returns the inserted IDs.
+
+    Stored IDs are looked up first: with `enable_event_partitioning` the primary key
+    of the event tables includes `created_at`, there is no `(id, project_id)`
+    constraint to use as the `ON CONFLICT` target.
+    """
+    seen = set(
+        session.execute(
+            select(model.id).where(
+                model.project_id == project_id,
+                model.id.in_({r["id"] for r in rows}),
+            )
+        ).scalars()
+    )
+    new_rows = []
+    for row in rows:
+        if row["id"] not in seen:
+            seen.add(row["id"])
+            new_rows.append(row)
+    if not new_rows:
+        return set()
+    # Still covers a concurrent import of the same rows
+    return set(
+        session.execute(
+            insert(model).values(new_rows).on_conflict_do_nothing().returning(model.id)
+        ).scalars()
+    )
+
+
+def write_import_batch(
+    project_id: str, batch: ImportBatch, stats: ImportData
+) -> tuple[set, set]:
+    """Insert one batch in one transaction, returns the users whose profiles and
+    whose memory changed.
+
+    Every table is loaded with one multi-row `INSERT ... ON CONFLICT DO NOTHING`
+    of the IDs not stored yet, so replaying an import skips the rows it already
+    loaded.
+    """
+    now = datetime.now(timezone.utc)
+    users = {
+        r.id: {
+            "id": r.id,
+            "project_id": project_id,
+            "additional_fields": r.data,
+            **timestamps(r, now),
+        }
+        for r in batch.users
+    }
+    for r in batch.profiles + batch.events + batch.gists:
+        users.setdefault(
+            r.user_id,
+            {
+                "id": r.user_id,
+                "project_id": project_id,
+                "additional_fields": None,
+                "created_at": now,
+                "updated_at": now,
+            },
+        )
+    profiles = [
+        {
+            "id": r.id or uuid.uuid4(),
+            "user_id": r.user_id,
+            "project_id": project_id,
+            "content": r.content,
+            "attributes": r.attributes,
+            **timestamps(r, now),
+        }
+        for r in batch.profiles
+    ]
+    events = [
+        {
+            "id": r.id or uuid.uuid4(),
+            "user_id": r.user_id,
+            "project_id": project_id,
+            "event_data": r.event_data.model_dump(),
+            "embedding": r.embedding,
+            **timestamps(r, now),
+        }
+        for r in batch.events
+    ]
+    profile_users, memory_users = set(), set()
+    with Session() as session:
+        if users:
+            created = set(
+                session.execute(
+                    insert(User)
+                    .values(list(users.values()))
+                    .on_conflict_do_nothing(index_elements=[User.id, User.project_id])
+                    .returning(User.id)
+                ).scalars()
+            )
+            stats.users += len(created)
+            # Existing users are kept as they are
+            stats.skipped += len({r.id for r in batch.users} - created)
+        if profiles:
+            inserted = insert_new_rows(session, UserProfile, project_id, profiles)
+            stats.profiles += len(inserted)
+            stats.skipped += len(profiles) - len(inserted)
+            profile_users.update(p["user_id"] for p in profiles if p["id"] in inserted)
+        if events:
+            inserted = insert_new_rows(session, UserEvent, project_id, events)
+            stats.events += len(inserted)
+            stats.skipped += len(events) - len(inserted)
+            for row, record in zip(events, batch.events):
+                if row["id"] not in inserted:
+                    continue
+                # A repeated ID is inserted once, so are its tags
+                inserted.discard(row["id"])
+                memory_users.add(row["user_id"])
+                session.add_all(
+                    event_tag_rows(
+                        row["user_id"],
+                        project_id,
+                        row["id"],
+                        record.event_data.event_tags,
+                    )
+                )
+        if batch.gists:
+            # Gists hang off events of the same user, from this file or already stored
+            event_users = dict(
+                session.execute(
+                    select(UserEvent.id, UserEvent.user_id).where(
+                        UserEvent.project_id == project_id,
+                        UserEvent.id.in_({r.event_id for r in batch.gists}),
+                    )
+                ).all()
+            )
+            gists = []
+            for r in batch.gists:
+                if event_users.get(r.event_id) != r.user_id:
+                    stats.invalid += 1
+                    if len(stats.errors) < MAX_IMPORT_ERRORS:
+                        stats.errors.append(
+                            f"gist {r.id}: event {r.event_id} of user {r.user_id} not found"
+                        )
+                    continue
+                gists.append(
+                    {
+                        "id": r.id or uuid.uuid4(),
+                        "user_id": r.user_id,
+                        "event_id": r.event_id,
+                        "project_id": project_id,
+                        "gist_data": r.gist_data.model_dump(),
+                        "embedding": r.embedding,
+                        **timestamps(r, now),
+                    }
+                )
+            if gists:
+                inserted = insert_new_rows(session, UserEventGist, project_id, gists)
+                stats.gists += len(inserted)
+                stats.skipped += len(gists) - len(inserted)
+                memory_users.update(g["user_id"] for g in gists if g["id"] in inserted)
+        session.commit()
+    return profile_users, memory_users | profile_users
+
+
+async def invalidate_imported_users(
+    project_id: str, profile_users: set, memory_users: set
+) -> None:
+    async with get_redis_client() as redis_client:
+        for user_id in profile_users:
+            await get_user_profiles_version(
+                redis_client, str(user_id), project_id, bump=True
+            )
+            await redis_client.delete(user_profiles_cache_key(str(user_id), project_id))
+        for user_id in memory_users:
+            await get_user_memory_version(
+                redis_client, str(user_id), project_id, bump=True
+            )
+            await redis_client.delete(
+                user_context_snapshot_key(str(user_id), project_id)
+            )
+
+
+async def import_records(
+    project_id: str, lines: AsyncIterator[bytes]
+) -> Promise[ImportData]:
+    """Load NDJSON records in the format of the export, `CONFIG.import_batch_size`
+    records per transaction.
+
+    Invalid lines are counted and reported, they don't abort the import. Caches
+    are invalidated once per user after the last batch.
+    """
+    stats = ImportData()
+    batch = ImportBatch()
+    profile_users, memory_users = set(), set()
+
+    def flush():
+        nonlocal batch
+        profiles, memory = write_import_batch(project_id, batch, stats)
+        profile_users.update(profiles)
+        memory_users.update(memory)
+        batch = ImportBatch()
+
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            record = IMPORT_RECORD.validate_json(line)
+            error = check_embedding(record)
+        except ValidationError as e:
+            error = "; ".join(
+                f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()
+            )
+        if error is not None:
+            stats.invalid += 1
+            if len(stats.errors) < MAX_IMPORT_ERRORS:
+                stats.errors.append(f"line {line_no}: {error}")
+            continue
+        if record.type == "blob":
+            stats.skipped += 1
+            continue
+        batch.add(record)
+        if len(batch) >= CONFIG.import_batch_size:
+            flush()
+    if len(batch):
+        flush()
+
+    await invalidate_imported_users(project_id, profile_users, memory_users)
+    TRACE_LOG.info(
+        project_id,
+        "",
+        f"Imported {stats.users} users, {stats.profiles} profiles, "
+        f"{stats.events} events, {stats.gists} gists, "
+        f"skipped {stats.skipped}, invalid {stats.invalid}",
+    )
+    return Promise.resolve(stats)
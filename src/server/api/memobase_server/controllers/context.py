@@ -1,20 +1,41 @@
+import asyncio
 from functools import partial
 from ..models.utils import Promise, CODE
-from ..models.response import ContextData, OpenAICompatibleMessage, UserEventGistsData
+from ..models.response import (
+    ContextData,
+    OpenAICompatibleMessage,
+    UserEventGistsData,
+    UserProfilesData,
+)
 from ..prompts.chat_context_pack import CONTEXT_PROMPT_PACK
 from ..utils import get_encoded_tokens, event_str_repr
 from ..env import CONFIG, TRACE_LOG
 from .project import get_project_profile_config
-from .profile import get_user_profiles, truncate_profiles
+from .profile import get_user_profiles, get_users_profiles, truncate_profiles
 from .post_process.profile import filter_profiles_with_chats
+from .context_snapshot import (
+    get_context_snapshot,
+    get_context_snapshots,
+    set_context_snapshot,
+    get_context_snapshot_params,
+    get_user_memory_version,
+    get_users_memory_versions,
+)
+from ..connectors import get_redis_client
 
 # from .event import get_user_events, search_user_events, truncate_events
 from .event_gist import (
     get_user_event_gists,
     truncate_event_gists,
     search_user_event_gists,
+    embed_search_query,
 )
 
+# Gists fetched for a context at most, fewer when the event token budget
+# can't hold that many gists of MIN_EVENT_GIST_TOKENS
+MAX_CONTEXT_EVENT_GISTS = 60
+MIN_EVENT_GIST_TOKENS = 10
+
 
 def customize_context_prompt_func(
     context_prompt: str, profile_section: str, event_section: str
@@ -38,12 +59,15 @@ async def get_user_profiles_data(
     topic_limits: dict[str, int],
     chats: list[OpenAICompatibleMessage],
     full_profile_and_only_search_event: bool,
+    user_profiles: UserProfilesData = None,
 ) -> Promise[tuple[str, list]]:
     """Retrieve and process user profiles."""
-    p = await get_user_profiles(user_id, project_id)
-    if not p.ok():
-        return p
-    total_profiles = p.data()
+    if user_profiles is None:
+        p = await get_user_profiles(user_id, project_id)
+        if not p.ok():
+            return p
+        user_profiles = p.data()
+    total_profiles = user_profiles
 
     if max_profile_token_size > 0:
         if chats and (not full_profile_and_only_search_event):
@@ -90,6 +114,10 @@ async def get_user_event_gists_data(
     require_event_summary: bool,
     event_similarity_threshold: float,
     time_range_in_days: int,
+    event_recency_half_life_days: float = None,
+    event_recency_weight: float = None,
+    query_embeddings: Promise = None,
+    topk: int = MAX_CONTEXT_EVENT_GISTS,
 ) -> Promise[UserEventGistsData]:
     """Retrieve user events data."""
     if chats and CONFIG.enable_event_embedding:
@@ -98,15 +126,18 @@ async def get_user_event_gists_data(
             user_id,
             project_id,
             query=search_query,
-            topk=60,
+            topk=topk,
             similarity_threshold=event_similarity_threshold,
             time_range_in_days=time_range_in_days,
+            recency_half_life_days=event_recency_half_life_days,
+            recency_weight=event_recency_weight,
+            query_embeddings=query_embeddings,
         )
     else:
         p = await get_user_event_gists(
             user_id,
             project_id,
-            topk=60,
+            topk=topk,
             time_range_in_days=time_range_in_days,
         )
     return p
@@ -128,9 +159,247 @@ async def get_user_context(
     customize_context_prompt: str = None,
     full_profile_and_only_search_event: bool = False,
     fill_window_with_events: bool = False,
+    event_recency_half_life_days: float = None,
+    event_recency_weight: float = None,
 ) -> Promise[ContextData]:
-    import asyncio
+    snapshot_params = context_snapshot_params(
+        max_token_size,
+        prefer_topics,
+        only_topics,
+        max_subtopic_size,
+        topic_limits,
+        profile_event_ratio,
+        require_event_summary,
+        chats,
+        time_range_in_days,
+        customize_context_prompt,
+        fill_window_with_events,
+    )
+    use_snapshot = snapshot_params is not None
+    if use_snapshot:
+        snapshot = await get_context_snapshot(user_id, project_id, snapshot_params)
+        if snapshot is not None:
+            return Promise.resolve(ContextData(context=snapshot))
+        async with get_redis_client() as redis_client:
+            version = await get_user_memory_version(redis_client, user_id, project_id)
+
+    p = await assemble_user_context(
+        user_id,
+        project_id,
+        max_token_size,
+        prefer_topics,
+        only_topics,
+        max_subtopic_size,
+        topic_limits,
+        profile_event_ratio,
+        require_event_summary,
+        chats,
+        event_similarity_threshold,
+        time_range_in_days,
+        customize_context_prompt=customize_context_prompt,
+        full_profile_and_only_search_event=full_profile_and_only_search_event,
+        fill_window_with_events=fill_window_with_events,
+        event_recency_half_life_days=event_recency_half_life_days,
+        event_recency_weight=event_recency_weight,
+    )
+    if use_snapshot and p.ok():
+        await set_context_snapshot(
+            user_id, project_id, snapshot_params, p.data().context, version
+        )
+    return p
+
+
+async def get_users_context(
+    user_ids: list[str],
+    project_id: str,
+    max_token_size: int,
+    prefer_topics: list[str],
+    only_topics: list[str],
+    max_subtopic_size: int,
+    topic_limits: dict[str, int],
+    profile_event_ratio: float,
+    require_event_summary: bool,
+    chats: list[OpenAICompatibleMessage],
+    event_similarity_threshold: float,
+    time_range_in_days: int,
+    customize_context_prompt: str = None,
+    full_profile_and_only_search_event: bool = False,
+    fill_window_with_events: bool = False,
+    event_recency_half_life_days: float = None,
+    event_recency_weight: float = None,
+) -> Promise[dict[str, ContextData]]:
+    """Contexts of many users for the same chats, like `get_user_context` for each.
+
+    Snapshots and profiles are read for all users at once and the chats are
+    embedded once, then the contexts are assembled concurrently.
+    """
+    user_ids = list(dict.fromkeys(str(user_id) for user_id in user_ids))
+    snapshot_params = context_snapshot_params(
+        max_token_size,
+        prefer_topics,
+        only_topics,
+        max_subtopic_size,
+        topic_limits,
+        profile_event_ratio,
+        require_event_summary,
+        chats,
+        time_range_in_days,
+        customize_context_prompt,
+        fill_window_with_events,
+    )
+    contexts = {}
+    if snapshot_params is not None:
+        snapshots = await get_context_snapshots(user_ids, project_id, snapshot_params)
+        for user_id, snapshot in zip(user_ids, snapshots):
+            if snapshot is not None:
+                contexts[user_id] = ContextData(context=snapshot)
+    pending = [user_id for user_id in user_ids if user_id not in contexts]
+    if not pending:
+        return Promise.resolve(contexts)
+    if snapshot_params is not None:
+        versions = await get_users_memory_versions(pending, project_id)
+
+    p = await get_users_profiles(pending, project_id)
+    if not p.ok():
+        return p
+    users_profiles = p.data()
+    query_embeddings = None
+    if (
+        chats
+        and CONFIG.enable_event_embedding
+        and CONFIG.event_search_method != "lexical"
+    ):
+        query_embeddings = await embed_search_query(project_id, pack_latest_chat(chats))
+
+    results = await asyncio.gather(
+        *[
+            assemble_user_context(
+                user_id,
+                project_id,
+                max_token_size,
+                prefer_topics,
+                only_topics,
+                max_subtopic_size,
+                topic_limits,
+                profile_event_ratio,
+                require_event_summary,
+                chats,
+                event_similarity_threshold,
+                time_range_in_days,
+                customize_context_prompt=customize_context_prompt,
+                full_profile_and_only_search_event=full_profile_and_only_search_event,
+                fill_window_with_events=fill_window_with_events,
+                event_recency_half_life_days=event_recency_half_life_days,
+                event_recency_weight=event_recency_weight,
+                user_profiles=users_profiles[user_id],
+                query_embeddings=query_embeddings,
+            )
+            for user_id in pending
+        ]
+    )
+    for user_id, p in zip(pending, results):
+        if not p.ok():
+            return p
+        contexts[user_id] = p.data()
+    if snapshot_params is not None:
+        await asyncio.gather(
+            *[
+                set_context_snapshot(
+                    user_id,
+                    project_id,
+                    snapshot_params,
+                    contexts[user_id].context,
+                    version,
+                )
+                for user_id, version in zip(pending, versions)
+            ]
+        )
+    return Promise.resolve({user_id: contexts[user_id] for user_id in user_ids})
 
+
+def context_snapshot_params(
+    max_token_size: int,
+    prefer_topics: list[str],
+    only_topics: list[str],
+    max_subtopic_size: int,
+    topic_limits: dict[str, int],
+    profile_event_ratio: float,
+    require_event_summary: bool,
+    chats: list[OpenAICompatibleMessage],
+    time_range_in_days: int,
+    customize_context_prompt: str = None,
+    fill_window_with_events: bool = False,
+) -> dict | None:
+    """Snapshot key params of a context request, `None` if it can't be snapshotted"""
+    if (
+        not CONFIG.enable_context_snapshot
+        or chats
+        or customize_context_prompt is not None
+    ):
+        return None
+    return {
+        "max_token_size": max_token_size,
+        "prefer_topics": prefer_topics,
+        "only_topics": only_topics,
+        "max_subtopic_size": max_subtopic_size,
+        "topic_limits": topic_limits,
+        "profile_event_ratio": profile_event_ratio,
+        "require_event_summary": require_event_summary,
+        "time_range_in_days": time_range_in_days,
+        "fill_window_with_events": fill_window_with_events,
+    }
+
+
+async def refresh_user_context_snapshots(
+    user_id: str, project_id: str
+) -> Promise[None]:
+    """Re-materialize every context shape this user has requested recently."""
+    if not CONFIG.enable_context_snapshot:
+        return Promise.resolve(None)
+    for snapshot_params in await get_context_snapshot_params(user_id, project_id):
+        async with get_redis_client() as redis_client:
+            version = await get_user_memory_version(redis_client, user_id, project_id)
+        p = await assemble_user_context(
+            user_id,
+            project_id,
+            chats=[],
+            event_similarity_threshold=0.2,
+            **snapshot_params,
+        )
+        if not p.ok():
+            TRACE_LOG.error(
+                project_id,
+                user_id,
+                f"Failed to refresh context snapshot: {p.msg()}",
+            )
+            return p
+        await set_context_snapshot(
+            user_id, project_id, snapshot_params, p.data().context, version
+        )
+    return Promise.resolve(None)
+
+
+async def assemble_user_context(
+    user_id: str,
+    project_id: str,
+    max_token_size: int,
+    prefer_topics: list[str],
+    only_topics: list[str],
+    max_subtopic_size: int,
+    topic_limits: dict[str, int],
+    profile_event_ratio: float,
+    require_event_summary: bool,
+    chats: list[OpenAICompatibleMessage],
+    event_similarity_threshold: float,
+    time_range_in_days: int,
+    customize_context_prompt: str = None,
+    full_profile_and_only_search_event: bool = False,
+    fill_window_with_events: bool = False,
+    event_recency_half_life_days: float = None,
+    event_recency_weight: float = None,
+    user_profiles: UserProfilesData = None,
+    query_embeddings: Promise = None,
+) -> Promise[ContextData]:
     assert 0 < profile_event_ratio <= 1, "profile_event_ratio must be between 0 and 1"
     max_profile_token_size = int(max_token_size * profile_event_ratio)
 
@@ -145,6 +414,14 @@ async def get_user_context(
             customize_context_prompt_func, customize_context_prompt
         )
 
+    # Gists are ranked in SQL, only as many as the event budget could hold are needed
+    max_event_budget = max_token_size
+    if not fill_window_with_events:
+        max_event_budget -= max_profile_token_size
+    event_topk = min(
+        MAX_CONTEXT_EVENT_GISTS, max(1, max_event_budget // MIN_EVENT_GIST_TOKENS)
+    )
+
     # Execute profile and event retrieval in parallel
     profile_result, event_gist_result = await asyncio.gather(
         get_user_profiles_data(
@@ -157,6 +434,7 @@ async def get_user_context(
             topic_limits,
             chats,
             full_profile_and_only_search_event,
+            user_profiles=user_profiles,
         ),
         get_user_event_gists_data(
             user_id,
@@ -165,6 +443,10 @@ async def get_user_context(
             require_event_summary,
             event_similarity_threshold,
             time_range_in_days,
+            event_recency_half_life_days,
+            event_recency_weight,
+            query_embeddings=query_embeddings,
+            topk=event_topk,
         ),
         return_exceptions=True,
     )
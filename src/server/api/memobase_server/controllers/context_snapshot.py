@@ -0,0 +1,195 @@
+"""
+Materialized `/users/context` results for requests without chats or custom prompts.
+
+Each user has two Redis hashes:
+- `user_context_snapshot::{project_id}::{user_id}`: params digest -> context string
+- `user_context_snapshot_params::{project_id}::{user_id}`: params digest -> params json
+
+Snapshots are dropped whenever the user's memory changes, while the params registry
+is kept so that the flush pipeline can re-materialize the shapes callers actually use.
+
+The same changes bump `user_memory_version::{project_id}::{user_id}`, which is sent as
+the ETag of `/users/context` and `/users/profile` so that clients can revalidate
+their cached copies with `If-None-Match` instead of refetching.
+"""
+
+import json
+import time
+import hashlib
+from datetime import datetime, timezone
+from ..connectors import get_redis_client
+from ..env import CONFIG, TRACE_LOG
+
+# Store the snapshot only if the memory version is still the one it was built from:
+# a context assembled while the memory changed must not outlive the invalidation
+REDIS_LUA_SET_SNAPSHOT_IF_VERSION = """
+if redis.call("get", KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call("hset", KEYS[2], ARGV[2], ARGV[3])
+redis.call("expire", KEYS[2], ARGV[4])
+return 1
+"""
+
+
+def user_context_snapshot_key(user_id: str, project_id: str) -> str:
+    return f"user_context_snapshot::{project_id}::{user_id}"
+
+
+def user_context_snapshot_params_key(user_id: str, project_id: str) -> str:
+    return f"user_context_snapshot_params::{project_id}::{user_id}"
+
+
+def user_memory_version_key(user_id: str, project_id: str) -> str:
+    return f"user_memory_version::{project_id}::{user_id}"
+
+
+def context_snapshot_field(params: dict) -> str:
+    raw = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+
+async def get_context_snapshot(
+    user_id: str, project_id: str, params: dict
+) -> str | None:
+    async with get_redis_client() as redis_client:
+        return await redis_client.hget(
+            user_context_snapshot_key(user_id, project_id),
+            context_snapshot_field(params),
+        )
+
+
+async def get_context_snapshots(
+    user_ids: list[str], project_id: str, params: dict
+) -> list[str | None]:
+    field = context_snapshot_field(params)
+    async with get_redis_client() as redis_client:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.hget(user_context_snapshot_key(user_id, project_id), field)
+            return await pipe.execute()
+
+
+async def set_context_snapshot(
+    user_id: str, project_id: str, params: dict, context: str, version: int
+) -> bool:
+    """Store a context assembled from memory `version`, read with
+    `get_user_memory_version` before assembling. Returns whether it was stored.
+    """
+    field = context_snapshot_field(params)
+    snapshot_key = user_context_snapshot_key(user_id, project_id)
+    params_key = user_context_snapshot_params_key(user_id, project_id)
+    async with get_redis_client() as redis_client:
+        registered = await redis_client.hexists(params_key, field)
+        if (
+            not registered
+            and await redis_client.hlen(params_key)
+            >= CONFIG.max_context_snapshots_per_user
+        ):
+            TRACE_LOG.warning(
+                project_id,
+                user_id,
+                f"Too many context snapshot shapes, skip materializing {params}",
+            )
+            return False
+        async with redis_client.pipeline(transaction=False) as pipe:
+            # The shape is registered either way, the next flush materializes it
+            pipe.hset(
+                params_key,
+                field,
+                json.dumps(params, sort_keys=True, ensure_ascii=False),
+            )
+            pipe.expire(params_key, CONFIG.cache_context_snapshot_params_ttl)
+            await pipe.execute()
+        stored = await redis_client.eval(
+            REDIS_LUA_SET_SNAPSHOT_IF_VERSION,
+            2,
+            user_memory_version_key(user_id, project_id),
+            snapshot_key,
+            str(version),
+            field,
+            context,
+            CONFIG.cache_context_snapshot_ttl,
+        )
+    return bool(stored)
+
+
+async def get_context_snapshot_params(user_id: str, project_id: str) -> list[dict]:
+    async with get_redis_client() as redis_client:
+        params = await redis_client.hvals(
+            user_context_snapshot_params_key(user_id, project_id)
+        )
+    return [json.loads(p) for p in params]
+
+
+async def get_user_memory_version(
+    redis_client, user_id: str, project_id: str, bump: bool = False
+) -> int:
+    version_key = user_memory_version_key(user_id, project_id)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        # A lost counter restarts from a new epoch, so stale versions never match again
+        pipe.set(version_key, time.time_ns(), nx=True)
+        if bump:
+            pipe.incr(version_key)
+        else:
+            pipe.get(version_key)
+        pipe.expire(version_key, CONFIG.cache_user_memory_version_ttl)
+        results = await pipe.execute()
+    return int(results[1])
+
+
+async def get_users_memory_versions(user_ids: list[str], project_id: str) -> list[int]:
+    async with get_redis_client() as redis_client:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                version_key = user_memory_version_key(user_id, project_id)
+                pipe.set(version_key, time.time_ns(), nx=True)
+                pipe.get(version_key)
+                pipe.expire(version_key, CONFIG.cache_user_memory_version_ttl)
+            results = await pipe.execute()
+    return [int(v) for v in results[1::3]]
+
+
+async def user_memory_etag(
+    user_id: str, project_id: str, params: dict, daily: bool = False
+) -> str:
+    """ETag of a memory read with `params`, `daily` for reads that age out by date"""
+    async with get_redis_client() as redis_client:
+        version = await get_user_memory_version(redis_client, user_id, project_id)
+    if daily:
+        params = {**params, "date": datetime.now(timezone.utc).date().isoformat()}
+    return f'W/"{version}-{context_snapshot_field(params)}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in [
+        t.strip() for t in if_none_match.split(",")
+    ]
+
+
+async def invalidate_user_context_snapshots(user_id: str, project_id: str) -> None:
+    async with get_redis_client() as redis_client:
+        # Bump first, a snapshot being stored from the old version is refused or deleted
+        await get_user_memory_version(redis_client, user_id, project_id, bump=True)
+        await redis_client.delete(user_context_snapshot_key(user_id, project_id))
+
+
+async def invalidate_project_context_snapshots(project_id: str) -> None:
+    async with get_redis_client() as redis_client:
+        keys = [
+            k
+            async for k in redis_client.scan_iter(
+                match=f"user_context_snapshot::{project_id}::*", count=500
+            )
+        ]
+        # Config changes reshape every context, drop the versions to start new epochs
+        keys += [
+            k
+            async for k in redis_client.scan_iter(
+                match=f"user_memory_version::{project_id}::*", count=500
+            )
+        ]
+        if keys:
+            await redis_client.delete(*keys)
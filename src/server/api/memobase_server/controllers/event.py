@@ -1,38 +1,78 @@
 from pydantic import ValidationError
-from ..models.database import UserEvent, UserEventGist
-from ..models.response import UserEventData, UserEventsData, EventData
+from ..models.database import UserEvent, UserEventGist, UserEventTag
+from ..models.response import UserEventData, UserEventsData, EventData, EventTag
 from ..models.utils import Promise, CODE
 from ..connectors import Session
-from ..utils import get_encoded_tokens, event_str_repr, event_embedding_str
+from ..utils import (
+    get_encoded_tokens,
+    event_str_repr,
+    event_embedding_str,
+    after_cursor,
+    encode_cursor,
+    recency_decay,
+    resolve_recency,
+    binary_prefilter,
+)
+from .context_snapshot import invalidate_user_context_snapshots
 
 from ..llms.embeddings import get_embedding
 from datetime import timedelta
-from sqlalchemy import desc, select
+from sqlalchemy import delete, desc, exists, select
 from sqlalchemy.sql import func
 from ..env import TRACE_LOG, CONFIG
 
 
+def event_tag_rows(
+    user_id: str, project_id: str, event_id: str, event_tags: list[EventTag] | None
+) -> list[UserEventTag]:
+    return [
+        UserEventTag(
+            event_id=event_id,
+            user_id=user_id,
+            project_id=project_id,
+            tag=et.tag,
+            value=et.value,
+        )
+        for et in event_tags or []
+    ]
+
+
 async def get_user_events(
     user_id: str,
     project_id: str,
     topk: int = 10,
     need_summary: bool = False,
     time_range_in_days: int = 21,
+    cursor: str = None,
 ) -> Promise[UserEventsData]:
     with Session() as session:
-        query = (
-            session.query(UserEvent)
-            .filter_by(user_id=user_id, project_id=project_id)
-            .filter(
+        query = session.query(UserEvent).filter_by(
+            user_id=user_id, project_id=project_id
+        )
+        # 0 lists every event, as cursor walks need
+        if time_range_in_days:
+            query = query.filter(
                 UserEvent.created_at > (func.now() - timedelta(days=time_range_in_days))
             )
-        )
+        if cursor is not None:
+            try:
+                query = query.filter(
+                    after_cursor(
+                        UserEvent.created_at, UserEvent.id, cursor, descending=True
+                    )
+                )
+            except ValueError as e:
+                return Promise.reject(CODE.BAD_REQUEST, str(e))
         # Abort this parameter because the summary is moved to gist
         # if need_summary:
         #     query = query.filter(
         #         UserEvent.event_data.contains({"event_tip": None}).is_(False)
         #     ).filter(UserEvent.event_data.has_key("event_tip"))
-        user_events = query.order_by(UserEvent.created_at.desc()).limit(topk).all()
+        user_events = (
+            query.order_by(UserEvent.created_at.desc(), UserEvent.id.desc())
+            .limit(topk)
+            .all()
+        )
         if user_events is None:
             return Promise.resolve(UserEventsData(events=[]))
         results = [
@@ -44,7 +84,10 @@ async def get_user_events(
             }
             for ue in user_events
         ]
-    events = UserEventsData(events=results)
+        next_cursor = None
+        if user_events and len(user_events) == topk:
+            next_cursor = encode_cursor(user_events[-1].created_at, user_events[-1].id)
+    events = UserEventsData(events=results, next_cursor=next_cursor)
     return Promise.resolve(events)
 
 
@@ -61,6 +104,11 @@ async def truncate_events(
         if c_tokens > max_token_size:
             break
         truncated_results.append(r)
+    if len(truncated_results) < len(events.events):
+        # Resume right after the last event that fits. An event that alone
+        # exceeds the budget can never fit, so step past it to keep the walk going
+        last = truncated_results[-1] if truncated_results else events.events[0]
+        events.next_cursor = encode_cursor(last.created_at, last.id)
     events.events = truncated_results
     return Promise.resolve(events)
 
@@ -149,6 +197,11 @@ async def append_user_event(
             embedding=embedding[0],
         )
         session.add(user_event)
+        session.add_all(
+            event_tag_rows(
+                user_id, project_id, user_event.id, validated_event.event_tags
+            )
+        )
         for event_gist_data in event_gist_dbs:
             session.add(
                 UserEventGist(
@@ -161,6 +214,7 @@ async def append_user_event(
             )
         session.commit()
         eid = user_event.id
+    await invalidate_user_context_snapshots(user_id, project_id)
     return Promise.resolve(eid)
 
 
@@ -180,6 +234,7 @@ async def delete_user_event(
             )
         session.delete(user_event)
         session.commit()
+    await invalidate_user_context_snapshots(user_id, project_id)
     return Promise.resolve(None)
 
 
@@ -187,7 +242,7 @@ async def update_user_event(
     user_id: str, project_id: str, event_id: str, event_data: dict
 ) -> Promise[None]:
     try:
-        EventData(**event_data)
+        validated_event = EventData(**event_data)
     except ValidationError as e:
         return Promise.reject(
             CODE.INTERNAL_SERVER_ERROR,
@@ -209,7 +264,20 @@ async def update_user_event(
         new_events.update(need_to_update)
 
         user_event.event_data = new_events
+        if validated_event.event_tags is not None:
+            session.execute(
+                delete(UserEventTag).where(
+                    UserEventTag.event_id == user_event.id,
+                    UserEventTag.project_id == project_id,
+                )
+            )
+            session.add_all(
+                event_tag_rows(
+                    user_id, project_id, user_event.id, validated_event.event_tags
+                )
+            )
         session.commit()
+    await invalidate_user_context_snapshots(user_id, project_id)
     return Promise.resolve(None)
 
 
@@ -220,6 +288,8 @@ async def search_user_events(
     topk: int = 10,
     similarity_threshold: float = 0.2,
     time_range_in_days: int = 21,
+    recency_half_life_days: float = None,
+    recency_weight: float = None,
 ) -> Promise[UserEventsData]:
     if not CONFIG.enable_event_embedding:
         TRACE_LOG.warning(
@@ -244,22 +314,35 @@ async def search_user_events(
         return query_embeddings
     query_embedding = query_embeddings.data()[0]
 
-    stmt = (
-        select(
-            UserEvent,
-            (1 - UserEvent.embedding.cosine_distance(query_embedding)).label(
-                "similarity"
-            ),
+    similarity = 1 - UserEvent.embedding.cosine_distance(query_embedding)
+    filters = [UserEvent.user_id == user_id, UserEvent.project_id == project_id]
+    recency = resolve_recency(recency_half_life_days, recency_weight)
+    if recency is None:
+        filters.append(
+            UserEvent.created_at > func.now() - timedelta(days=time_range_in_days)
         )
-        .where(UserEvent.user_id == user_id, UserEvent.project_id == project_id)
-        .where(UserEvent.created_at > func.now() - timedelta(days=time_range_in_days))
-        .where(
-            (1 - UserEvent.embedding.cosine_distance(query_embedding))
-            > similarity_threshold
+        order = similarity
+    else:
+        half_life_days, weight = recency
+        order = (1 - weight) * similarity + weight * recency_decay(
+            UserEvent.created_at, half_life_days
         )
-        .order_by(desc("similarity"))
+    stmt = (
+        select(UserEvent, similarity.label("similarity"))
+        .where(*filters, similarity > similarity_threshold)
+        .order_by(desc(order))
         .limit(topk)
     )
+    if CONFIG.embedding_storage == "binary":
+        # Exact cosine rerank over the hamming-nearest candidates
+        stmt = stmt.where(
+            binary_prefilter(
+                UserEvent,
+                query_embedding,
+                filters,
+                topk * CONFIG.embedding_binary_rerank_factor,
+            )
+        )
 
     with Session() as session:
         # Use .all() instead of .scalars().all() to get both columns
@@ -314,33 +397,25 @@ async def filter_user_events(
             user_id=user_id, project_id=project_id
         )
 
-        # Apply tag filters if provided
-        if has_event_tag or event_tag_equal:
-            # Build filter conditions for events that have event_tags
-            query = query.filter(UserEvent.event_data.has_key("event_tags"))
-            query = query.filter(UserEvent.event_data["event_tags"].isnot(None))
-
-            # Filter by tag existence (has_event_tag)
-            if has_event_tag:
-                for tag_name in has_event_tag:
-                    # Check if any event_tag in the array has the specified tag name
-                    query = query.filter(
-                        UserEvent.event_data["event_tags"].op("@>")(
-                            f'[{{"tag": "{tag_name}"}}]'
-                        )
-                    )
-
-            # Filter by exact tag-value pairs (event_tag_equal)
-            if event_tag_equal:
-                for tag_name, tag_value in event_tag_equal.items():
-                    # Check if any event_tag in the array has both the tag name and value
-                    query = query.filter(
-                        UserEvent.event_data["event_tags"].op("@>")(
-                            f'[{{"tag": "{tag_name}", "value": "{tag_value}"}}]'
-                        )
-                    )
-
-        user_events = query.order_by(UserEvent.created_at.desc()).limit(topk).all()
+        # Every tag condition is an indexed lookup on user_event_tags
+        tag_conditions = [(tag_name, None) for tag_name in has_event_tag or []]
+        tag_conditions.extend((event_tag_equal or {}).items())
+        for tag_name, tag_value in tag_conditions:
+            condition = exists().where(
+                UserEventTag.event_id == UserEvent.id,
+                UserEventTag.user_id == user_id,
+                UserEventTag.project_id == project_id,
+                UserEventTag.tag == tag_name,
+            )
+            if tag_value is not None:
+                condition = condition.where(UserEventTag.value == tag_value)
+            query = query.filter(condition)
+
+        user_events = (
+            query.order_by(UserEvent.created_at.desc(), UserEvent.id.desc())
+            .limit(topk)
+            .all()
+        )
 
         if user_events is None:
             return Promise.resolve(UserEventsData(events=[]))
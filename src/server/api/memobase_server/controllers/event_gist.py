@@ -1,13 +1,24 @@
 from pydantic import ValidationError
-from ..models.database import UserEventGist
+from ..models.database import UserEventGist, GIST_SEARCH_QUERY_CONFIG
 from ..models.response import UserEventGistsData, UserEventGistData
 from ..models.utils import Promise, CODE
 from ..connectors import Session
-from ..utils import get_encoded_tokens, event_str_repr, event_embedding_str
+from ..utils import (
+    get_encoded_tokens,
+    event_str_repr,
+    event_embedding_str,
+    after_cursor,
+    encode_cursor,
+    recency_decay,
+    resolve_recency,
+    binary_prefilter,
+)
 
 from ..llms.embeddings import get_embedding
+from typing import Literal
 from datetime import timedelta
-from sqlalchemy import desc, select
+from sqlalchemy import Float, String, and_, cast, desc, null, select
+from sqlalchemy.dialects.postgresql import TSQUERY
 from sqlalchemy.sql import func
 from ..env import TRACE_LOG, CONFIG
 
@@ -17,6 +28,7 @@ async def get_user_event_gists(
     project_id: str,
     topk: int = 10,
     time_range_in_days: int = 21,
+    cursor: str = None,
 ) -> Promise[UserEventGistsData]:
     with Session() as session:
         query = (
@@ -27,8 +39,22 @@ async def get_user_event_gists(
                 > (func.now() - timedelta(days=time_range_in_days))
             )
         )
+        if cursor is not None:
+            try:
+                query = query.filter(
+                    after_cursor(
+                        UserEventGist.created_at,
+                        UserEventGist.id,
+                        cursor,
+                        descending=True,
+                    )
+                )
+            except ValueError as e:
+                return Promise.reject(CODE.BAD_REQUEST, str(e))
         user_event_gists = (
-            query.order_by(UserEventGist.created_at.desc()).limit(topk).all()
+            query.order_by(UserEventGist.created_at.desc(), UserEventGist.id.desc())
+            .limit(topk)
+            .all()
         )
         if user_event_gists is None:
             return Promise.resolve(UserEventGistsData(gists=[]))
@@ -41,7 +67,12 @@ async def get_user_event_gists(
             }
             for ue in user_event_gists
         ]
-    gists = UserEventGistsData(gists=results)
+        next_cursor = None
+        if user_event_gists and len(user_event_gists) == topk:
+            next_cursor = encode_cursor(
+                user_event_gists[-1].created_at, user_event_gists[-1].id
+            )
+    gists = UserEventGistsData(gists=results, next_cursor=next_cursor)
     return Promise.resolve(gists)
 
 
@@ -62,6 +93,12 @@ async def truncate_event_gists(
     return Promise.resolve(events)
 
 
+async def embed_search_query(project_id: str, query: str) -> Promise:
+    return await get_embedding(
+        project_id, [query], phase="query", model=CONFIG.embedding_model
+    )
+
+
 async def search_user_event_gists(
     user_id: str,
     project_id: str,
@@ -69,8 +106,16 @@ async def search_user_event_gists(
     topk: int = 10,
     similarity_threshold: float = 0.2,
     time_range_in_days: int = 21,
+    search_method: Literal["vector", "lexical", "hybrid"] = None,
+    recency_half_life_days: float = None,
+    recency_weight: float = None,
+    query_embeddings: Promise = None,
 ) -> Promise[UserEventGistsData]:
-    if not CONFIG.enable_event_embedding:
+    """`query_embeddings` is the result of `embed_search_query`, when the same query
+    is searched for many users"""
+    search_method = search_method or CONFIG.event_search_method
+    recency = resolve_recency(recency_half_life_days, recency_weight)
+    if search_method == "vector" and not CONFIG.enable_event_embedding:
         TRACE_LOG.warning(
             project_id,
             user_id,
@@ -80,37 +125,122 @@ async def search_user_event_gists(
             CODE.NOT_IMPLEMENTED,
             "Event embedding is not enabled",
         )
-    query_embeddings = await get_embedding(
-        project_id, [query], phase="query", model=CONFIG.embedding_model
-    )
-    if not query_embeddings.ok():
-        TRACE_LOG.error(
-            project_id,
-            user_id,
-            f"Failed to get embeddings: {query_embeddings.msg()}",
-        )
-        return query_embeddings
-    query_embedding = query_embeddings.data()[0]
+    query_embedding = None
+    if search_method != "lexical" and CONFIG.enable_event_embedding:
+        if query_embeddings is None:
+            query_embeddings = await embed_search_query(project_id, query)
+        if not query_embeddings.ok():
+            TRACE_LOG.error(
+                project_id,
+                user_id,
+                f"Failed to get embeddings: {query_embeddings.msg()}",
+            )
+            if search_method == "vector":
+                return query_embeddings
+        else:
+            query_embedding = query_embeddings.data()[0]
 
     # Calculate the time cutoff once
     time_cutoff = func.now() - timedelta(days=time_range_in_days)
+    base_filters = [
+        UserEventGist.user_id == user_id,
+        UserEventGist.project_id == project_id,
+    ]
+    if recency is None:
+        base_filters.append(UserEventGist.created_at > time_cutoff)
+    # else the decay below replaces the hard window as a soft prior
+    candidates = max(topk * CONFIG.event_search_candidate_factor, topk)
 
-    # Store the similarity expression to avoid recomputation
-    similarity_expr = 1 - UserEventGist.embedding.cosine_distance(query_embedding)
+    # Each retriever is a ranked candidate list, fused below with reciprocal ranks
+    retrievers = []
+    semantic = None
+    if search_method != "vector":
+        # OR the query terms, ts_rank_cd rewards documents matching more of them.
+        # Stopwords are dropped, they'd match nearly every gist
+        ts_query = cast(
+            func.replace(
+                cast(func.plainto_tsquery(GIST_SEARCH_QUERY_CONFIG, query), String),
+                "&",
+                "|",
+            ),
+            TSQUERY,
+        )
+        # Normalization 1 divides by 1 + log(length), a BM25-like length penalty
+        lexical_score = func.ts_rank_cd(UserEventGist.search_vector, ts_query, 1)
+        lexical = (
+            select(
+                UserEventGist.id.label("id"),
+                func.row_number().over(order_by=lexical_score.desc()).label("rank"),
+            )
+            .where(*base_filters, UserEventGist.search_vector.op("@@")(ts_query))
+            .order_by(lexical_score.desc())
+            .limit(candidates)
+            .cte("lexical")
+        )
+        retrievers.append(lexical)
+    if query_embedding is not None:
+        distance = UserEventGist.embedding.cosine_distance(query_embedding)
+        semantic_filters = [
+            *base_filters,
+            UserEventGist.embedding.is_not(None),  # Skip null embeddings
+            (1 - distance) > similarity_threshold,
+        ]
+        if CONFIG.embedding_storage == "binary":
+            # Exact cosine rerank over the hamming-nearest candidates
+            semantic_filters.append(
+                binary_prefilter(
+                    UserEventGist,
+                    query_embedding,
+                    base_filters,
+                    candidates * CONFIG.embedding_binary_rerank_factor,
+                )
+            )
+        semantic = (
+            select(
+                UserEventGist.id.label("id"),
+                func.row_number().over(order_by=distance).label("rank"),
+                (1 - distance).label("similarity"),
+            )
+            .where(*semantic_filters)
+            .order_by(distance)
+            .limit(candidates)
+            .cte("semantic")
+        )
+        retrievers.append(semantic)
 
+    joined = retrievers[0]
+    gist_id = retrievers[0].c.id
+    for retriever in retrievers[1:]:
+        joined = joined.join(retriever, retriever.c.id == gist_id, full=True)
+        gist_id = func.coalesce(gist_id, retriever.c.id)
+    if retrievers == [semantic]:
+        relevance = semantic.c.similarity
+    else:
+        # Reciprocal-rank fusion, scaled to [0, 1] by the best possible score
+        relevance = sum(
+            func.coalesce(1.0 / (CONFIG.event_search_rrf_k + r.c.rank), 0)
+            for r in retrievers
+        ) / (len(retrievers) / (CONFIG.event_search_rrf_k + 1.0))
+    score = relevance
+    if recency is not None:
+        half_life_days, weight = recency
+        score = (1 - weight) * relevance + weight * recency_decay(
+            UserEventGist.created_at, half_life_days
+        )
     stmt = (
         select(
             UserEventGist,
-            similarity_expr.label("similarity"),
+            (semantic.c.similarity if semantic is not None else null()).label(
+                "similarity"
+            ),
+            cast(score, Float).label("score"),
         )
-        .where(
-            UserEventGist.user_id == user_id,
-            UserEventGist.project_id == project_id,
-            UserEventGist.created_at > time_cutoff,
-            similarity_expr > similarity_threshold,
-            UserEventGist.embedding.is_not(None),  # Skip null embeddings
+        .select_from(joined)
+        .join(
+            UserEventGist,
+            and_(UserEventGist.id == gist_id, UserEventGist.project_id == project_id),
         )
-        .order_by(desc("similarity"))
+        .order_by(desc("score"))
         .limit(topk)
     )
 
@@ -128,6 +258,7 @@ async def search_user_event_gists(
                     created_at=user_event.created_at,
                     updated_at=user_event.updated_at,
                     similarity=similarity,
+                    score=row[2],
                 )
             )
 
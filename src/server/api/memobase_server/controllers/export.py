@@ -0,0 +1,124 @@
+from typing import Iterator, Literal, Optional
+import orjson
+from sqlalchemy import select, cast
+from ..models.database import (
+    User,
+    GeneralBlob,
+    UserProfile,
+    UserEvent,
+    UserEventGist,
+    EmbeddingVector,
+)
+from ..connectors import Session
+from ..env import CONFIG
+
+ExportRecordType = Literal["user", "blob", "profile", "event", "gist"]
+
+# Parents before children, so that an import can replay the stream in order
+EXPORT_RECORD_TYPES: tuple[ExportRecordType, ...] = (
+    "user",
+    "blob",
+    "profile",
+    "event",
+    "gist",
+)
+
+EXPORT_COLUMNS = {
+    "user": (User, [User.id, User.additional_fields.label("data")]),
+    "blob": (
+        GeneralBlob,
+        [
+            GeneralBlob.id,
+            GeneralBlob.user_id,
+            GeneralBlob.blob_type,
+            GeneralBlob.blob_data,
+            GeneralBlob.additional_fields,
+        ],
+    ),
+    "profile": (
+        UserProfile,
+        [
+            UserProfile.id,
+            UserProfile.user_id,
+            UserProfile.content,
+            UserProfile.attributes,
+        ],
+    ),
+    "event": (UserEvent, [UserEvent.id, UserEvent.user_id, UserEvent.event_data]),
+    "gist": (
+        UserEventGist,
+        [
+            UserEventGist.id,
+            UserEventGist.user_id,
+            UserEventGist.event_id,
+            UserEventGist.gist_data,
+        ],
+    ),
+}
+
+
+def export_statement(
+    record_type: ExportRecordType,
+    project_id: str,
+    user_id: Optional[str] = None,
+    include_embeddings: bool = False,
+):
+    model, columns = EXPORT_COLUMNS[record_type]
+    columns = columns + [model.created_at, model.updated_at]
+    if include_embeddings and record_type in ("event", "gist"):
+        # Same float list in every `embedding_storage` mode
+        columns.append(
+            cast(model.embedding, EmbeddingVector(dim=CONFIG.embedding_dim)).label(
+                "embedding"
+            )
+        )
+    stmt = select(*columns).where(model.project_id == project_id)
+    if user_id is not None:
+        user_column = model.id if model is User else model.user_id
+        stmt = stmt.where(user_column == user_id)
+    return stmt
+
+
+def export_record(record_type: ExportRecordType, row) -> dict:
+    record = {"type": record_type, **row._asdict()}
+    if record.get("embedding") is not None:
+        record["embedding"] = record["embedding"].tolist()
+    return record
+
+
+def iter_export_lines(
+    project_id: str,
+    user_id: Optional[str] = None,
+    record_types: Optional[list[ExportRecordType]] = None,
+    include_embeddings: bool = False,
+    batch_size: int = None,
+) -> Iterator[bytes]:
+    """NDJSON lines of the memory of a project or one of its users.
+
+    Rows are read through server-side cursors `batch_size` at a time and every
+    batch is yielded as one chunk, memory stays flat whatever the project size.
+    All record types are read in one REPEATABLE READ transaction, so children
+    written during a long export never point to parents missing from it.
+    Blocking, `StreamingResponse` iterates it in the threadpool.
+    """
+    batch_size = batch_size or CONFIG.export_batch_size
+    wanted = set(record_types or EXPORT_RECORD_TYPES)
+    with Session() as session:
+        session.connection(
+            execution_options={
+                "isolation_level": "REPEATABLE READ",
+                "postgresql_readonly": True,
+            }
+        )
+        for record_type in EXPORT_RECORD_TYPES:
+            if record_type not in wanted:
+                continue
+            stmt = export_statement(
+                record_type, project_id, user_id, include_embeddings
+            )
+            rows = session.execute(stmt.execution_options(yield_per=batch_size))
+            for batch in rows.partitions():
+                yield b"".join(
+                    orjson.dumps(export_record(record_type, row)) + b"\n"
+                    for row in batch
+                )
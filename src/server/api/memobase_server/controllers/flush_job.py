@@ -0,0 +1,88 @@
+import uuid
+import asyncio
+from ..models.utils import Promise
+from ..models.response import CODE, ChatModalResponse, FlushJobData
+from ..models.blob import BlobType
+from ..connectors import get_redis_client
+from ..env import CONFIG, TRACE_LOG
+
+
+def flush_job_key(project_id: str, job_id: str) -> str:
+    return f"flush_job::{project_id}::{job_id}"
+
+
+def flush_job_channel(project_id: str, job_id: str) -> str:
+    return f"flush_job_done::{project_id}::{job_id}"
+
+
+async def create_flush_job(user_id: str, project_id: str, blob_type: BlobType) -> str:
+    job_id = str(uuid.uuid4())
+    job = FlushJobData(
+        job_id=job_id, user_id=user_id, blob_type=str(blob_type), status="pending"
+    )
+    async with get_redis_client() as redis_client:
+        await redis_client.set(
+            flush_job_key(project_id, job_id),
+            job.model_dump_json(),
+            ex=CONFIG.flush_job_ttl,
+        )
+    return job_id
+
+
+async def finish_flush_job(
+    project_id: str, job_id: str, p: Promise[ChatModalResponse | None]
+) -> None:
+    """Record the outcome of a flush and wake up its waiters"""
+    key = flush_job_key(project_id, job_id)
+    try:
+        async with get_redis_client() as redis_client:
+            raw = await redis_client.get(key)
+            if raw is None:
+                return
+            job = FlushJobData.model_validate_json(raw)
+            if p.ok():
+                job.status, job.result = "done", p.data()
+            else:
+                job.status, job.error = "failed", p.msg()
+            payload = job.model_dump_json()
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.set(key, payload, ex=CONFIG.flush_job_ttl)
+                pipe.publish(flush_job_channel(project_id, job_id), payload)
+                await pipe.execute()
+    except Exception as e:
+        # The flush itself is done, only its notification is lost
+        TRACE_LOG.error(project_id, None, f"Failed to finish flush job {job_id}: {e}")
+
+
+async def get_flush_job(project_id: str, job_id: str) -> Promise[FlushJobData]:
+    async with get_redis_client() as redis_client:
+        raw = await redis_client.get(flush_job_key(project_id, str(job_id)))
+    if raw is None:
+        return Promise.reject(
+            CODE.NOT_FOUND, f"Flush job {job_id} not found or expired"
+        )
+    return Promise.resolve(FlushJobData.model_validate_json(raw))
+
+
+async def wait_flush_job(
+    project_id: str, job_id: str, timeout: float
+) -> Promise[FlushJobData]:
+    """Long-poll a flush job until it has finished or `timeout` seconds passed."""
+    job_id = str(job_id)
+    async with get_redis_client() as redis_client:
+        async with redis_client.pubsub() as pubsub:
+            # Subscribe before reading, a flush finishing in between isn't missed
+            await pubsub.subscribe(flush_job_channel(project_id, job_id))
+            p = await get_flush_job(project_id, job_id)
+            if not p.ok() or p.data().status != "pending":
+                return p
+            deadline = asyncio.get_running_loop().time() + timeout
+            while (left := deadline - asyncio.get_running_loop().time()) > 0:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=left
+                )
+                if message is not None and message["type"] == "message":
+                    return Promise.resolve(
+                        FlushJobData.model_validate_json(message["data"])
+                    )
+    return p
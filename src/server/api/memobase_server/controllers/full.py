@@ -8,3 +8,7 @@ from . import event
 from . import event_gist
 from . import context
 from . import billing
+from . import context_snapshot
+from . import export
+from . import bulk_import
+from . import flush_job
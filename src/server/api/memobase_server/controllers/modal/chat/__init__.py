@@ -9,6 +9,7 @@ from ....models.response import IdsData, ChatModalResponse, UserProfilesData
 from ...profile import add_update_delete_user_profiles
 from ...event import append_user_event
 from ...profile import get_user_profiles
+from ...context import refresh_user_context_snapshots
 from .extract import extract_topics
 
 # from .merge import merge_or_valid_new_memos
@@ -242,4 +243,7 @@ async def handle_user_profile_db(
         [up["attributes"] for up in intermediate_profile["update"]],
         intermediate_profile["delete"],
     )
+    if not p.ok():
+        return p
+    await refresh_user_context_snapshots(user_id, project_id)
     return p
@@ -1,10 +1,26 @@
+import time
+import asyncio
+import orjson
+from uuid import UUID
+from datetime import datetime
 from pydantic import ValidationError
+from sqlalchemy import update, values, column, func, cast, TEXT
+from sqlalchemy.dialects.postgresql import JSONB, UUID as UUID_TYPE
 from ..models.utils import Promise
 from ..models.database import GeneralBlob, UserProfile
-from ..models.response import CODE, IdData, IdsData, UserProfilesData, ProfileAttributes
+from ..models.response import (
+    CODE,
+    IdData,
+    IdsData,
+    UserProfilesData,
+    ProfileData,
+    ProfileAttributes,
+)
 from ..connectors import Session, get_redis_client
-from ..utils import get_encoded_tokens
+from .context_snapshot import invalidate_user_context_snapshots
+from ..utils import get_encoded_tokens, LRUCache
 from ..env import CONFIG, TRACE_LOG
+from ..telemetry import telemetry_manager, CounterMetricName
 
 
 async def truncate_profiles(
@@ -72,33 +88,41 @@ async def truncate_profiles(
     return Promise.resolve(profiles)
 
 
-async def get_user_profiles(user_id: str, project_id: str) -> Promise[UserProfilesData]:
-    async with get_redis_client() as redis_client:
-        user_profiles = await redis_client.get(
-            f"user_profiles::{project_id}::{user_id}"
-        )
-        if user_profiles:
-            try:
-                return Promise.resolve(
-                    UserProfilesData.model_validate_json(user_profiles)
-                )
-            except ValidationError as e:
-                TRACE_LOG.error(
-                    project_id,
-                    user_id,
-                    f"Invalid user profiles: {e}",
-                )
-                await redis_client.delete(f"user_profiles::{project_id}::{user_id}")
+def user_profiles_cache_key(user_id: str, project_id: str) -> str:
+    return f"user_profiles::{project_id}::{user_id}"
+
+
+def user_profiles_version_key(user_id: str, project_id: str) -> str:
+    return f"user_profiles_version::{project_id}::{user_id}"
+
+
+# Parsed profiles of hot users, validated against the Redis version counter on read
+PROFILE_LRU_CACHE = LRUCache(
+    max_items=CONFIG.profile_lru_cache_max_users,
+    max_bytes=CONFIG.profile_lru_cache_max_bytes,
+)
+
+# In-flight cache rebuilds of this process, so that concurrent misses of the same
+# user wait for one SQL scan instead of stampeding the database.
+_PROFILE_CACHE_REBUILDS: dict[str, asyncio.Future] = {}
+
+
+def load_users_profiles(
+    user_ids: list[str], project_id: str
+) -> dict[str, UserProfilesData]:
+    results = {str(user_id): [] for user_id in user_ids}
     with Session() as session:
         user_profiles = (
             session.query(UserProfile)
-            .filter_by(user_id=user_id, project_id=project_id)
+            .filter(
+                UserProfile.user_id.in_(user_ids),
+                UserProfile.project_id == project_id,
+            )
             .order_by(UserProfile.updated_at.desc())
             .all()
         )
-        results = []
         for up in user_profiles:
-            results.append(
+            results[str(up.user_id)].append(
                 {
                     "id": up.id,
                     "content": up.content,
@@ -107,14 +131,229 @@ async def get_user_profiles(user_id: str, project_id: str) -> Promise[UserProfil
                     "updated_at": up.updated_at,
                 }
             )
-    return_profiles = UserProfilesData(profiles=results)
+    return {
+        user_id: UserProfilesData(profiles=profiles)
+        for user_id, profiles in results.items()
+    }
+
+
+def load_user_profiles(user_id: str, project_id: str) -> UserProfilesData:
+    return load_users_profiles([user_id], project_id)[str(user_id)]
+
+
+def encode_user_profiles(version: int, profiles: UserProfilesData) -> bytes:
+    return orjson.dumps(
+        {
+            "v": version,
+            "p": [
+                [p.id, p.content, p.attributes, p.created_at, p.updated_at]
+                for p in profiles.profiles
+            ],
+        }
+    )
+
+
+def decode_user_profiles(raw: str | bytes) -> tuple[int, UserProfilesData]:
+    data = orjson.loads(raw)
+    # Trusted payload written by encode_user_profiles, skip re-validation
+    profiles = [
+        ProfileData.model_construct(
+            id=UUID(pid),
+            content=content,
+            attributes=attributes,
+            created_at=datetime.fromisoformat(created_at),
+            updated_at=datetime.fromisoformat(updated_at),
+        )
+        for pid, content, attributes, created_at, updated_at in data["p"]
+    ]
+    return data["v"], UserProfilesData.model_construct(profiles=profiles)
+
+
+async def get_user_profiles_version(
+    redis_client, user_id: str, project_id: str, bump: bool = False
+) -> int:
+    version_key = user_profiles_version_key(user_id, project_id)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        # A lost counter restarts from a new epoch, so stale versions never match again
+        pipe.set(version_key, time.time_ns(), nx=True)
+        if bump:
+            pipe.incr(version_key)
+        else:
+            pipe.get(version_key)
+        pipe.expire(version_key, CONFIG.cache_user_profiles_version_ttl)
+        results = await pipe.execute()
+    return int(results[1])
+
+
+async def write_user_profiles_cache(
+    user_id: str, project_id: str, bump_version: bool = False
+) -> UserProfilesData:
     async with get_redis_client() as redis_client:
+        version = await get_user_profiles_version(
+            redis_client, user_id, project_id, bump=bump_version
+        )
+        profiles = load_user_profiles(user_id, project_id)
+        encoded = encode_user_profiles(version, profiles)
         await redis_client.set(
-            f"user_profiles::{project_id}::{user_id}",
-            return_profiles.model_dump_json(),
+            user_profiles_cache_key(user_id, project_id),
+            encoded,
             ex=CONFIG.cache_user_profiles_ttl,
         )
-    return Promise.resolve(return_profiles)
+    PROFILE_LRU_CACHE.set(
+        user_profiles_cache_key(user_id, project_id), (version, profiles), len(encoded)
+    )
+    return profiles
+
+
+def copy_user_profiles(profiles: UserProfilesData) -> UserProfilesData:
+    # Cached profiles are shared, while truncate_profiles sorts the list in place
+    # and the merge step bumps update_hits inside attributes
+    return UserProfilesData.model_construct(
+        profiles=[
+            p.model_copy(
+                update={"attributes": dict(p.attributes) if p.attributes else None}
+            )
+            for p in profiles.profiles
+        ]
+    )
+
+
+async def get_user_profiles(user_id: str, project_id: str) -> Promise[UserProfilesData]:
+    cache_key = user_profiles_cache_key(user_id, project_id)
+    async with get_redis_client() as redis_client:
+        version = await redis_client.get(user_profiles_version_key(user_id, project_id))
+        if version is not None:
+            version = int(version)
+            cached = PROFILE_LRU_CACHE.get(cache_key)
+            if cached is not None and cached[0] == version:
+                telemetry_manager.increment_counter_metric(
+                    CounterMetricName.PROFILE_CACHE_HIT,
+                    1,
+                    {"project_id": project_id, "tier": "memory"},
+                )
+                return Promise.resolve(copy_user_profiles(cached[1]))
+
+            user_profiles = await redis_client.get(cache_key)
+            if user_profiles:
+                try:
+                    cached_version, profiles = decode_user_profiles(user_profiles)
+                except (orjson.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+                    TRACE_LOG.error(
+                        project_id,
+                        user_id,
+                        f"Invalid user profiles: {e}",
+                    )
+                    cached_version, profiles = None, None
+                if cached_version == version:
+                    PROFILE_LRU_CACHE.set(
+                        cache_key, (version, profiles), len(user_profiles)
+                    )
+                    telemetry_manager.increment_counter_metric(
+                        CounterMetricName.PROFILE_CACHE_HIT,
+                        1,
+                        {"project_id": project_id, "tier": "redis"},
+                    )
+                    return Promise.resolve(copy_user_profiles(profiles))
+    telemetry_manager.increment_counter_metric(
+        CounterMetricName.PROFILE_CACHE_MISS, 1, {"project_id": project_id}
+    )
+
+    rebuilding = _PROFILE_CACHE_REBUILDS.get(cache_key)
+    if rebuilding is not None:
+        telemetry_manager.increment_counter_metric(
+            CounterMetricName.PROFILE_CACHE_STAMPEDE, 1, {"project_id": project_id}
+        )
+        profiles = await asyncio.shield(rebuilding)
+        return Promise.resolve(copy_user_profiles(profiles))
+
+    rebuilding = asyncio.get_running_loop().create_future()
+    _PROFILE_CACHE_REBUILDS[cache_key] = rebuilding
+    try:
+        profiles = await write_user_profiles_cache(user_id, project_id)
+        rebuilding.set_result(profiles)
+    except Exception as e:
+        rebuilding.set_exception(e)
+        # Mark as retrieved, the waiters (if any) will re-raise it
+        rebuilding.exception()
+        raise
+    finally:
+        _PROFILE_CACHE_REBUILDS.pop(cache_key, None)
+    return Promise.resolve(copy_user_profiles(profiles))
+
+
+async def get_users_profiles(
+    user_ids: list[str], project_id: str
+) -> Promise[dict[str, UserProfilesData]]:
+    """Profiles of many users, with one Redis MGET for the cached ones and one SQL
+    query for the rest"""
+    user_ids = list(dict.fromkeys(str(user_id) for user_id in user_ids))
+    results = {}
+    hits = {"memory": 0, "redis": 0}
+    async with get_redis_client() as redis_client:
+        cached = await redis_client.mget(
+            [user_profiles_version_key(u, project_id) for u in user_ids]
+            + [user_profiles_cache_key(u, project_id) for u in user_ids]
+        )
+        for user_id, version, user_profiles in zip(
+            user_ids, cached[: len(user_ids)], cached[len(user_ids) :]
+        ):
+            if version is None:
+                continue
+            version = int(version)
+            cache_key = user_profiles_cache_key(user_id, project_id)
+            in_memory = PROFILE_LRU_CACHE.get(cache_key)
+            if in_memory is not None and in_memory[0] == version:
+                results[user_id] = copy_user_profiles(in_memory[1])
+                hits["memory"] += 1
+                continue
+            if not user_profiles:
+                continue
+            try:
+                cached_version, profiles = decode_user_profiles(user_profiles)
+            except (orjson.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+                TRACE_LOG.error(project_id, user_id, f"Invalid user profiles: {e}")
+                continue
+            if cached_version == version:
+                PROFILE_LRU_CACHE.set(
+                    cache_key, (version, profiles), len(user_profiles)
+                )
+                results[user_id] = copy_user_profiles(profiles)
+                hits["redis"] += 1
+        for tier, count in hits.items():
+            if count:
+                telemetry_manager.increment_counter_metric(
+                    CounterMetricName.PROFILE_CACHE_HIT,
+                    count,
+                    {"project_id": project_id, "tier": tier},
+                )
+
+        misses = [u for u in user_ids if u not in results]
+        if misses:
+            telemetry_manager.increment_counter_metric(
+                CounterMetricName.PROFILE_CACHE_MISS,
+                len(misses),
+                {"project_id": project_id},
+            )
+            # Versions are read before the rows, as in write_user_profiles_cache
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for user_id in misses:
+                    version_key = user_profiles_version_key(user_id, project_id)
+                    pipe.set(version_key, time.time_ns(), nx=True)
+                    pipe.get(version_key)
+                    pipe.expire(version_key, CONFIG.cache_user_profiles_version_ttl)
+                versions = (await pipe.execute())[1::3]
+            loaded = load_users_profiles(misses, project_id)
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for user_id, version in zip(misses, versions):
+                    cache_key = user_profiles_cache_key(user_id, project_id)
+                    encoded = encode_user_profiles(int(version), loaded[user_id])
+                    pipe.set(cache_key, encoded, ex=CONFIG.cache_user_profiles_ttl)
+                    PROFILE_LRU_CACHE.set(
+                        cache_key, (int(version), loaded[user_id]), len(encoded)
+                    )
+                    results[user_id] = copy_user_profiles(loaded[user_id])
+                await pipe.execute()
+    return Promise.resolve({user_id: results[user_id] for user_id in user_ids})
 
 
 async def add_user_profiles(
@@ -147,6 +386,63 @@ async def add_user_profiles(
     return Promise.resolve(IdsData(ids=profile_ids))
 
 
+def bulk_update_user_profiles(
+    session,
+    user_id: str,
+    project_id: str,
+    profile_ids: list[str],
+    contents: list[str],
+    attributes: list[dict | None],
+) -> list[str]:
+    """Update all profiles in one `UPDATE ... FROM (VALUES ...)`, return the touched ids."""
+    # Later updates of the same profile win, as they did when applied one by one
+    updates = {
+        str(profile_id): (profile_id, content, attribute)
+        for profile_id, content, attribute in zip(profile_ids, contents, attributes)
+    }
+    if not updates:
+        return []
+    update_values = values(
+        column("id", UUID_TYPE(as_uuid=True)),
+        column("content", TEXT),
+        column("attributes", JSONB(none_as_null=True)),
+        name="profile_updates",
+    ).data(list(updates.values()))
+    stmt = (
+        update(UserProfile)
+        .where(
+            UserProfile.id == update_values.c.id,
+            UserProfile.user_id == user_id,
+            UserProfile.project_id == project_id,
+        )
+        .values(
+            content=update_values.c.content,
+            # An all-NULL VALUES column is typed as text, cast it back explicitly
+            attributes=func.coalesce(
+                cast(update_values.c.attributes, JSONB), UserProfile.attributes
+            ),
+        )
+        .returning(UserProfile.id)
+    )
+    touched = {
+        str(pid)
+        for pid in session.execute(
+            stmt, execution_options={"synchronize_session": False}
+        ).scalars()
+    }
+    updated_ids = []
+    for key, (profile_id, _, _) in updates.items():
+        if key not in touched:
+            TRACE_LOG.error(
+                project_id,
+                user_id,
+                f"Profile {profile_id} not found",
+            )
+            continue
+        updated_ids.append(profile_id)
+    return updated_ids
+
+
 async def update_user_profiles(
     user_id: str,
     project_id: str,
@@ -161,24 +457,9 @@ async def update_user_profiles(
         attributes
     ), "Length of profile_ids, attributes must be equal"
     with Session() as session:
-        db_profiles = []
-        for profile_id, content, attribute in zip(profile_ids, contents, attributes):
-            db_profile = (
-                session.query(UserProfile)
-                .filter_by(id=profile_id, user_id=user_id, project_id=project_id)
-                .one_or_none()
-            )
-            if db_profile is None:
-                TRACE_LOG.error(
-                    project_id,
-                    user_id,
-                    f"Profile {profile_id} not found",
-                )
-                continue
-            db_profile.content = content
-            if attribute is not None:
-                db_profile.attributes = attribute
-            db_profiles.append(profile_id)
+        db_profiles = bulk_update_user_profiles(
+            session, user_id, project_id, profile_ids, contents, attributes
+        )
         session.commit()
     await refresh_user_profile_cache(user_id, project_id)
     return Promise.resolve(IdsData(ids=db_profiles))
@@ -218,8 +499,9 @@ async def delete_user_profiles(
 
 
 async def refresh_user_profile_cache(user_id: str, project_id: str) -> Promise[None]:
-    async with get_redis_client() as redis_client:
-        await redis_client.delete(f"user_profiles::{project_id}::{user_id}")
+    # Write-through: the next reads hit the post-mutation snapshot directly
+    await write_user_profiles_cache(user_id, project_id, bump_version=True)
+    await invalidate_user_context_snapshots(user_id, project_id)
     return Promise.resolve(None)
 
 
@@ -272,26 +554,14 @@ async def add_update_delete_user_profiles(
             else:
                 add_profile_ids = []
             # 2. update existing profiles
-            update_db_profiles = []
-            for profile_id, content, attribute in zip(
-                update_profile_ids, update_contents, update_attributes
-            ):
-                db_profile = (
-                    session.query(UserProfile)
-                    .filter_by(id=profile_id, user_id=user_id, project_id=project_id)
-                    .one_or_none()
-                )
-                if db_profile is None:
-                    TRACE_LOG.error(
-                        project_id,
-                        user_id,
-                        f"Profile {profile_id} not found",
-                    )
-                    continue
-                db_profile.content = content
-                if attribute is not None:
-                    db_profile.attributes = attribute
-                update_db_profiles.append(profile_id)
+            bulk_update_user_profiles(
+                session,
+                user_id,
+                project_id,
+                update_profile_ids,
+                update_contents,
+                update_attributes,
+            )
 
             # 3. delete profiles
             session.query(UserProfile).filter(
@@ -1,10 +1,12 @@
 from sqlalchemy import cast, String, func, desc
-from ..models.database import Project, User, UserProfile, UserEvent
+from ..models.database import Project, User
 from ..models.utils import Promise, CODE
 from ..models.response import IdData, ProfileConfigData, ProjectUsersData, DailyUsage
-from ..connectors import Session
-from ..env import ProfileConfig, TelemetryKeyName
+from ..connectors import Session, get_redis_client
+from ..utils import after_cursor, encode_cursor
+from ..env import CONFIG, ProfileConfig, TelemetryKeyName
 from ..telemetry.capture_key import get_int_key, date_past_key
+from .context_snapshot import invalidate_project_context_snapshots
 
 
 async def get_project_secret(project_id: str) -> Promise[str]:
@@ -59,6 +61,8 @@ async def update_project_profile_config(
             return Promise.reject(CODE.NOT_FOUND, "Project not found")
         p.profile_config = profile_config
         session.commit()
+    # Snapshots are rendered with the project language and topics
+    await invalidate_project_context_snapshots(project_id)
     return Promise.resolve(None)
 
 
@@ -76,6 +80,32 @@ async def get_project_profile_config_string(
         return Promise.resolve(ProfileConfigData(profile_config=p.profile_config or ""))
 
 
+def project_users_count_key(project_id: str) -> str:
+    return f"project_users_count::{project_id}"
+
+
+async def get_project_users_count(project_id: str, search: str = "") -> int:
+    # Unfiltered totals are only used for the admin pager, a short-lived cache is enough
+    if not search:
+        async with get_redis_client() as redis_client:
+            cached = await redis_client.get(project_users_count_key(project_id))
+        if cached is not None:
+            return int(cached)
+    with Session() as session:
+        query = session.query(func.count(User.id)).filter(User.project_id == project_id)
+        if search:
+            query = query.filter(cast(User.id, String).like(f"%{search}%"))
+        count = query.scalar()
+    if not search:
+        async with get_redis_client() as redis_client:
+            await redis_client.set(
+                project_users_count_key(project_id),
+                count,
+                ex=CONFIG.cache_project_users_count_ttl,
+            )
+    return count
+
+
 async def get_project_users(
     project_id: str,
     search: str = "",
@@ -83,69 +113,63 @@ async def get_project_users(
     offset: int = 0,
     order_by: str = "updated_at",
     order_desc: bool = True,
+    cursor: str = None,
 ) -> Promise[ProjectUsersData]:
-    with Session() as session:
-        profile_subq = (
-            session.query(
-                UserProfile.user_id.label("user_id"),
-                func.count(UserProfile.id).label("profile_count"),
-            )
-            .filter(UserProfile.project_id == project_id)
-            .group_by(UserProfile.user_id)
-            .subquery()
-        )
-
-        event_subq = (
-            session.query(
-                UserEvent.user_id.label("user_id"),
-                func.count(UserEvent.id).label("event_count"),
-            )
-            .filter(UserEvent.project_id == project_id)
-            .group_by(UserEvent.user_id)
-            .subquery()
-        )
-
-        query = (
-            session.query(
-                User,
-                func.coalesce(profile_subq.c.profile_count, 0).label("profile_count"),
-                func.coalesce(event_subq.c.event_count, 0).label("event_count"),
-            )
-            .filter(User.project_id == project_id)
-            .filter(cast(User.id, String).like(f"%{search}%"))
-            .outerjoin(profile_subq, profile_subq.c.user_id == User.id)
-            .outerjoin(event_subq, event_subq.c.user_id == User.id)
+    if cursor is not None and order_by != "created_at":
+        return Promise.reject(
+            CODE.BAD_REQUEST, "Cursor pagination requires order_by=created_at"
         )
+    with Session() as session:
+        query = session.query(User).filter(User.project_id == project_id)
+        if search:
+            query = query.filter(cast(User.id, String).like(f"%{search}%"))
 
         if order_by == "profile_count":
             query = query.order_by(
-                desc("profile_count") if order_desc else "profile_count"
+                desc(User.profile_count) if order_desc else User.profile_count
             )
         elif order_by == "event_count":
-            query = query.order_by(desc("event_count") if order_desc else "event_count")
+            query = query.order_by(
+                desc(User.event_count) if order_desc else User.event_count
+            )
+        elif order_by == "created_at":
+            if cursor is not None:
+                try:
+                    query = query.filter(
+                        after_cursor(User.created_at, User.id, cursor, order_desc)
+                    )
+                except ValueError as e:
+                    return Promise.reject(CODE.BAD_REQUEST, str(e))
+            query = query.order_by(
+                *(
+                    (desc(User.created_at), desc(User.id))
+                    if order_desc
+                    else (User.created_at, User.id)
+                )
+            )
         else:
             query = query.order_by(
                 desc(User.updated_at) if order_desc else User.updated_at
             )
 
-        count = (
-            session.query(func.count())
-            .filter(User.project_id == project_id)
-            .filter(cast(User.id, String).like(f"%{search}%"))
-            .scalar()
-        )
-
-        users_with_counts = query.limit(limit).offset(offset).all()
+        if cursor is None:
+            query = query.offset(offset)
+        users = query.limit(limit).all()
 
         user_dicts = []
-        for user, profile_count, event_count in users_with_counts:
+        for user in users:
             user_data = user.__dict__.copy()
             user_data.pop("_sa_instance_state", None)
-            user_data["profile_count"] = profile_count
-            user_data["event_count"] = event_count
             user_dicts.append(user_data)
 
-        return Promise.resolve(ProjectUsersData(users=user_dicts, count=count))
+        next_cursor = None
+        if order_by == "created_at" and len(users) == limit > 0:
+            last_user = users[-1]
+            next_cursor = encode_cursor(last_user.created_at, last_user.id)
+    count = await get_project_users_count(project_id, search)
+    return Promise.resolve(
+        ProjectUsersData(users=user_dicts, count=count, next_cursor=next_cursor)
+    )
 
 
 async def get_project_usage(
@@ -3,20 +3,35 @@ from ..models.utils import Promise
 from ..models.database import UserStatus
 from ..models.response import CODE, UserStatusesData, UserStatusData, IdData
 from ..connectors import Session
+from ..utils import after_cursor, encode_cursor
 
 
 async def get_user_statuses(
-    user_id: str, project_id: str, type: str, page: int = 1, page_size: int = 10
+    user_id: str,
+    project_id: str,
+    type: str,
+    page: int = 1,
+    page_size: int = 10,
+    cursor: str = None,
 ) -> Promise[UserStatusesData]:
     with Session() as session:
-        status = (
+        query = (
             session.query(UserStatus)
             .filter_by(user_id=user_id, project_id=project_id, type=type)
-            .order_by(UserStatus.created_at.desc())
-            .offset((page - 1) * page_size)
-            .limit(page_size)
-            .all()
+            .order_by(UserStatus.created_at.desc(), UserStatus.id.desc())
         )
+        if cursor is not None:
+            try:
+                query = query.filter(
+                    after_cursor(
+                        UserStatus.created_at, UserStatus.id, cursor, descending=True
+                    )
+                )
+            except ValueError as e:
+                return Promise.reject(CODE.BAD_REQUEST, str(e))
+        else:
+            query = query.offset((page - 1) * page_size)
+        status = query.limit(page_size).all()
         if status is None:
             return Promise.resolve(UserStatusesData(statuses=[]))
         data = [
@@ -29,7 +44,10 @@ async def get_user_statuses(
             }
             for s in status
         ]
-        return Promise.resolve(UserStatusesData(statuses=data))
+        next_cursor = None
+        if status and len(status) == page_size:
+            next_cursor = encode_cursor(status[-1].created_at, status[-1].id)
+        return Promise.resolve(UserStatusesData(statuses=data, next_cursor=next_cursor))
 
 
 async def append_user_status(
@@ -1,19 +1,52 @@
+import uuid
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
 from ..models.utils import Promise
 from ..models.database import User, GeneralBlob, UserProfile
-from ..models.response import CODE, UserData, IdData, IdsData, UserProfilesData
+from ..models.response import (
+    CODE,
+    UserData,
+    IdData,
+    IdsData,
+    PagedIdsData,
+    UserProfilesData,
+)
 from ..connectors import Session
+from ..utils import after_cursor, encode_cursor
 from .profile import refresh_user_profile_cache
 from ..models.blob import BlobType
 
 
-async def create_user(data: UserData, project_id: str) -> Promise[IdData]:
+async def create_user(data: UserData, project_id: str) -> Promise[UserData]:
+    user_id = data.id if data.id is not None else uuid.uuid4()
+    columns = [User.id, User.additional_fields, User.created_at, User.updated_at]
     with Session() as session:
-        db_user = User(additional_fields=data.data, project_id=project_id)
-        if data.id is not None:
-            db_user.id = str(data.id)
-        session.add(db_user)
+        # Create-if-absent: an existing user is left untouched, so clients can
+        # create users blindly instead of looking them up first
+        db_user = session.execute(
+            insert(User)
+            .values(id=user_id, project_id=project_id, additional_fields=data.data)
+            .on_conflict_do_nothing(index_elements=[User.id, User.project_id])
+            .returning(*columns)
+        ).one_or_none()
+        if db_user is None:
+            # Nothing is returned on conflict, answer with the stored user
+            db_user = session.execute(
+                select(*columns).where(
+                    User.id == user_id, User.project_id == project_id
+                )
+            ).one_or_none()
         session.commit()
-        return Promise.resolve(IdData(id=db_user.id))
+    if db_user is None:
+        return Promise.reject(CODE.CONFLICT, f"User {user_id} was deleted meanwhile")
+    return Promise.resolve(
+        UserData(
+            id=db_user.id,
+            data=db_user.additional_fields,
+            created_at=db_user.created_at,
+            updated_at=db_user.updated_at,
+        )
+    )
 
 
 async def get_user(user_id: str, project_id: str) -> Promise[UserData]:
@@ -69,16 +102,31 @@ async def get_user_all_blobs(
     blob_type: BlobType,
     page: int = 0,
     page_size: int = 10,
-) -> Promise[IdsData]:
+    cursor: str = None,
+) -> Promise[PagedIdsData]:
     with Session() as session:
-        user_blobs = (
-            session.query(GeneralBlob.id)
+        query = (
+            session.query(GeneralBlob.id, GeneralBlob.created_at)
             .filter_by(user_id=user_id, blob_type=str(blob_type), project_id=project_id)
-            .order_by(GeneralBlob.created_at)
-            .offset(page * page_size)
-            .limit(page_size)
-            .all()
+            .order_by(GeneralBlob.created_at, GeneralBlob.id)
         )
+        if cursor is not None:
+            try:
+                query = query.filter(
+                    after_cursor(
+                        GeneralBlob.created_at, GeneralBlob.id, cursor, descending=False
+                    )
+                )
+            except ValueError as e:
+                return Promise.reject(CODE.BAD_REQUEST, str(e))
+        else:
+            query = query.offset(page * page_size)
+        user_blobs = query.limit(page_size).all()
         if user_blobs is None:
             return Promise.reject(CODE.NOT_FOUND, f"User {user_id} not found")
-        return Promise.resolve(IdsData(ids=[blob.id for blob in user_blobs]))
+        next_cursor = None
+        if user_blobs and len(user_blobs) == page_size:
+            next_cursor = encode_cursor(user_blobs[-1].created_at, user_blobs[-1].id)
+        return Promise.resolve(
+            PagedIdsData(ids=[blob.id for blob in user_blobs], next_cursor=next_cursor)
+        )
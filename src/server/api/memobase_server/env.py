@@ -33,6 +33,18 @@ BILLING_REFILL_AMOUNT_MAP = {
 }
 
 
+# Native dimension of fastembed models, and whether they were trained to stay useful
+# when truncated (Matryoshka). Models not listed are checked on their first call
+LOCAL_EMBEDDING_MODELS = {
+    "BAAI/bge-small-en-v1.5": {"dim": 384, "matryoshka": False},
+    "BAAI/bge-base-en-v1.5": {"dim": 768, "matryoshka": False},
+    "BAAI/bge-large-en-v1.5": {"dim": 1024, "matryoshka": False},
+    "sentence-transformers/all-MiniLM-L6-v2": {"dim": 384, "matryoshka": False},
+    "nomic-ai/nomic-embed-text-v1.5": {"dim": 768, "matryoshka": True},
+    "mixedbread-ai/mxbai-embed-large-v1": {"dim": 1024, "matryoshka": True},
+}
+
+
 class ProjectStatus:
     ultra = "ultra"
     pro = "pro"
@@ -85,10 +97,37 @@ class Config:
     buffer_flush_interval: int = 60 * 60  # 1 hour
     max_chat_blob_buffer_token_size: int = 1024
     max_chat_blob_buffer_process_token_size: int = 16384
+    max_batch_insert_blobs: int = 500
+    max_batch_context_users: int = 50
+    export_batch_size: int = 1000
+    import_batch_size: int = 1000
     max_profile_subtopics: int = 15
     max_pre_profile_token_size: int = 128
     llm_tab_separator: str = "::"
     cache_user_profiles_ttl: int = 60 * 20  # 20 minutes
+    cache_user_profiles_version_ttl: int = 60 * 60 * 24 * 7  # 7 days
+    profile_lru_cache_max_users: int = 1024
+    profile_lru_cache_max_bytes: int = 64 * 1024 * 1024  # 64MB
+    enable_context_snapshot: bool = True
+    cache_context_snapshot_ttl: int = 60 * 20  # 20 minutes
+    cache_context_snapshot_params_ttl: int = 60 * 60 * 24 * 7  # 7 days
+    max_context_snapshots_per_user: int = 8
+    cache_user_memory_version_ttl: int = 60 * 60 * 24 * 7  # 7 days
+    cache_project_users_count_ttl: int = 60  # 1 minute
+    flush_job_ttl: int = 60 * 60  # 1 hour
+    max_flush_job_wait: int = 60
+    enable_response_compression: bool = True
+    response_compression_min_size: int = 1024
+    response_gzip_level: int = 6
+    response_brotli_quality: int = 4
+    enable_event_partitioning: bool = False
+    event_partition_premake_months: int = 3
+    event_retention_days: int = None
+    event_search_method: Literal["vector", "lexical", "hybrid"] = "vector"
+    event_search_rrf_k: int = 60
+    event_search_candidate_factor: int = 4
+    event_search_recency_half_life_days: float = None
+    event_search_recency_weight: float = 0.3
 
     # LLM
     language: Literal["en", "zh"] = "en"
@@ -102,12 +141,20 @@ class Config:
     summary_llm_model: str = None
 
     enable_event_embedding: bool = True
-    embedding_provider: Literal["openai", "jina", "ollama"] = "openai"
+    embedding_provider: Literal["openai", "jina", "ollama", "local"] = "openai"
     embedding_api_key: str = None
     embedding_base_url: str = None
     embedding_dim: int = 1536
     embedding_model: str = "text-embedding-3-small"
     embedding_max_token_size: int = 8192
+    embedding_encoding: Literal["float", "base64"] = "float"
+    embedding_storage: Literal["vector", "halfvec", "binary"] = "vector"
+    embedding_binary_rerank_factor: int = 10
+    embedding_reset_on_dim_change: bool = False
+    embedding_local_cache_dir: str = None
+    embedding_local_threads: int = None
+    embedding_local_batch_size: int = 64
+    embedding_local_batch_wait_ms: float = 5
 
     additional_user_profiles: list[dict] = field(default_factory=list)
     overwrite_user_profiles: Optional[list[dict]] = None
@@ -192,7 +239,24 @@ class Config:
 
     def __post_init__(self):
         assert self.llm_api_key is not None, "llm_api_key is required"
-        if self.enable_event_embedding:
+        if self.enable_event_embedding and self.embedding_provider == "local":
+            if self.embedding_model == "text-embedding-3-small":
+                self.embedding_model = "BAAI/bge-small-en-v1.5"
+                if self.embedding_dim == type(self).embedding_dim:
+                    self.embedding_dim = LOCAL_EMBEDDING_MODELS[self.embedding_model][
+                        "dim"
+                    ]
+            local_model = LOCAL_EMBEDDING_MODELS.get(self.embedding_model)
+            if local_model is not None:
+                assert self.embedding_dim == local_model["dim"] or (
+                    local_model["matryoshka"]
+                    and self.embedding_dim < local_model["dim"]
+                ), (
+                    f"{self.embedding_model} produces {local_model['dim']}-dim "
+                    f"embeddings, set embedding_dim to {local_model['dim']}"
+                    + (" or lower" if local_model["matryoshka"] else "")
+                )
+        elif self.enable_event_embedding:
             if self.embedding_api_key is None and (
                 self.llm_style == self.embedding_provider == "openai"
             ):
@@ -0,0 +1,74 @@
+import asyncio
+import numpy as np
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent embed calls into batches run off the event loop.
+
+    A request waits at most `max_wait_ms` for others to join its batch, and a batch
+    is cut once it holds `max_batch_size` texts. Batches run one at a time on a
+    dedicated thread, the model parallelizes within a batch.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[list[str]], np.ndarray],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5,
+    ):
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="embedding"
+        )
+        self._loop = None
+        self._queue: asyncio.Queue = None
+        self._worker: asyncio.Task = None
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        future = loop.create_future()
+        self._queue.put_nowait((texts, future))
+        return await future
+
+    async def _next_batch(self) -> list[tuple[list[str], asyncio.Future]]:
+        batch = [await self._queue.get()]
+        size = len(batch[0][0])
+        deadline = self._loop.time() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                vectors = await self._loop.run_in_executor(
+                    self._executor, self.embed_fn, texts
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            offset = 0
+            for item_texts, future in batch:
+                if not future.done():
+                    future.set_result(vectors[offset : offset + len(item_texts)])
+                offset += len(item_texts)
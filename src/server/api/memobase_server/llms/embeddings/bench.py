@@ -0,0 +1,104 @@
+"""
+Microbenchmark of embedding response parsing, per 1k vectors:
+
+    python -m memobase_server.llms.embeddings.bench [--dim 1536] [--rounds 5]
+
+Throughput of the configured `embedding_provider`, with concurrent single-text calls
+like context searches make:
+
+    python -m memobase_server.llms.embeddings.bench --throughput 512 [--concurrency 32]
+"""
+
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+from base64 import b64encode
+from pgvector.sqlalchemy import Vector
+from .utils import decode_embeddings
+from . import get_embedding
+from ...env import CONFIG
+from ...models.database import EmbeddingVector, DEFAULT_PROJECT_ID
+
+BATCH = 1000
+
+
+def timeit(fn, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+async def run_throughput(requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            p = await get_embedding(
+                DEFAULT_PROJECT_ID, [f"user talked about topic {i}"], phase="query"
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+            if not p.ok():
+                raise RuntimeError(p.msg())
+
+    # Warm up, loading a local model shouldn't count
+    await one(-1)
+    latencies.clear()
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(requests)])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(
+        f"{CONFIG.embedding_provider}/{CONFIG.embedding_model}, "
+        f"{requests} requests, concurrency {concurrency}"
+    )
+    print(f"  throughput {requests / elapsed:8.1f} texts/s")
+    print(f"  latency p50 {latencies[len(latencies) // 2]:8.1f} ms")
+    print(f"  latency p95 {latencies[int(len(latencies) * 0.95)]:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m memobase_server.llms.embeddings.bench"
+    )
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--throughput", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    if args.throughput:
+        asyncio.run(run_throughput(args.throughput, args.concurrency))
+        return
+
+    vectors = np.random.rand(BATCH, args.dim).astype(np.float32)
+    float_body = json.dumps({"data": [{"embedding": v.tolist()} for v in vectors]})
+    base64_body = json.dumps(
+        {"data": [{"embedding": b64encode(v.tobytes()).decode()} for v in vectors]}
+    )
+    pgvector_bind = Vector(args.dim).bind_processor(None)
+    embedding_bind = EmbeddingVector(args.dim).bind_processor(None)
+
+    results = {
+        "json floats -> np.array": lambda: np.array(
+            [dp["embedding"] for dp in json.loads(float_body)["data"]]
+        ),
+        "base64 -> decode_embeddings": lambda: decode_embeddings(
+            [dp["embedding"] for dp in json.loads(base64_body)["data"]]
+        ),
+        "pgvector Vector bind": lambda: [pgvector_bind(v) for v in vectors],
+        "EmbeddingVector bind": lambda: [embedding_bind(v) for v in vectors],
+    }
+    print(f"{BATCH} vectors, dim {args.dim}, best of {args.rounds}")
+    print(f"  response size: floats {len(float_body)}B, base64 {len(base64_body)}B")
+    for name, fn in results.items():
+        print(f"  {name:<30} {timeit(fn, args.rounds):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
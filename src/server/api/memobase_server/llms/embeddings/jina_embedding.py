@@ -2,7 +2,7 @@ import numpy as np
 from typing import Literal
 from ...errors import ExternalAPIError
 from ...env import CONFIG, LOG
-from .utils import get_jina_async_client_instance
+from .utils import get_jina_async_client_instance, decode_embeddings
 
 JINA_TASK = {
     "query": "retrieval.query",
@@ -22,6 +22,7 @@ async def jina_embedding(
             "task": JINA_TASK[phase],
             "truncate": True,
             "dimensions": CONFIG.embedding_dim,
+            "embedding_type": CONFIG.embedding_encoding,
         },
         timeout=20,
     )
@@ -31,4 +32,4 @@ async def jina_embedding(
     LOG.info(
         f"Jina embedding, {model}, {phase}, {data['usage']['prompt_tokens']}/{data['usage']['total_tokens']}"
     )
-    return np.array([dp["embedding"] for dp in data["data"]])
+    return decode_embeddings([dp["embedding"] for dp in data["data"]])
@@ -2,7 +2,7 @@ import numpy as np
 from typing import Literal
 from ...errors import ExternalAPIError
 from ...env import CONFIG, LOG
-from .utils import get_lmstudio_async_client_instance
+from .utils import get_lmstudio_async_client_instance, decode_embeddings
 
 LMSTUDIO_TASK = {
     "query": "retrieval.query",
@@ -21,6 +21,7 @@ async def lmstudio_embedding(
             "task": LMSTUDIO_TASK[phase],
             "truncate": True,
             "dimensions": CONFIG.embedding_dim,
+            "encoding_format": CONFIG.embedding_encoding,
         },
         timeout=20,
     )
@@ -30,4 +31,4 @@ async def lmstudio_embedding(
     LOG.info(
         f"lmstudio embedding, {model}, {phase}, {data['usage']['prompt_tokens']}/{data['usage']['total_tokens']}"
     )
-    return np.array([dp["embedding"] for dp in data["data"]])
+    return decode_embeddings([dp["embedding"] for dp in data["data"]])
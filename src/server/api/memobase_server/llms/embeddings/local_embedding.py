@@ -0,0 +1,84 @@
+"""
+In-process CPU embeddings through fastembed (ONNX Runtime), no network round trip.
+
+fastembed is optional, install it with `pip install "memobase_server[local-embedding]"`.
+The model is downloaded on first use and cached under `embedding_local_cache_dir`.
+"""
+
+import numpy as np
+from typing import Literal
+from ...env import CONFIG, LOG, LOCAL_EMBEDDING_MODELS
+from .batcher import EmbeddingBatcher
+
+_local_model = None
+_local_batchers: dict[str, EmbeddingBatcher] = {}
+
+
+def get_local_model_instance():
+    global _local_model
+    if _local_model is None:
+        from fastembed import TextEmbedding
+
+        _local_model = TextEmbedding(
+            model_name=CONFIG.embedding_model,
+            cache_dir=CONFIG.embedding_local_cache_dir,
+            threads=CONFIG.embedding_local_threads,
+        )
+        LOG.info(f"Loaded local embedding model {CONFIG.embedding_model}")
+    return _local_model
+
+
+def fit_embedding_dim(
+    vectors: np.ndarray, dim: int, matryoshka: bool = False
+) -> np.ndarray:
+    """Truncate to `dim` and re-normalize.
+
+    Only Matryoshka-trained models keep their quality when truncated, the
+    vectors of other models must already have `dim` dimensions.
+    """
+    if vectors.shape[-1] == dim:
+        return vectors
+    if vectors.shape[-1] < dim or not matryoshka:
+        raise ValueError(
+            f"{CONFIG.embedding_model} produces {vectors.shape[-1]}-dim embeddings, "
+            f"embedding_dim is {dim}"
+        )
+    vectors = vectors[:, :dim]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def embed_local(texts: list[str], phase: Literal["query", "document"]) -> np.ndarray:
+    model = get_local_model_instance()
+    # Retrieval models prepend their own query/passage instructions
+    if phase == "query":
+        rows = model.query_embed(texts)
+    else:
+        rows = model.passage_embed(texts, batch_size=CONFIG.embedding_local_batch_size)
+    vectors = np.asarray(list(rows), dtype=np.float32)
+    local_model = LOCAL_EMBEDDING_MODELS.get(CONFIG.embedding_model, {})
+    return fit_embedding_dim(
+        vectors, CONFIG.embedding_dim, local_model.get("matryoshka", False)
+    )
+
+
+def get_local_batcher(phase: Literal["query", "document"]) -> EmbeddingBatcher:
+    if phase not in _local_batchers:
+        _local_batchers[phase] = EmbeddingBatcher(
+            lambda texts: embed_local(texts, phase),
+            max_batch_size=CONFIG.embedding_local_batch_size,
+            max_wait_ms=CONFIG.embedding_local_batch_wait_ms,
+        )
+    return _local_batchers[phase]
+
+
+async def local_embedding(
+    model: str, texts: list[str], phase: Literal["query", "document"] = "document"
+) -> np.ndarray:
+    if model != CONFIG.embedding_model:
+        raise ValueError(
+            f"Local provider only serves {CONFIG.embedding_model}, got {model}"
+        )
+    vectors = await get_local_batcher(phase).embed(texts)
+    LOG.info(f"Local embedding, {model}, {phase}, {len(texts)} texts")
+    return vectors
@@ -2,7 +2,7 @@ import numpy as np
 from typing import Literal
 from ...errors import ExternalAPIError
 from ...env import CONFIG, LOG
-from .utils import get_ollama_async_client_instance
+from .utils import get_ollama_async_client_instance, decode_embeddings
 
 OLLAMA_TASK = {
     "query": "retrieval.query",
@@ -31,4 +31,4 @@ async def ollama_embedding(
     LOG.info(
         f"Ollama embedding, {model}, {data['load_duration']}/{data['total_duration']}"
     )
-    return np.array(data["embeddings"])
+    return decode_embeddings(data["embeddings"])
@@ -1,7 +1,7 @@
 import numpy as np
 from typing import Literal
-from .utils import get_openai_async_client_instance
-from ...env import LOG
+from .utils import get_openai_async_client_instance, decode_embeddings
+from ...env import CONFIG, LOG
 
 
 async def openai_embedding(
@@ -9,10 +9,10 @@ async def openai_embedding(
 ) -> np.ndarray:
     openai_async_client = get_openai_async_client_instance()
     response = await openai_async_client.embeddings.create(
-        model=model, input=texts, encoding_format="float"
+        model=model, input=texts, encoding_format=CONFIG.embedding_encoding
     )
 
     prompt_tokens = getattr(response.usage, "prompt_tokens", None)
     total_tokens = getattr(response.usage, "total_tokens", None)
     LOG.info(f"OpenAI embedding, {model}, {phase}, {prompt_tokens}/{total_tokens}")
-    return np.array([dp.embedding for dp in response.data])
+    return decode_embeddings([dp.embedding for dp in response.data])
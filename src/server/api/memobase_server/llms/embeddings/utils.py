@@ -1,3 +1,5 @@
+import numpy as np
+from base64 import b64decode
 from openai import AsyncOpenAI
 from httpx import AsyncClient
 from ...env import CONFIG
@@ -45,3 +47,19 @@ def get_ollama_async_client_instance() -> AsyncClient:
         )
     return _global_ollama_async_client
 
+
+
+def decode_embeddings(items: list[str | list[float]]) -> np.ndarray:
+    """Decode provider embeddings into one preallocated float32 matrix.
+
+    Items are base64 strings of little-endian float32 bytes, as returned with
+    `embedding_encoding: base64`, or plain float lists otherwise.
+    """
+    rows = [
+        np.frombuffer(b64decode(item), dtype="<f4") if isinstance(item, str) else item
+        for item in items
+    ]
+    matrix = np.empty((len(rows), len(rows[0]) if rows else 0), dtype=np.float32)
+    for i, row in enumerate(rows):
+        matrix[i] = row
+    return matrix
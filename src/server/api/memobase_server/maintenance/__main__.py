@@ -0,0 +1,126 @@
+"""
+Database maintenance jobs, meant to be run from cron or a one-off container:
+
+    python -m memobase_server.maintenance partitions [--months-ahead 3] [--retention-days 365]
+    python -m memobase_server.maintenance embeddings [--storage binary] [--benchmark 50]
+    python -m memobase_server.maintenance reembed [--all] [--max-texts-per-second 100]
+    python -m memobase_server.maintenance search-vector
+"""
+
+import json
+import asyncio
+import argparse
+from ..connectors import Session, create_missing_indexes
+from ..env import LOG
+from ..models.database import UserEventGist
+from .partitions import (
+    setup_partitions,
+    ensure_partitions,
+    drop_expired_partitions,
+)
+from .embeddings import setup_embedding_storage
+from .search_bench import benchmark_search
+from .reembed import reembed_table, REEMBED_MODELS
+
+
+def run_partitions(args):
+    with Session() as session:
+        setup_partitions(session)
+        created = ensure_partitions(session, args.months_ahead)
+        dropped = drop_expired_partitions(session, args.retention_days)
+    LOG.info(f"Partitions created: {created}, dropped: {dropped}")
+
+
+def run_embeddings(args):
+    with Session() as session:
+        changed = setup_embedding_storage(session, args.storage)
+        LOG.info(f"Embedding storage converted: {changed}")
+        if args.benchmark:
+            result = benchmark_search(
+                session, args.benchmark, args.topk, args.rerank_factor
+            )
+            print(json.dumps(result, indent=2))
+
+
+def run_reembed(args):
+    tables = [args.table] if args.table else list(REEMBED_MODELS)
+    for table_name in tables:
+        stats = asyncio.run(
+            reembed_table(
+                table_name,
+                everything=args.all,
+                project_id=args.project_id,
+                batch_size=args.batch_size,
+                concurrency=args.concurrency,
+                max_texts_per_second=args.max_texts_per_second,
+                restart=args.restart,
+            )
+        )
+        LOG.info(f"Re-embedding done: {stats}")
+
+
+def run_search_vector(args):
+    with Session() as session:
+        UserEventGist.install_search_vector(session, add_column=True)
+    # The GIN index, built concurrently
+    create_missing_indexes()
+    LOG.info("Gist search vector installed")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m memobase_server.maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    partitions = subparsers.add_parser(
+        "partitions",
+        help="Partition user_events/user_event_gists by month, pre-create upcoming "
+        "months and drop partitions past the retention window",
+    )
+    partitions.add_argument("--months-ahead", type=int, default=None)
+    partitions.add_argument("--retention-days", type=int, default=None)
+    partitions.set_defaults(func=run_partitions)
+
+    embeddings = subparsers.add_parser(
+        "embeddings",
+        help="Convert the embedding columns to the configured embedding_storage, "
+        "optionally benchmark binary pre-filter recall against exact search",
+    )
+    embeddings.add_argument(
+        "--storage", choices=["vector", "halfvec", "binary"], default=None
+    )
+    embeddings.add_argument(
+        "--benchmark", type=int, default=0, help="Number of sampled queries"
+    )
+    embeddings.add_argument("--topk", type=int, default=10)
+    embeddings.add_argument("--rerank-factor", type=int, default=None)
+    embeddings.set_defaults(func=run_embeddings)
+
+    reembed = subparsers.add_parser(
+        "reembed",
+        help="Fill in missing event/gist embeddings, or re-embed every row with --all "
+        "after embedding_model changed. Resumes from the last checkpoint",
+    )
+    reembed.add_argument("--all", action="store_true")
+    reembed.add_argument("--table", choices=list(REEMBED_MODELS), default=None)
+    reembed.add_argument("--project-id", default=None)
+    reembed.add_argument("--batch-size", type=int, default=64)
+    reembed.add_argument("--concurrency", type=int, default=4)
+    reembed.add_argument("--max-texts-per-second", type=float, default=None)
+    reembed.add_argument(
+        "--restart", action="store_true", help="Ignore the saved checkpoint"
+    )
+    reembed.set_defaults(func=run_reembed)
+
+    search_vector = subparsers.add_parser(
+        "search-vector",
+        help="Add the generated search_vector column of lexical and hybrid search "
+        "to an existing user_event_gists table, it rewrites the table",
+    )
+    search_vector.set_defaults(func=run_search_vector)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Storage modes of the `embedding` columns on `user_events` and `user_event_gists`:
+
+- `vector`: float32 values, exact cosine search
+- `halfvec`: float16 values, half the storage with near-identical rankings
+- `binary`: float16 values plus a stored `embedding_bit` column of their signs.
+  Search pre-selects by hamming distance over the bits and reranks that small
+  candidate set with the exact cosine distance.
+
+Switching modes rewrites both tables, so it runs under an advisory lock.
+"""
+
+from sqlalchemy import text
+from ..env import CONFIG, LOG
+from ..models.database import (
+    UserEvent,
+    UserEventGist,
+    EMBEDDING_STORAGE_TYPES,
+    EMBEDDING_BIT_EXPR,
+)
+
+EMBEDDING_TABLES = [UserEvent.__table__, UserEventGist.__table__]
+
+
+def embedding_column_types(session, table_name: str) -> dict[str, str]:
+    rows = session.execute(
+        text("""
+        SELECT a.attname, format_type(a.atttypid, a.atttypmod) FROM pg_attribute a
+        JOIN pg_class c ON c.oid = a.attrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relname = :table_name AND n.nspname = current_schema()
+        AND a.attname IN ('embedding', 'embedding_bit') AND NOT a.attisdropped;
+        """),
+        {"table_name": table_name},
+    ).all()
+    return dict(rows)
+
+
+def setup_embedding_storage(session, storage: str = None) -> list[str]:
+    """Convert the embedding columns to `storage`, returns the tables that changed"""
+    storage = storage or CONFIG.embedding_storage
+    column_type = f"{EMBEDDING_STORAGE_TYPES[storage]}({CONFIG.embedding_dim})"
+    session.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext('user_events_embedding_storage'))")
+    )
+    changed = []
+    for table in EMBEDDING_TABLES:
+        columns = embedding_column_types(session, table.name)
+        if "embedding" not in columns:
+            continue
+        resize = not columns["embedding"].endswith(f"({CONFIG.embedding_dim})")
+        if resize and not CONFIG.embedding_reset_on_dim_change:
+            # Refused by `check_legal_embedding_dim` instead
+            continue
+        convert = columns["embedding"] != column_type
+        has_bit = "embedding_bit" in columns
+        # The generated column depends on `embedding`, so it's dropped first
+        drop_bit = has_bit and (convert or storage != "binary")
+        add_bit = storage == "binary" and (drop_bit or not has_bit)
+        if drop_bit:
+            session.execute(text(f"ALTER TABLE {table.name} DROP COLUMN embedding_bit"))
+        if convert:
+            session.execute(
+                text(
+                    f"ALTER TABLE {table.name} ALTER COLUMN embedding "
+                    f"TYPE {column_type} USING "
+                    # Old vectors can't be cast to another dimension, re-embed them
+                    + ("NULL" if resize else f"embedding::{column_type}")
+                )
+            )
+        if add_bit:
+            session.execute(
+                text(
+                    f"ALTER TABLE {table.name} ADD COLUMN embedding_bit "
+                    f"bit({CONFIG.embedding_dim}) "
+                    f"GENERATED ALWAYS AS ({EMBEDDING_BIT_EXPR}) STORED"
+                )
+            )
+        if convert or drop_bit or add_bit:
+            changed.append(table.name)
+    session.commit()
+    if changed:
+        LOG.info(f"Converted embedding storage of {changed} to {storage}")
+    return changed
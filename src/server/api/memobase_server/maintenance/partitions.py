@@ -0,0 +1,309 @@
+"""
+Monthly range partitioning of `user_events` and `user_event_gists` on `created_at`.
+
+Existing tables are converted in place: the old table is renamed to `{table}_legacy`
+and attached as the partition covering everything before the next month boundary,
+so no rows are copied. New rows land in `{table}_pYYYYMM` partitions, with a
+`{table}_default` partition catching anything outside the pre-created months.
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from ..env import CONFIG, LOG
+from ..models.database import (
+    User,
+    UserEvent,
+    UserEventGist,
+    UserEventTag,
+    USER_COUNTER_TABLES,
+)
+
+PARTITIONED_TABLES = [UserEvent.__table__, UserEventGist.__table__]
+
+_BOUND_PATTERN = re.compile(r"TO \('([^']+)'\)")
+
+
+def month_start(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(dt: datetime, months: int) -> datetime:
+    month_index = dt.month - 1 + months
+    return dt.replace(year=dt.year + month_index // 12, month=month_index % 12 + 1)
+
+
+def partition_name(table_name: str, start: datetime) -> str:
+    return f"{table_name}_p{start.year:04d}{start.month:02d}"
+
+
+def is_partitioned(session, table_name: str) -> bool:
+    return (
+        session.execute(
+            text("""
+        SELECT c.relkind = 'p' FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relname = :table_name AND n.nspname = current_schema();
+        """),
+            {"table_name": table_name},
+        ).scalar()
+        or False
+    )
+
+
+def list_partitions(session, table_name: str) -> list[tuple[str, datetime | None]]:
+    """Return `(partition, upper_bound)` pairs, the default partition has no bound"""
+    rows = session.execute(
+        text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:table_name AS regclass);
+        """),
+        {"table_name": table_name},
+    ).all()
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND_PATTERN.search(bound)
+        upper = (
+            datetime.fromisoformat(match.group(1)).astimezone(timezone.utc)
+            if match
+            else None
+        )
+        partitions.append((name, upper))
+    return partitions
+
+
+def convert_to_partitioned(session, table) -> None:
+    table_name = table.name
+    legacy_name = f"{table_name}_legacy"
+
+    # Partitioned tables can't be the target of a FK on (id, project_id) alone,
+    # gists are removed by the trigger installed in `install_gist_cleanup` instead
+    for referencing, constraint_name in session.execute(
+        text("""
+        SELECT CAST(conrelid AS regclass)::text, conname FROM pg_constraint
+        WHERE contype = 'f' AND confrelid = CAST(:table_name AS regclass);
+        """),
+        {"table_name": table_name},
+    ).all():
+        session.execute(
+            text(f'ALTER TABLE {referencing} DROP CONSTRAINT "{constraint_name}"')
+        )
+
+    # Transition-table triggers are not allowed on partitions,
+    # `setup_partitions` installs them again on the parent
+    for (trigger_name,) in session.execute(
+        text(
+            "SELECT tgname FROM pg_trigger WHERE NOT tgisinternal "
+            "AND tgrelid = CAST(:table_name AS regclass)"
+        ),
+        {"table_name": table_name},
+    ).all():
+        session.execute(text(f'DROP TRIGGER "{trigger_name}" ON {table_name}'))
+
+    upper = session.execute(
+        text(
+            f"SELECT date_trunc('month', COALESCE(max(created_at), now()), 'UTC') "
+            f"+ interval '1 month' FROM {table_name}"
+        )
+    ).scalar()
+
+    # The partition's primary key has to include the partition column as well
+    primary_key = session.execute(
+        text(
+            "SELECT conname FROM pg_constraint "
+            "WHERE contype = 'p' AND conrelid = CAST(:table_name AS regclass)"
+        ),
+        {"table_name": table_name},
+    ).scalar()
+    session.execute(text(f'ALTER TABLE {table_name} DROP CONSTRAINT "{primary_key}"'))
+    session.execute(text(f"ALTER TABLE {table_name} RENAME TO {legacy_name}"))
+    for (index_name,) in session.execute(
+        text("""
+        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = CAST(:table_name AS regclass);
+        """),
+        {"table_name": legacy_name},
+    ).all():
+        session.execute(
+            text(f'ALTER INDEX "{index_name}" RENAME TO "{index_name[:56]}_legacy"')
+        )
+    session.execute(
+        text(f"ALTER TABLE {legacy_name} ALTER COLUMN created_at SET NOT NULL")
+    )
+    session.execute(
+        text(f"ALTER TABLE {legacy_name} ADD PRIMARY KEY (id, project_id, created_at)")
+    )
+
+    session.execute(
+        text(
+            f"CREATE TABLE {table_name} "
+            f"(LIKE {legacy_name} INCLUDING DEFAULTS INCLUDING GENERATED) "
+            "PARTITION BY RANGE (created_at)"
+        )
+    )
+    session.execute(
+        text(f"ALTER TABLE {table_name} ADD PRIMARY KEY (id, project_id, created_at)")
+    )
+    session.execute(
+        text(
+            f"ALTER TABLE {table_name} ADD FOREIGN KEY (user_id, project_id) "
+            "REFERENCES users (id, project_id) ON DELETE CASCADE ON UPDATE CASCADE"
+        )
+    )
+    for index in table.indexes:
+        index.create(session.connection())
+    session.execute(
+        text(
+            f"ALTER TABLE {table_name} ATTACH PARTITION {legacy_name} "
+            f"FOR VALUES FROM (MINVALUE) TO ('{upper.isoformat()}')"
+        )
+    )
+    session.execute(
+        text(f"CREATE TABLE {table_name}_default PARTITION OF {table_name} DEFAULT")
+    )
+    LOG.info(f"Converted {table_name} to a partitioned table, legacy rows < {upper}")
+
+
+def install_gist_cleanup(session) -> None:
+    session.execute(text("""
+    CREATE OR REPLACE FUNCTION user_events_delete_gists() RETURNS trigger AS $$
+    BEGIN
+        DELETE FROM user_event_gists AS g USING old_rows AS o
+        WHERE g.event_id = o.id AND g.project_id = o.project_id;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """))
+    session.execute(text("""
+    CREATE OR REPLACE TRIGGER user_events_delete_gists
+    AFTER DELETE ON user_events
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_events_delete_gists();
+    """))
+
+
+def create_partition(
+    session, table_name: str, name: str, start: datetime, end: datetime
+) -> None:
+    """Create the `[start, end)` partition, moving in the rows the default partition
+    already holds for that range: Postgres refuses to create it over them.
+    """
+    default_name = f"{table_name}_default"
+    bounds = {"start": start, "end": end}
+    create = (
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table_name} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+    stranded = session.execute(
+        text(
+            f"SELECT EXISTS (SELECT 1 FROM {default_name} "
+            "WHERE created_at >= :start AND created_at < :end)"
+        ),
+        bounds,
+    ).scalar()
+    if not stranded:
+        session.execute(text(create))
+        return
+
+    # Generated columns are recomputed on insert, they can't be copied
+    columns = ", ".join(
+        session.execute(
+            text("""
+            SELECT quote_ident(attname) FROM pg_attribute
+            WHERE attrelid = CAST(:table_name AS regclass) AND attnum > 0
+            AND NOT attisdropped AND attgenerated = ''
+            ORDER BY attnum;
+            """),
+            {"table_name": table_name},
+        ).scalars()
+    )
+    # The rows move between partitions, the statement triggers on the parent
+    # (user counters, gist and tag cleanup) don't fire
+    session.execute(text(f"ALTER TABLE {table_name} DETACH PARTITION {default_name}"))
+    session.execute(text(create))
+    moved = session.execute(
+        text(f"""
+        WITH moved AS (
+            DELETE FROM {default_name}
+            WHERE created_at >= :start AND created_at < :end
+            RETURNING {columns}
+        )
+        INSERT INTO {name} ({columns}) SELECT {columns} FROM moved;
+        """),
+        bounds,
+    ).rowcount
+    session.execute(
+        text(f"ALTER TABLE {table_name} ATTACH PARTITION {default_name} DEFAULT")
+    )
+    LOG.info(f"Moved {moved} rows of {default_name} into the new partition {name}")
+
+
+def ensure_partitions(session, months_ahead: int = None) -> list[str]:
+    """Create monthly partitions from the current month up to `months_ahead` months later"""
+    if months_ahead is None:
+        months_ahead = CONFIG.event_partition_premake_months
+    now = datetime.now(timezone.utc)
+    created = []
+    for table in PARTITIONED_TABLES:
+        covered = [upper for _, upper in list_partitions(session, table.name) if upper]
+        start = max([month_start(now)] + covered)
+        end = add_months(month_start(now), months_ahead + 1)
+        while start < end:
+            next_start = add_months(start, 1)
+            name = partition_name(table.name, start)
+            create_partition(session, table.name, name, start, next_start)
+            created.append(name)
+            start = next_start
+    session.commit()
+    return created
+
+
+def drop_expired_partitions(session, retention_days: int = None) -> list[str]:
+    """Drop whole partitions whose rows are all older than `retention_days`"""
+    if retention_days is None:
+        retention_days = CONFIG.event_retention_days
+    if retention_days is None:
+        return []
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    dropped = []
+    for table in PARTITIONED_TABLES:
+        for name, upper in list_partitions(session, table.name):
+            if upper is None or upper > cutoff:
+                continue
+            # DROP doesn't fire the row-count triggers on the parent
+            column = USER_COUNTER_TABLES.get(table.name)
+            if column is not None:
+                session.execute(text(f"""
+                UPDATE users AS u SET {column} = GREATEST(u.{column} - d.n, 0)
+                FROM (
+                    SELECT user_id, project_id, count(*) AS n
+                    FROM {name} GROUP BY user_id, project_id
+                ) AS d
+                WHERE u.id = d.user_id AND u.project_id = d.project_id;
+                """))
+            session.execute(text(f"ALTER TABLE {table.name} DETACH PARTITION {name}"))
+            session.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    session.commit()
+    if dropped:
+        LOG.info(f"Dropped expired partitions older than {cutoff}: {dropped}")
+    return dropped
+
+
+def setup_partitions(session) -> None:
+    """Convert the event tables on first run, then make sure upcoming months exist"""
+    session.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext('user_events_partitions'))")
+    )
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(session, table.name):
+            convert_to_partitioned(session, table)
+    # Same transaction as the conversion, no event is written without its triggers
+    install_gist_cleanup(session)
+    UserEventTag.install_cleanup_trigger(session)
+    for table in PARTITIONED_TABLES:
+        if table.name in USER_COUNTER_TABLES:
+            User.install_counter_triggers(session, table.name)
+    session.commit()
+    ensure_partitions(session)
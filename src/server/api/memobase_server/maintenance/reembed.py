@@ -0,0 +1,160 @@
+"""
+Re-embed events and gists, either the rows stored without an embedding (the embedding
+call failed) or every row after `embedding_model` changed:
+
+    python -m memobase_server.maintenance reembed [--all] [--table user_event_gists]
+
+Rows are streamed through a server-side cursor in primary-key order and re-embedded
+in batches, `concurrency` batches at a time, under a texts-per-second ceiling.
+After each window of batches the updates are written in bulk and the last key is
+checkpointed in Redis, so an interrupted run resumes where it stopped.
+"""
+
+import json
+import time
+import uuid
+import asyncio
+from sqlalchemy import select, update, tuple_
+from ..connectors import Session, get_redis_client
+from ..env import CONFIG, LOG
+from ..llms.embeddings import get_embedding
+from ..models.database import UserEvent, UserEventGist
+from ..models.response import EventData
+from ..utils import event_embedding_str
+
+REEMBED_MODELS = {
+    UserEvent.__tablename__: UserEvent,
+    UserEventGist.__tablename__: UserEventGist,
+}
+
+
+def reembed_checkpoint_key(
+    table_name: str, everything: bool, project_id: str = None
+) -> str:
+    # A run scoped to one project must not resume from another one's position
+    scope = "all" if everything else "missing"
+    return f"reembed_checkpoint::{table_name}::{scope}::{project_id or '*'}"
+
+
+def embedding_text(model, data: dict) -> str:
+    if model is UserEvent:
+        return event_embedding_str(EventData(**data))
+    return data["content"]
+
+
+class RateLimiter:
+    """Spaces out work so that at most `rate` texts start per second"""
+
+    def __init__(self, rate: float = None):
+        self.rate = rate
+        self.next_start = 0.0
+
+    async def acquire(self, texts: int):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        start = max(now, self.next_start)
+        self.next_start = start + texts / self.rate
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+async def embed_batch(project_id: str, texts: list[str], limiter: RateLimiter):
+    await limiter.acquire(len(texts))
+    p = await get_embedding(
+        project_id, texts, phase="document", model=CONFIG.embedding_model
+    )
+    if not p.ok():
+        LOG.error(f"Re-embedding batch failed: {p.msg()}")
+        return None
+    vectors = p.data()
+    if vectors.shape[-1] != CONFIG.embedding_dim:
+        LOG.error(
+            f"Embedding dimension mismatch! Expected {CONFIG.embedding_dim}, "
+            f"got {vectors.shape[-1]}"
+        )
+        return None
+    return vectors
+
+
+async def reembed_table(
+    table_name: str,
+    everything: bool = False,
+    project_id: str = None,
+    batch_size: int = 64,
+    concurrency: int = 4,
+    max_texts_per_second: float = None,
+    restart: bool = False,
+) -> dict:
+    model = REEMBED_MODELS[table_name]
+    data_column = model.event_data if model is UserEvent else model.gist_data
+    checkpoint_key = reembed_checkpoint_key(table_name, everything, project_id)
+    async with get_redis_client() as redis_client:
+        checkpoint = None if restart else await redis_client.get(checkpoint_key)
+
+    stmt = select(model.id, model.project_id, data_column.label("data")).order_by(
+        model.id, model.project_id
+    )
+    if not everything:
+        stmt = stmt.where(model.embedding.is_(None))
+    if project_id is not None:
+        stmt = stmt.where(model.project_id == project_id)
+    if checkpoint is not None:
+        last = json.loads(checkpoint)
+        stmt = stmt.where(
+            tuple_(model.id, model.project_id)
+            > tuple_(uuid.UUID(last["id"]), last["project_id"])
+        )
+        LOG.info(f"Resuming {table_name} after {last}")
+
+    limiter = RateLimiter(max_texts_per_second)
+    stats = {"table": table_name, "updated": 0, "failed": 0}
+    window_rows = batch_size * concurrency
+    with Session() as read_session:
+        rows = read_session.execute(stmt.execution_options(yield_per=window_rows))
+        for window in rows.partitions():
+            # Embedding calls are per project for the usage metrics
+            batches = []
+            for start in range(0, len(window), batch_size):
+                chunk = window[start : start + batch_size]
+                by_project = {}
+                for row in chunk:
+                    by_project.setdefault(row.project_id, []).append(row)
+                batches.extend(by_project.items())
+            results = await asyncio.gather(
+                *[
+                    embed_batch(
+                        pid,
+                        [embedding_text(model, row.data) for row in batch],
+                        limiter,
+                    )
+                    for pid, batch in batches
+                ]
+            )
+            updates = []
+            for (_, batch), vectors in zip(batches, results):
+                if vectors is None:
+                    stats["failed"] += len(batch)
+                    continue
+                updates.extend(
+                    {"id": row.id, "project_id": row.project_id, "embedding": vector}
+                    for row, vector in zip(batch, vectors)
+                )
+            if updates:
+                with Session() as write_session:
+                    write_session.execute(update(model), updates)
+                    write_session.commit()
+                stats["updated"] += len(updates)
+
+            last = window[-1]
+            async with get_redis_client() as redis_client:
+                await redis_client.set(
+                    checkpoint_key,
+                    json.dumps({"id": str(last.id), "project_id": last.project_id}),
+                )
+            LOG.info(f"Re-embedding progress: {stats}")
+
+    # A finished run starts over next time
+    async with get_redis_client() as redis_client:
+        await redis_client.delete(checkpoint_key)
+    return stats
@@ -0,0 +1,80 @@
+"""
+Recall and latency of the binary hamming pre-filter against exact cosine search,
+run it before switching `embedding_storage` to `binary`:
+
+    python -m memobase_server.maintenance embeddings --benchmark 50
+"""
+
+import time
+from sqlalchemy import text, select, func, cast
+from ..env import CONFIG
+from ..models.database import UserEventGist, EmbeddingVector
+from ..utils import binary_prefilter
+from .embeddings import EMBEDDING_TABLES
+
+
+def benchmark_search(
+    session, samples: int = 50, topk: int = 10, rerank_factor: int = None
+) -> dict:
+    """Recall@topk and latency of the binary pre-filter against exact cosine search.
+
+    Each sampled gist's own embedding is the query, searched within its user.
+    Works in every storage mode, the bits are computed on the fly when the
+    `embedding_bit` column doesn't exist.
+    """
+    rerank_factor = rerank_factor or CONFIG.embedding_binary_rerank_factor
+    queries = session.execute(
+        select(
+            UserEventGist.user_id,
+            UserEventGist.project_id,
+            cast(UserEventGist.embedding, EmbeddingVector(dim=CONFIG.embedding_dim)),
+        )
+        .where(UserEventGist.embedding.is_not(None))
+        .order_by(func.random())
+        .limit(samples)
+    ).all()
+    recalls, exact_ms, binary_ms = [], [], []
+    for user_id, project_id, query_embedding in queries:
+        filters = [
+            UserEventGist.user_id == user_id,
+            UserEventGist.project_id == project_id,
+            UserEventGist.embedding.is_not(None),
+        ]
+        distance = UserEventGist.embedding.cosine_distance(query_embedding)
+        exact = select(UserEventGist.id).where(*filters).order_by(distance).limit(topk)
+        start = time.perf_counter()
+        expected = set(session.execute(exact).scalars())
+        exact_ms.append((time.perf_counter() - start) * 1000)
+
+        reranked = exact.where(
+            binary_prefilter(
+                UserEventGist, query_embedding, filters, topk * rerank_factor
+            )
+        )
+        start = time.perf_counter()
+        found = set(session.execute(reranked).scalars())
+        binary_ms.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(expected & found) / len(expected) if expected else 1.0)
+
+    # pg_partition_tree also covers plain tables, as a tree of one
+    sizes = {
+        table.name: session.execute(
+            text(
+                "SELECT sum(pg_total_relation_size(relid)) "
+                "FROM pg_partition_tree(CAST(:table_name AS regclass))"
+            ),
+            {"table_name": table.name},
+        ).scalar()
+        for table in EMBEDDING_TABLES
+    }
+    count = max(len(queries), 1)
+    return {
+        "storage": CONFIG.embedding_storage,
+        "samples": len(queries),
+        "topk": topk,
+        "rerank_factor": rerank_factor,
+        "recall": sum(recalls) / count,
+        "exact_ms": sum(exact_ms) / count,
+        "binary_ms": sum(binary_ms) / count,
+        "table_bytes": sizes,
+    }
@@ -13,11 +13,12 @@ from sqlalchemy import (
     Column,
     Index,
     Boolean,
+    Computed,
     PrimaryKeyConstraint,
     ForeignKeyConstraint,
 )
 from dataclasses import dataclass
-from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.dialects.postgresql import JSONB, UUID, TSVECTOR
 from sqlalchemy.orm import (
     relationship,
     Mapped,
@@ -37,13 +38,72 @@ from ..env import (
     BufferStatus,
 )
 from sqlalchemy.orm.attributes import get_history
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import Vector, HALFVEC, BIT
+import numpy as np
 
 REG = registry()
 DEFAULT_PROJECT_ID = "__root__"
 DEFAULT_PROJECT_SECRET = "__root__"
 
 
+GIST_SEARCH_VECTOR_EXPR = (
+    "to_tsvector('simple'::regconfig, COALESCE(gist_data ->> 'content', ''))"
+)
+# 'simple' without English stopwords, for queries: "I" or "the" would match almost
+# every gist. Nothing is stemmed, so query terms still match the indexed tokens
+GIST_SEARCH_QUERY_CONFIG = "memobase_search"
+
+# Comment on user_event_tags once the tags of older events are indexed
+EVENT_TAGS_BACKFILLED = "event tags backfilled"
+
+# Child table -> users counter column maintained by triggers
+USER_COUNTER_TABLES = {
+    "user_profiles": "profile_count",
+    "user_events": "event_count",
+}
+
+
+class EmbeddingBindMixin:
+    """Binds numpy arrays with 9 significant digits per value.
+
+    psycopg2 only sends text parameters, and `%.9g` round-trips float32 exactly
+    at about half the cost of pgvector's `str()` formatting.
+    """
+
+    def bind_processor(self, dialect):
+        fallback = super().bind_processor(dialect)
+
+        def process(value):
+            if isinstance(value, np.ndarray) and value.ndim == 1:
+                return "[" + ",".join(["%.9g" % v for v in value.tolist()]) + "]"
+            return fallback(value)
+
+        return process
+
+
+class EmbeddingVector(EmbeddingBindMixin, Vector):
+    cache_ok = True
+
+
+class EmbeddingHalfVector(EmbeddingBindMixin, HALFVEC):
+    cache_ok = True
+
+
+# `embedding_storage` -> column type, binary keeps halfvec values for the rerank
+EMBEDDING_STORAGE_TYPES = {
+    "vector": "vector",
+    "halfvec": "halfvec",
+    "binary": "halfvec",
+}
+EMBEDDING_BIT_EXPR = f"binary_quantize(embedding)::bit({CONFIG.embedding_dim})"
+
+
+def embedding_column_type():
+    if EMBEDDING_STORAGE_TYPES[CONFIG.embedding_storage] == "halfvec":
+        return EmbeddingHalfVector(dim=CONFIG.embedding_dim)
+    return EmbeddingVector(dim=CONFIG.embedding_dim)
+
+
 def next_month_first_day() -> datetime:
     today = datetime.now()
     # If we're in the last month of the year, move to January of next year
@@ -61,7 +121,7 @@ def check_legal_embedding_dim(cls, session):
         # Use text() to properly declare SQL expression
         sql = text(
             """
-        SELECT atttypmod
+        SELECT atttypmod, CAST(atttypid AS regtype)::text
         FROM pg_attribute
         JOIN pg_class ON pg_attribute.attrelid = pg_class.oid
         JOIN pg_namespace ON pg_class.relnamespace = pg_namespace.oid
@@ -71,7 +131,7 @@ def check_legal_embedding_dim(cls, session):
         """
         )
 
-        result = session.execute(sql, {"table_name": table_name}).scalar()
+        result = session.execute(sql, {"table_name": table_name}).first()
 
         # Table or column might not exist yet
         if result is None:
@@ -80,7 +140,7 @@ def check_legal_embedding_dim(cls, session):
             )
 
         # In pgvector, atttypmod - 8 is the dimension
-        actual_dim = result
+        actual_dim, actual_type = result
 
         if actual_dim != CONFIG.embedding_dim:
             raise ValueError(
@@ -88,6 +148,13 @@ def check_legal_embedding_dim(cls, session):
                 f"does not match database dimension ({actual_dim}). "
                 f"This may cause errors when inserting embeddings."
             )
+        expected_type = EMBEDDING_STORAGE_TYPES[CONFIG.embedding_storage]
+        if actual_type != expected_type:
+            raise ValueError(
+                f"Configuration embedding storage ({CONFIG.embedding_storage}) expects "
+                f"{expected_type} but the database column is {actual_type}. "
+                f"Run `python -m memobase_server.maintenance embeddings` to convert it."
+            )
         LOG.info(
             f"Configuration embedding dimension ({CONFIG.embedding_dim}) "
             f"matches database dimension ({actual_dim}). "
@@ -276,11 +343,96 @@ class User(Base):
         "Project", back_populates="related_users", init=False, foreign_keys=[project_id]
     )
 
+    # Maintained by statement-level triggers on user_profiles/user_events
+    profile_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, server_default="0", default=0, init=False
+    )
+    event_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, server_default="0", default=0, init=False
+    )
+
     __table_args__ = (
         PrimaryKeyConstraint("id", "project_id"),
         Index("idx_users_id_project_id", "id", "project_id"),
     )
 
+    @classmethod
+    def install_counter_triggers(cls, session, table_name: str):
+        """(Re)create the triggers counting the rows of `table_name`, without committing"""
+        column = USER_COUNTER_TABLES[table_name]
+        for op, sign in (("INSERT", "+"), ("DELETE", "-")):
+            rows = "new_rows" if op == "INSERT" else "old_rows"
+            func_name = f"{table_name}_{op.lower()}_user_counter"
+            session.execute(text(f"""
+            CREATE OR REPLACE FUNCTION {func_name}() RETURNS trigger AS $$
+            BEGIN
+                UPDATE users AS u SET {column} = GREATEST(u.{column} {sign} d.n, 0)
+                FROM (
+                    SELECT user_id, project_id, count(*) AS n
+                    FROM {rows} GROUP BY user_id, project_id
+                ) AS d
+                WHERE u.id = d.user_id AND u.project_id = d.project_id;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """))
+            session.execute(text(f"""
+            CREATE OR REPLACE TRIGGER {func_name}
+            AFTER {op} ON {table_name}
+            REFERENCING {"NEW" if op == "INSERT" else "OLD"} TABLE AS {rows}
+            FOR EACH STATEMENT EXECUTE FUNCTION {func_name}();
+            """))
+
+    @classmethod
+    def install_counters(cls, session):
+        """Add the counter columns on old deployments and keep them in sync with triggers"""
+        # Serialize concurrent workers running the DDL at startup
+        session.execute(
+            text("SELECT pg_advisory_xact_lock(hashtext('users_counters'))")
+        )
+        missing = session.execute(text("""
+            SELECT count(*) FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'users'
+            AND column_name IN ('profile_count', 'event_count');
+            """)).scalar()
+        for table_name, column in USER_COUNTER_TABLES.items():
+            session.execute(
+                text(
+                    f"ALTER TABLE users ADD COLUMN IF NOT EXISTS {column} "
+                    "INTEGER NOT NULL DEFAULT 0"
+                )
+            )
+            cls.install_counter_triggers(session, table_name)
+        if missing < len(USER_COUNTER_TABLES):
+            LOG.info("Backfilling users.profile_count and users.event_count")
+            for table_name, column in USER_COUNTER_TABLES.items():
+                session.execute(text(f"""
+                UPDATE users AS u SET {column} = d.n
+                FROM (
+                    SELECT user_id, project_id, count(*) AS n
+                    FROM {table_name} GROUP BY user_id, project_id
+                ) AS d
+                WHERE u.id = d.user_id AND u.project_id = d.project_id;
+                """))
+        session.commit()
+
+    @classmethod
+    def install_id_search_index(cls, session):
+        """Trigram index for `get_project_users` id search, skipped if pg_trgm is unavailable"""
+        try:
+            session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm;"))
+            session.execute(
+                text(
+                    "CREATE INDEX IF NOT EXISTS idx_users_id_trgm ON users "
+                    "USING gin ((CAST(id AS VARCHAR)) gin_trgm_ops);"
+                )
+            )
+            session.commit()
+            LOG.info("pg_trgm index on users.id created or already exists")
+        except Exception as e:
+            session.rollback()
+            LOG.warning(f"Skip pg_trgm index on users.id: {e}")
+
 
 @REG.mapped_as_dataclass
 class GeneralBlob(Base):
@@ -326,6 +478,14 @@ class GeneralBlob(Base):
             "idx_general_blobs_user_id_blob_type", "user_id", "project_id", "blob_type"
         ),
         Index("idx_general_blobs_id_project_id", "id", "project_id", unique=True),
+        Index(
+            "idx_general_blobs_user_id_blob_type_created_at",
+            "user_id",
+            "project_id",
+            "blob_type",
+            text("created_at DESC"),
+            text("id DESC"),
+        ),
         ForeignKeyConstraint(
             ["user_id", "project_id"],
             ["users.id", "users.project_id"],
@@ -482,8 +642,16 @@ class UserEvent(Base):
     )
 
     embedding: Mapped[Vector] = mapped_column(
-        Vector(dim=CONFIG.embedding_dim), nullable=True, default=None
+        embedding_column_type(), nullable=True, default=None
     )
+    if CONFIG.embedding_storage == "binary":
+        # Small enough to stay inline, the hamming pre-filter never detoasts embeddings
+        embedding_bit: Mapped[Optional[str]] = mapped_column(
+            BIT(CONFIG.embedding_dim),
+            Computed(EMBEDDING_BIT_EXPR, persisted=True),
+            init=False,
+            deferred=True,
+        )
 
     related_user_event_gists: Mapped[list["UserEventGist"]] = relationship(
         "UserEventGist",
@@ -497,6 +665,15 @@ class UserEvent(Base):
         PrimaryKeyConstraint("id", "project_id"),
         Index("idx_user_events_user_id_project_id", "user_id", "project_id"),
         Index("idx_user_events_user_id_id_project_id", "user_id", "project_id", "id"),
+        # Recency-ordered reads: WHERE user/project [AND created_at > ...]
+        # ORDER BY created_at DESC, id DESC LIMIT k
+        Index(
+            "idx_user_events_user_id_project_id_created_at",
+            "user_id",
+            "project_id",
+            text("created_at DESC"),
+            text("id DESC"),
+        ),
         ForeignKeyConstraint(
             ["user_id", "project_id"],
             ["users.id", "users.project_id"],
@@ -551,7 +728,23 @@ class UserEventGist(Base):
     )
 
     embedding: Mapped[Vector] = mapped_column(
-        Vector(dim=CONFIG.embedding_dim), nullable=True, default=None
+        embedding_column_type(), nullable=True, default=None
+    )
+    if CONFIG.embedding_storage == "binary":
+        # Small enough to stay inline, the hamming pre-filter never detoasts embeddings
+        embedding_bit: Mapped[Optional[str]] = mapped_column(
+            BIT(CONFIG.embedding_dim),
+            Computed(EMBEDDING_BIT_EXPR, persisted=True),
+            init=False,
+            deferred=True,
+        )
+
+    # 'simple' keeps names, dates and mixed-language tokens as they are
+    search_vector: Mapped[Optional[str]] = mapped_column(
+        TSVECTOR,
+        Computed(GIST_SEARCH_VECTOR_EXPR, persisted=True),
+        init=False,
+        deferred=True,
     )
 
     __table_args__ = (
@@ -566,6 +759,18 @@ class UserEventGist(Base):
             "project_id",
             "event_id",
         ),
+        Index(
+            "idx_user_event_gists_user_id_project_id_created_at",
+            "user_id",
+            "project_id",
+            text("created_at DESC"),
+            text("id DESC"),
+        ),
+        Index(
+            "idx_user_event_gists_search_vector",
+            "search_vector",
+            postgresql_using="gin",
+        ),
         ForeignKeyConstraint(
             ["user_id", "project_id"],
             ["users.id", "users.project_id"],
@@ -585,6 +790,159 @@ class UserEventGist(Base):
         check_legal_embedding_dim(cls, session)
         LOG.info("UserEventGist embedding dimension checked")
 
+    @classmethod
+    def install_search_vector(cls, session, add_column: bool = False) -> bool:
+        """Set up lexical search, return whether the `search_vector` column exists.
+
+        `create_all` won't add the generated column to an existing table. Adding it
+        rewrites the table under an exclusive lock, so only the maintenance command
+        passes `add_column`.
+        """
+        # Serialize concurrent workers, text search objects have no IF NOT EXISTS
+        session.execute(
+            text("SELECT pg_advisory_xact_lock(hashtext('gist_search_config'))")
+        )
+        session.execute(text(f"""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_ts_config
+                WHERE cfgname = '{GIST_SEARCH_QUERY_CONFIG}'
+                AND cfgnamespace = CAST(current_schema() AS regnamespace)
+            ) THEN
+                CREATE TEXT SEARCH DICTIONARY {GIST_SEARCH_QUERY_CONFIG}_simple (
+                    TEMPLATE = pg_catalog.simple, STOPWORDS = english
+                );
+                CREATE TEXT SEARCH CONFIGURATION {GIST_SEARCH_QUERY_CONFIG} (
+                    COPY = pg_catalog.simple
+                );
+                ALTER TEXT SEARCH CONFIGURATION {GIST_SEARCH_QUERY_CONFIG}
+                    ALTER MAPPING REPLACE simple WITH {GIST_SEARCH_QUERY_CONFIG}_simple;
+            END IF;
+        END $$;
+        """))
+        has_column = session.execute(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = :table_name "
+                "AND column_name = 'search_vector')"
+            ),
+            {"table_name": cls.__tablename__},
+        ).scalar()
+        if not has_column and add_column:
+            session.execute(
+                text(
+                    f"ALTER TABLE {cls.__tablename__} ADD COLUMN search_vector "
+                    f"tsvector GENERATED ALWAYS AS ({GIST_SEARCH_VECTOR_EXPR}) STORED"
+                )
+            )
+            has_column = True
+        session.commit()
+        return has_column
+
+
+@REG.mapped_as_dataclass
+class UserEventTag(Base):
+    """One row per `event_data["event_tags"]` entry, so tag filters are index lookups"""
+
+    __tablename__ = "user_event_tags"
+
+    event_id: Mapped[UUID] = mapped_column(
+        UUID(as_uuid=True),
+        nullable=False,
+    )
+
+    user_id: Mapped[UUID] = mapped_column(
+        UUID(as_uuid=True),
+        nullable=False,
+    )
+
+    project_id: Mapped[str] = mapped_column(
+        VARCHAR(64),
+        default=DEFAULT_PROJECT_ID,
+    )
+
+    tag: Mapped[str] = mapped_column(VARCHAR(255), nullable=False, default=None)
+    value: Mapped[str] = mapped_column(TEXT, nullable=False, default=None)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "project_id"),
+        Index(
+            "idx_user_event_tags_user_id_project_id_tag_value",
+            "user_id",
+            "project_id",
+            "tag",
+            "value",
+        ),
+        Index("idx_user_event_tags_event_id_project_id", "event_id", "project_id"),
+        # No FK to user_events: it can't reference a partitioned user_events,
+        # `install_cleanup` removes the tags of deleted events instead
+        ForeignKeyConstraint(
+            ["user_id", "project_id"],
+            ["users.id", "users.project_id"],
+            ondelete="CASCADE",
+            onupdate="CASCADE",
+        ),
+    )
+
+    @classmethod
+    def install_cleanup(cls, session):
+        cls.install_cleanup_trigger(session)
+        session.commit()
+
+    @classmethod
+    def install_cleanup_trigger(cls, session):
+        """(Re)create the trigger removing the tags of deleted events, without committing"""
+        session.execute(text("""
+        CREATE OR REPLACE FUNCTION user_events_delete_tags() RETURNS trigger AS $$
+        BEGIN
+            DELETE FROM user_event_tags AS t USING old_rows AS o
+            WHERE t.event_id = o.id AND t.project_id = o.project_id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """))
+        session.execute(text("""
+        CREATE OR REPLACE TRIGGER user_events_delete_tags
+        AFTER DELETE ON user_events
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION user_events_delete_tags();
+        """))
+
+    @classmethod
+    def backfill(cls, session):
+        """Index the tags of events written before `user_event_tags` existed.
+
+        Runs once, the table comment records that it's done. Events tagged
+        since the table was created are skipped.
+        """
+        session.execute(
+            text("SELECT pg_advisory_xact_lock(hashtext('user_event_tags'))")
+        )
+        comment = session.execute(
+            text("SELECT obj_description(CAST('user_event_tags' AS regclass))")
+        ).scalar()
+        if comment == EVENT_TAGS_BACKFILLED:
+            session.commit()
+            return
+        result = session.execute(text("""
+            INSERT INTO user_event_tags (id, event_id, user_id, project_id, tag, value)
+            SELECT gen_random_uuid(), e.id, e.user_id, e.project_id, t->>'tag', t->>'value'
+            FROM user_events AS e
+            CROSS JOIN LATERAL jsonb_array_elements(e.event_data->'event_tags') AS t
+            WHERE jsonb_typeof(e.event_data->'event_tags') = 'array'
+            AND t->>'tag' IS NOT NULL AND t->>'value' IS NOT NULL
+            AND NOT EXISTS (
+                SELECT 1 FROM user_event_tags AS et
+                WHERE et.event_id = e.id AND et.project_id = e.project_id
+            );
+            """))
+        session.execute(
+            text(f"COMMENT ON TABLE user_event_tags IS '{EVENT_TAGS_BACKFILLED}'")
+        )
+        session.commit()
+        LOG.info(f"Backfilled {result.rowcount} event tags")
+
 
 @REG.mapped_as_dataclass
 class UserStatus(Base):
@@ -619,6 +977,14 @@ class UserStatus(Base):
             "idx_user_statuses_user_id_project_id_type", "user_id", "project_id", "type"
         ),
         Index("idx_user_statuses_user_id_id_project_id", "user_id", "project_id", "id"),
+        Index(
+            "idx_user_statuses_user_id_type_created_at",
+            "user_id",
+            "project_id",
+            "type",
+            text("created_at DESC"),
+            text("id DESC"),
+        ),
         ForeignKeyConstraint(
             ["user_id", "project_id"],
             ["users.id", "users.project_id"],
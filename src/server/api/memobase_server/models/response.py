@@ -1,7 +1,7 @@
 from datetime import datetime
 from enum import IntEnum
-from typing import Optional, Literal
-from pydantic import BaseModel, UUID4, UUID5, Field
+from typing import Optional, Literal, Union, Annotated
+from pydantic import BaseModel, UUID4, UUID5, Field, field_validator
 from .blob import BlobData, OpenAICompatibleMessage
 from .claim import ClaimData
 from .action import ActionData
@@ -50,6 +50,12 @@ class IdsData(BaseModel):
     ids: list[UUID] = Field(..., description="List of UUID identifiers")
 
 
+class PagedIdsData(IdsData):
+    next_cursor: Optional[str] = Field(
+        None, description="Cursor of the next page, null when there are no more items"
+    )
+
+
 class ChatModalResponse(BaseModel):
     event_id: Optional[UUID] = Field(..., description="The event's unique identifier")
     add_profiles: Optional[list[UUID]] = Field(
@@ -118,6 +124,9 @@ class UserEventGistData(BaseModel):
         None, description="Timestamp when the event gist was last updated"
     )
     similarity: Optional[float] = Field(None, description="Similarity score")
+    score: Optional[float] = Field(
+        None, description="Reciprocal-rank fused score of the search"
+    )
 
 
 class UserEventData(BaseModel):
@@ -147,16 +156,229 @@ class UserData(BaseModel):
     )
 
 
+class UserBlobData(BlobData):
+    id: Optional[UUID] = Field(
+        None,
+        description="Client-generated blob ID, a retried batch skips the blobs that were already inserted",
+    )
+    user_id: UUID = Field(..., description="The ID of the user the blob belongs to")
+
+
+class BatchBlobData(BaseModel):
+    blobs: list[UserBlobData] = Field(
+        ..., min_length=1, description="Blobs to insert, in the order they happened"
+    )
+
+
+class BatchProfileQuery(BaseModel):
+    user_ids: list[UUID] = Field(..., description="The IDs of the users")
+    topk: Optional[int] = Field(
+        None, description="Number of profiles to retrieve per user, default is all"
+    )
+    max_token_size: Optional[int] = Field(
+        None,
+        description="Max token size of returned profile content per user, default is all",
+    )
+    prefer_topics: Optional[list[str]] = Field(
+        None,
+        description="Rank prefer topics at first to try to keep them in filtering, default order is by updated time",
+    )
+    only_topics: Optional[list[str]] = Field(
+        None, description="Only return profiles with these topics, default is all"
+    )
+    max_subtopic_size: Optional[int] = Field(
+        None,
+        description="Max subtopic size of the same topic in returned profile, default is all",
+    )
+    topic_limits: dict[str, int] = Field(
+        default_factory=dict,
+        description="Specific subtopic limits for topics, they override `max_subtopic_size`",
+    )
+    chats: list[OpenAICompatibleMessage] = Field(
+        default_factory=list,
+        description="Recent chats of the group, used to filter the profiles of every user",
+    )
+
+
+class BatchContextQuery(BaseModel):
+    user_ids: list[UUID] = Field(..., description="The IDs of the users")
+    max_token_size: int = Field(
+        1000, description="Max token size of returned Context per user"
+    )
+    prefer_topics: Optional[list[str]] = Field(
+        None,
+        description="Rank prefer topics at first to try to keep them in filtering, default order is by updated time",
+    )
+    only_topics: Optional[list[str]] = Field(
+        None, description="Only return profiles with these topics, default is all"
+    )
+    max_subtopic_size: Optional[int] = Field(
+        None, description="Max subtopic size of the same topic in returned Context"
+    )
+    topic_limits: dict[str, int] = Field(
+        default_factory=dict,
+        description="Specific subtopic limits for topics, they override `max_subtopic_size`",
+    )
+    profile_event_ratio: float = Field(
+        0.6, description="Profile event ratio of returned Context"
+    )
+    require_event_summary: bool = Field(
+        False, description="Whether to require event summary in returned Context"
+    )
+    chats: list[OpenAICompatibleMessage] = Field(
+        default_factory=list,
+        description="Recent chats of the group to search relevant events, embedded once for all users",
+    )
+    event_similarity_threshold: float = Field(
+        0.2, description="Event similarity threshold of returned Context"
+    )
+    time_range_in_days: int = Field(
+        180, description="Only allow events within the past few days"
+    )
+    customize_context_prompt: Optional[str] = Field(
+        None,
+        description="Customize context prompt template, with `{profile_section}` and `{event_section}`",
+    )
+    full_profile_and_only_search_event: bool = Field(
+        True,
+        description="Set to `False` to also search relevant profiles with the chats",
+    )
+    fill_window_with_events: bool = Field(
+        False, description="Fill the token window with the rest events"
+    )
+    event_recency_half_life_days: Optional[float] = Field(
+        None,
+        gt=0,
+        description="Half-life in days of the recency decay blended into event search scores",
+    )
+    event_recency_weight: Optional[float] = Field(
+        None,
+        ge=0,
+        le=1,
+        description="Weight of the recency decay against relevance, between 0 and 1",
+    )
+
+
+class ImportRecordBase(BaseModel):
+    id: Optional[UUID] = Field(
+        None, description="Record ID, records whose ID already exists are skipped"
+    )
+    created_at: Optional[datetime] = Field(
+        None, description="Creation time, default to the import time"
+    )
+    updated_at: Optional[datetime] = Field(
+        None, description="Update time, default to the creation time"
+    )
+
+
+class ImportUserRecord(ImportRecordBase):
+    type: Literal["user"]
+    id: UUID = Field(..., description="The user ID")
+    data: Optional[dict] = Field(None, description="User additional data in JSON")
+
+
+class ImportProfileRecord(ImportRecordBase):
+    type: Literal["profile"]
+    user_id: UUID = Field(..., description="The ID of the user")
+    content: str = Field(..., description="User profile content value")
+    attributes: dict = Field(
+        ..., description="Profile attributes, containing 'topic', 'sub_topic'"
+    )
+
+    @field_validator("attributes")
+    @classmethod
+    def validate_attributes(cls, v: dict) -> dict:
+        # Extra keys like `update_hits` are kept as they are
+        ProfileAttributes.model_validate(v)
+        return v
+
+
+class ImportEventRecord(ImportRecordBase):
+    type: Literal["event"]
+    user_id: UUID = Field(..., description="The ID of the user")
+    event_data: EventData = Field(..., description="User event data")
+    embedding: Optional[list[float]] = Field(
+        None, description="Precomputed embedding of the event"
+    )
+
+
+class ImportGistRecord(ImportRecordBase):
+    type: Literal["gist"]
+    user_id: UUID = Field(..., description="The ID of the user")
+    event_id: UUID = Field(..., description="The ID of the gist's event")
+    gist_data: EventGistData = Field(..., description="User event gist data")
+    embedding: Optional[list[float]] = Field(
+        None, description="Precomputed embedding of the gist"
+    )
+
+
+class ImportBlobRecord(BaseModel):
+    # Exported blobs are accepted and skipped, buffers aren't imported
+    type: Literal["blob"]
+
+
+ImportRecord = Annotated[
+    Union[
+        ImportUserRecord,
+        ImportProfileRecord,
+        ImportEventRecord,
+        ImportGistRecord,
+        ImportBlobRecord,
+    ],
+    Field(discriminator="type"),
+]
+
+
+class ImportData(BaseModel):
+    users: int = Field(0, description="Number of users created")
+    profiles: int = Field(0, description="Number of profiles imported")
+    events: int = Field(0, description="Number of events imported")
+    gists: int = Field(0, description="Number of event gists imported")
+    skipped: int = Field(
+        0, description="Number of records skipped, existing IDs and blobs"
+    )
+    invalid: int = Field(0, description="Number of records that failed validation")
+    errors: list[str] = Field(
+        default_factory=list, description="The first validation errors, by line"
+    )
+
+
 class UserProfilesData(BaseModel):
     profiles: list[ProfileData] = Field(..., description="List of user profiles")
 
 
+class UserProfilesItem(UserProfilesData):
+    user_id: UUID = Field(..., description="The ID of the user")
+
+
+class UsersProfilesData(BaseModel):
+    users: list[UserProfilesItem] = Field(
+        ..., description="Profiles of every user, in the requested order"
+    )
+
+
+class UserContextItem(ContextData):
+    user_id: UUID = Field(..., description="The ID of the user")
+
+
+class UsersContextData(BaseModel):
+    users: list[UserContextItem] = Field(
+        ..., description="Context of every user, in the requested order"
+    )
+
+
 class UserEventsData(BaseModel):
     events: list[UserEventData] = Field(..., description="List of user events")
+    next_cursor: Optional[str] = Field(
+        None, description="Cursor of the next page when listing events"
+    )
 
 
 class UserEventGistsData(BaseModel):
     gists: list[UserEventGistData] = Field(..., description="List of user event gists")
+    next_cursor: Optional[str] = Field(
+        None, description="Cursor of the next page when listing event gists"
+    )
 
 
 class StrIntData(BaseModel):
@@ -201,6 +423,9 @@ class UserStatusData(BaseModel):
 
 class UserStatusesData(BaseModel):
     statuses: list[UserStatusData] = Field(..., description="List of user statuses")
+    next_cursor: Optional[str] = Field(
+        None, description="Cursor of the next page, null when there are no more items"
+    )
 
 
 class ProactiveTopicData(BaseModel):
@@ -231,6 +456,9 @@ class UserContextImport(BaseModel):
 class ProjectUsersData(BaseModel):
     users: list = Field(..., description="The user list")
     count: int = Field(0, description="The user count")
+    next_cursor: Optional[str] = Field(
+        None, description="Cursor of the next page when ordering by created_at"
+    )
 
 
 class DailyUsage(BaseModel):
@@ -258,6 +486,12 @@ class IdsResponse(BaseResponse):
     )
 
 
+class PagedIdsResponse(BaseResponse):
+    data: Optional[PagedIdsData] = Field(
+        None, description="Response containing a page of IDs"
+    )
+
+
 class ProfileConfigDataResponse(BaseResponse):
     data: Optional[ProfileConfigData] = Field(
         None, description="Response containing profile config data"
@@ -302,6 +536,18 @@ class UserContextDataResponse(BaseResponse):
     )
 
 
+class UsersProfilesResponse(BaseResponse):
+    data: Optional[UsersProfilesData] = Field(
+        None, description="Response containing the profiles of many users"
+    )
+
+
+class UsersContextResponse(BaseResponse):
+    data: Optional[UsersContextData] = Field(
+        None, description="Response containing the contexts of many users"
+    )
+
+
 class BillingResponse(BaseResponse):
     data: Optional[BillingData] = Field(
         None, description="Response containing token left"
@@ -318,6 +564,55 @@ class BlobInsertData(IdData):
     chat_results: Optional[list[ChatModalResponse]] = Field(
         None, description="List of chat modal data"
     )
+    flush_job_id: Optional[UUID] = Field(
+        None,
+        description="ID of the background flush this insert started, wait for it with `GET /users/buffer/jobs/{job_id}`",
+    )
+
+
+class BlobsInsertData(IdsData):
+    flush_job_ids: list[UUID] = Field(
+        default_factory=list,
+        description="IDs of the background flushes this batch started, one per full buffer",
+    )
+
+
+class FlushJobData(BaseModel):
+    job_id: UUID = Field(..., description="The ID of the flush job")
+    user_id: UUID = Field(..., description="The ID of the user")
+    blob_type: str = Field(..., description="The type of the flushed buffer")
+    status: Literal["pending", "done", "failed"] = Field(
+        ..., description="`pending` until the flush has finished"
+    )
+    result: Optional[ChatModalResponse] = Field(
+        None, description="The memory changes of the flush, once done"
+    )
+    error: Optional[str] = Field(None, description="Error message, once failed")
+
+
+class ImportResponse(BaseResponse):
+    data: Optional[ImportData] = Field(
+        None, description="Response containing the import statistics"
+    )
+
+
+class BlobsInsertResponse(BaseResponse):
+    data: Optional[BlobsInsertData] = Field(
+        None, description="Response containing the blob IDs and flush jobs"
+    )
+
+
+class FlushBufferResponse(ChatModalAPIResponse):
+    flush_job_id: Optional[UUID] = Field(
+        None,
+        description="ID of the background flush, when `wait_process` is false and the buffer wasn't empty",
+    )
+
+
+class FlushJobResponse(BaseResponse):
+    data: Optional[FlushJobData] = Field(
+        None, description="Response containing the flush job"
+    )
 
 
 class BlobInsertResponse(BaseResponse):
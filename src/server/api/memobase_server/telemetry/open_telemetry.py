@@ -36,6 +36,9 @@ class CounterMetricName(Enum):
     LLM_TOKENS_INPUT = "llm_input_tokens_total"
     LLM_TOKENS_OUTPUT = "llm_output_tokens_total"
     EMBEDDING_TOKENS = "embedding_tokens_total"
+    PROFILE_CACHE_HIT = "profile_cache_hits_total"
+    PROFILE_CACHE_MISS = "profile_cache_misses_total"
+    PROFILE_CACHE_STAMPEDE = "profile_cache_stampede_total"
 
     def get_description(self) -> str:
         """Get the description for this metric."""
@@ -46,6 +49,9 @@ class CounterMetricName(Enum):
             CounterMetricName.LLM_TOKENS_INPUT: "Total number of input tokens",
             CounterMetricName.LLM_TOKENS_OUTPUT: "Total number of output tokens",
             CounterMetricName.EMBEDDING_TOKENS: "Total number of embedding tokens",
+            CounterMetricName.PROFILE_CACHE_HIT: "Total number of user profile reads served from cache",
+            CounterMetricName.PROFILE_CACHE_MISS: "Total number of user profile reads that missed the cache",
+            CounterMetricName.PROFILE_CACHE_STAMPEDE: "Total number of cache misses that waited on an in-flight rebuild",
         }
         return descriptions[self]
 
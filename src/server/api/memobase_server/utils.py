@@ -1,10 +1,16 @@
 import re
+import math
 import yaml
 import json
-from typing import cast
+import uuid
+import base64
+import orjson
+from typing import cast, Any
+from collections import OrderedDict
 from datetime import timezone, datetime
 from functools import wraps
 from pydantic import ValidationError
+from sqlalchemy import extract, func, tuple_, select, literal
 from .env import ENCODER, LOG, CONFIG, ProfileConfig
 from .models.blob import (
     Blob,
@@ -171,3 +177,108 @@ def is_valid_profile_config(profile_config: str | None) -> Promise[None]:
         return Promise.reject(CODE.BAD_REQUEST, f"Invalid profile config: {e}")
     except ValidationError as e:
         return Promise.reject(CODE.BAD_REQUEST, f"Invalid profile config: {e}")
+
+
+def encode_cursor(created_at: datetime, id: uuid.UUID | str) -> str:
+    """Opaque keyset cursor pointing at a `(created_at, id)` row position."""
+    raw = orjson.dumps([created_at.isoformat(), str(id)])
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = orjson.loads(raw)
+        return datetime.fromisoformat(created_at), uuid.UUID(id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def after_cursor(created_at_column, id_column, cursor: str, descending: bool):
+    """Keyset predicate for rows ordered by `(created_at, id)` that come after the cursor."""
+    created_at, id = decode_cursor(cursor)
+    if descending:
+        return tuple_(created_at_column, id_column) < tuple_(created_at, id)
+    return tuple_(created_at_column, id_column) > tuple_(created_at, id)
+
+
+def recency_decay(created_at_column, half_life_days: float):
+    """`exp(-ln2 * age / half_life)`: 1 for a brand new row, 0.5 after one half-life."""
+    age_in_days = extract("epoch", func.now() - created_at_column) / 86400.0
+    return func.exp(-math.log(2) * age_in_days / half_life_days)
+
+
+def binary_prefilter(model, query_embedding, filters: list, limit: int):
+    """Restrict a search to the `limit` rows nearest by hamming distance over the
+    binary-quantized embeddings, so the exact distance only reads those rows."""
+    bits = getattr(model, "embedding_bit", None)
+    if bits is None:
+        bits = func.binary_quantize(model.embedding)
+    query_bits = func.binary_quantize(
+        literal(query_embedding, model.embedding.type).cast(model.embedding.type)
+    )
+    nearest = (
+        select(model.id)
+        .where(*filters, model.embedding.is_not(None))
+        .order_by(bits.op("<~>")(query_bits))
+        .limit(limit)
+    )
+    return model.id.in_(nearest)
+
+
+def resolve_recency(
+    half_life_days: float | None, weight: float | None
+) -> tuple[float, float] | None:
+    """Fill in config defaults, `None` means plain relevance ordering."""
+    if half_life_days is None:
+        half_life_days = CONFIG.event_search_recency_half_life_days
+    if weight is None:
+        weight = CONFIG.event_search_recency_weight
+    if not half_life_days or half_life_days <= 0 or not weight:
+        return None
+    return half_life_days, min(max(weight, 0.0), 1.0)
+
+
+class LRUCache:
+    """Process-local LRU bounded by both the number of entries and their total size."""
+
+    def __init__(self, max_items: int, max_bytes: int):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.__items: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        self.__total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    @property
+    def total_bytes(self) -> int:
+        return self.__total_bytes
+
+    def get(self, key: str) -> Any | None:
+        item = self.__items.get(key)
+        if item is None:
+            return None
+        self.__items.move_to_end(key)
+        return item[0]
+
+    def set(self, key: str, value: Any, size: int) -> None:
+        self.pop(key)
+        if self.max_items <= 0 or size > self.max_bytes:
+            return
+        self.__items[key] = (value, size)
+        self.__total_bytes += size
+        while len(self.__items) > self.max_items or self.__total_bytes > self.max_bytes:
+            _, (_, evicted_size) = self.__items.popitem(last=False)
+            self.__total_bytes -= evicted_size
+
+    def pop(self, key: str) -> Any | None:
+        item = self.__items.pop(key, None)
+        if item is None:
+            return None
+        self.__total_bytes -= item[1]
+        return item[0]
+
+    def clear(self) -> None:
+        self.__items.clear()
+        self.__total_bytes = 0
@@ -1,4 +1,7 @@
 import os
+import gzip
+import asyncio
+import json
 import pytest
 import numpy as np
 from unittest.mock import patch, Mock, AsyncMock
@@ -7,6 +10,8 @@ from fastapi.testclient import TestClient
 from memobase_server import controllers
 from memobase_server.models.database import DEFAULT_PROJECT_ID
 from memobase_server.models.blob import BlobType
+from memobase_server.models.utils import Promise
+from memobase_server.models.response import CODE
 import numpy as np
 from memobase_server.env import CONFIG
 
@@ -149,12 +154,69 @@ def test_user_create_with_id(client, db_env):
     u_id = d["data"]["id"]
     assert u_id == fake_id
 
+    # Creating again is a no-op
+    response = client.post(f"{PREFIX}/users", json={"data": {"test": 2}, "id": fake_id})
+    d = response.json()
+    assert response.status_code == 200
+    assert d["errno"] == 0
+    assert d["data"]["id"] == fake_id
+    assert d["data"]["data"] == {"test": 1}
+    response = client.get(f"{PREFIX}/users/{u_id}")
+    assert response.json()["data"]["data"] == {"test": 1}
+
     response = client.delete(f"{PREFIX}/users/{u_id}")
     d = response.json()
     assert response.status_code == 200
     assert d["errno"] == 0
 
 
+def test_blob_batch_insert_api(client, db_env):
+    import uuid
+
+    u1, u2 = str(uuid.uuid4()), str(uuid.uuid4())
+    blobs = [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": uid,
+            "blob_type": "chat",
+            "blob_data": {
+                "messages": [
+                    {"role": "user", "content": f"Hello {i}"},
+                    {"role": "assistant", "content": "Hi"},
+                ]
+            },
+        }
+        for i, uid in enumerate([u1, u2, u1])
+    ]
+    response = client.post(f"{PREFIX}/blobs/insert/batch", json={"blobs": blobs})
+    d = response.json()
+    assert response.status_code == 200
+    assert d["errno"] == 0
+    assert d["data"]["ids"] == [b["id"] for b in blobs]
+
+    # Missing users are created, and a retried batch buffers nothing twice
+    response = client.post(f"{PREFIX}/blobs/insert/batch", json={"blobs": blobs})
+    assert response.json()["errno"] == 0
+    for uid, count in [(u1, 2), (u2, 1)]:
+        p = client.get(f"{PREFIX}/users/buffer/capacity/{uid}/chat?status=idle")
+        assert len(p.json()["data"]["ids"]) == count
+
+    response = client.get(f"{PREFIX}/blobs/{u1}/{blobs[2]['id']}")
+    assert response.json()["data"]["blob_data"]["messages"][0]["content"] == "Hello 2"
+
+    response = client.post(
+        f"{PREFIX}/blobs/insert/batch",
+        json={"blobs": [{**blobs[0], "blob_data": {"content": "not a chat"}}]},
+    )
+    assert response.json()["errno"] != 0
+    response = client.post(f"{PREFIX}/blobs/insert/batch", json={"blobs": []})
+    assert response.status_code == 422
+
+    for uid in [u1, u2]:
+        response = client.delete(f"{PREFIX}/users/{uid}")
+        assert response.json()["errno"] == 0
+
+
 def test_blob_api_curd(client, db_env):
     response = client.post(f"{PREFIX}/users", json={})
     d = response.json()
@@ -275,11 +337,29 @@ async def test_api_user_profile(client, db_env):
     d = response.json()
     assert response.status_code == 200
     assert d["errno"] == 0
+    context_etag = response.headers["etag"]
+    profile_etag = client.get(f"{PREFIX}/users/profile/{u_id}").headers["etag"]
+
+    response = client.get(
+        f"{PREFIX}/users/context/{u_id}?only_topics=interest",
+        headers={"If-None-Match": context_etag},
+    )
+    assert response.status_code == 304
+    response = client.get(
+        f"{PREFIX}/users/context/{u_id}", headers={"If-None-Match": context_etag}
+    )
+    assert response.status_code == 200
 
     response = client.delete(f"{PREFIX}/users/profile/{u_id}/{id1}")
     d = response.json()
     assert response.status_code == 200
 
+    response = client.get(
+        f"{PREFIX}/users/profile/{u_id}", headers={"If-None-Match": profile_etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["etag"] != profile_etag
+
     response = client.get(f"{PREFIX}/users/profile/{u_id}")
     d = response.json()
     assert response.status_code == 200
@@ -302,6 +382,41 @@ async def test_api_user_profile(client, db_env):
     assert d["errno"] == 0
 
 
+@pytest.mark.asyncio
+async def test_api_response_compression(client, db_env):
+    response = client.post(f"{PREFIX}/users", json={})
+    u_id = response.json()["data"]["id"]
+    _profiles = [f"user visited city number {i} last summer" for i in range(40)]
+    _attributes = [{"topic": "travel", "sub_topic": f"city_{i}"} for i in range(40)]
+    p = await controllers.profile.add_user_profiles(
+        u_id, DEFAULT_PROJECT_ID, _profiles, _attributes
+    )
+    assert p.ok()
+
+    response = client.get(
+        f"{PREFIX}/users/profile/{u_id}", headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in response.headers["vary"].lower()
+    assert len(response.json()["data"]["profiles"]) == 40
+
+    response = client.get(
+        f"{PREFIX}/users/profile/{u_id}",
+        headers={"Accept-Encoding": "gzip;q=0, identity"},
+    )
+    assert "content-encoding" not in response.headers
+    assert len(response.json()["data"]["profiles"]) == 40
+
+    # Small responses aren't worth compressing
+    response = client.get(
+        f"{PREFIX}/healthcheck", headers={"Accept-Encoding": "gzip"}
+    )
+    assert "content-encoding" not in response.headers
+
+    response = client.delete(f"{PREFIX}/users/{u_id}")
+    assert response.json()["errno"] == 0
+
+
 @pytest.mark.asyncio
 async def test_api_user_flush_buffer(
     client,
@@ -350,11 +465,20 @@ async def test_api_user_flush_buffer(
     assert len(d["data"]["ids"]) == 1
 
     p = client.post(f"{PREFIX}/users/buffer/{u_id}/chat")
+    job_id = p.json()["flush_job_id"]
+    assert job_id is not None
     p = await controllers.buffer.get_buffer_capacity(
         u_id, DEFAULT_PROJECT_ID, BlobType.chat
     )
     assert p.ok() and p.data() == 0
 
+    p = client.get(f"{PREFIX}/users/buffer/jobs/{job_id}?timeout=5")
+    d = p.json()
+    assert d["errno"] == 0
+    assert d["data"]["status"] == "done"
+    assert d["data"]["user_id"] == u_id
+    assert d["data"]["result"]["event_id"] is not None
+
     p = client.get(f"{PREFIX}/users/buffer/capacity/{u_id}/chat?status=done")
     d = p.json()
     assert p.status_code == 200
@@ -431,6 +555,46 @@ def test_chat_blob_param_api(client, db_env):
     assert d["errno"] == 0
 
 
+@pytest.mark.asyncio
+async def test_api_flush_job(client, db_env):
+    response = client.post(f"{PREFIX}/users", json={})
+    u_id = response.json()["data"]["id"]
+
+    # Nothing buffered, nothing to wait for
+    response = client.post(f"{PREFIX}/users/buffer/{u_id}/chat")
+    d = response.json()
+    assert d["errno"] == 0
+    assert d["flush_job_id"] is None
+
+    job_id = await controllers.flush_job.create_flush_job(
+        u_id, DEFAULT_PROJECT_ID, BlobType.chat
+    )
+    response = client.get(f"{PREFIX}/users/buffer/jobs/{job_id}")
+    assert response.json()["data"]["status"] == "pending"
+
+    async def finish():
+        await asyncio.sleep(0.2)
+        await controllers.flush_job.finish_flush_job(
+            DEFAULT_PROJECT_ID, job_id, Promise.reject(CODE.SERVER_PARSE_ERROR, "bad")
+        )
+
+    p, _ = await asyncio.gather(
+        controllers.flush_job.wait_flush_job(DEFAULT_PROJECT_ID, job_id, 5), finish()
+    )
+    assert p.ok()
+    assert p.data().status == "failed"
+    assert "bad" in p.data().error
+
+    response = client.get(f"{PREFIX}/users/buffer/jobs/{job_id}?timeout=5")
+    assert response.json()["data"]["status"] == "failed"
+
+    response = client.get(f"{PREFIX}/users/buffer/jobs/{u_id}?timeout=1")
+    assert response.json()["errno"] == 404
+
+    response = client.delete(f"{PREFIX}/users/{u_id}")
+    assert response.json()["errno"] == 0
+
+
 @pytest.mark.asyncio
 async def test_api_user_event(
     client,
@@ -486,6 +650,244 @@ async def test_api_user_event(
     assert d["errno"] == 0
 
 
+@pytest.mark.asyncio
+async def test_api_export(client, db_env, mock_event_get_embedding):
+    response = client.post(f"{PREFIX}/users", json={"data": {"name": "Gus"}})
+    u_id = response.json()["data"]["id"]
+    p = await controllers.profile.add_user_profiles(
+        u_id,
+        DEFAULT_PROJECT_ID,
+        ["user likes jazz", "user lives in Paris"],
+        [
+            {"topic": "interest", "sub_topic": "music"},
+            {"topic": "basic_info", "sub_topic": "city"},
+        ],
+    )
+    assert p.ok()
+    p = await controllers.event.append_user_event(
+        u_id,
+        DEFAULT_PROJECT_ID,
+        {"event_tip": "- User went to a concert", "profile_delta": []},
+    )
+    assert p.ok()
+    event_id = str(p.data())
+
+    response = client.get(f"{PREFIX}/users/{u_id}/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.iter_lines() if line]
+    assert [r["type"] for r in records] == [
+        "user",
+        "profile",
+        "profile",
+        "event",
+        "gist",
+    ]
+    assert records[0]["data"] == {"name": "Gus"}
+    assert sorted(r["content"] for r in records if r["type"] == "profile") == [
+        "user likes jazz",
+        "user lives in Paris",
+    ]
+    assert records[3]["id"] == event_id
+    assert records[4]["event_id"] == event_id
+    assert "embedding" not in records[3]
+
+    response = client.get(
+        f"{PREFIX}/users/{u_id}/export",
+        params={"types": ["event"], "include_embeddings": True},
+        headers={"Accept-Encoding": "gzip"},
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    records = [json.loads(line) for line in response.iter_lines() if line]
+    assert len(records) == 1
+    assert len(records[0]["embedding"]) == CONFIG.embedding_dim
+
+    response = client.get(f"{PREFIX}/project/export", params={"types": ["user"]})
+    user_ids = [json.loads(line)["id"] for line in response.iter_lines() if line]
+    assert u_id in user_ids
+
+    response = client.delete(f"{PREFIX}/users/{u_id}")
+    assert response.json()["errno"] == 0
+    response = client.get(f"{PREFIX}/users/{u_id}/export")
+    assert response.json()["errno"] == 404
+
+
+@pytest.mark.asyncio
+async def test_api_import(client, db_env, mock_event_get_embedding):
+    response = client.post(f"{PREFIX}/users", json={"data": {"name": "Gus"}})
+    u_id = response.json()["data"]["id"]
+    p = await controllers.profile.add_user_profiles(
+        u_id,
+        DEFAULT_PROJECT_ID,
+        ["user likes jazz"],
+        [{"topic": "interest", "sub_topic": "music"}],
+    )
+    assert p.ok()
+    p = await controllers.event.append_user_event(
+        u_id,
+        DEFAULT_PROJECT_ID,
+        {
+            "event_tip": "- User went to a concert",
+            "profile_delta": [],
+            "event_tags": [{"tag": "emotion", "value": "happy"}],
+        },
+    )
+    assert p.ok()
+    response = client.get(
+        f"{PREFIX}/users/{u_id}/export", params={"include_embeddings": True}
+    )
+    body = response.content
+    response = client.delete(f"{PREFIX}/users/{u_id}")
+    assert response.json()["errno"] == 0
+
+    response = client.post(
+        f"{PREFIX}/project/import",
+        content=gzip.compress(body + b'{"type": "profile", "user_id": "x"}\n'),
+        headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"},
+    )
+    d = response.json()
+    assert d["errno"] == 0
+    assert d["data"]["users"] == 1
+    assert d["data"]["profiles"] == 1
+    assert d["data"]["events"] == 1
+    assert d["data"]["gists"] == 1
+    assert d["data"]["invalid"] == 1
+    assert d["data"]["errors"][0].startswith("line 5:")
+
+    response = client.get(f"{PREFIX}/users/{u_id}")
+    assert response.json()["data"]["data"] == {"name": "Gus"}
+    response = client.get(f"{PREFIX}/users/profile/{u_id}")
+    assert [p["content"] for p in response.json()["data"]["profiles"]] == [
+        "user likes jazz"
+    ]
+    response = client.get(
+        f"{PREFIX}/users/event_tags/search/{u_id}", params={"tags": "emotion"}
+    )
+    assert len(response.json()["data"]["events"]) == 1
+    response = client.get(
+        f"{PREFIX}/users/{u_id}/export",
+        params={"types": ["gist"], "include_embeddings": True},
+    )
+    records = [json.loads(line) for line in response.iter_lines() if line]
+    assert len(records[0]["embedding"]) == CONFIG.embedding_dim
+
+    # Replaying the same file loads nothing twice
+    response = client.post(f"{PREFIX}/project/import", content=body)
+    d = response.json()["data"]
+    assert (d["users"], d["profiles"], d["events"], d["gists"]) == (0, 0, 0, 0)
+    assert d["skipped"] == 4
+
+    # Cached profiles of an existing user are invalidated
+    response = client.post(f"{PREFIX}/users", json={})
+    other_id = response.json()["data"]["id"]
+    response = client.get(f"{PREFIX}/users/profile/{other_id}")
+    assert response.json()["data"]["profiles"] == []
+    profile = json.dumps(
+        {
+            "type": "profile",
+            "user_id": other_id,
+            "content": "user likes tea",
+            "attributes": {"topic": "interest", "sub_topic": "drink"},
+        }
+    )
+    response = client.post(f"{PREFIX}/project/import", content=profile)
+    assert response.json()["data"]["profiles"] == 1
+    response = client.get(f"{PREFIX}/users/profile/{other_id}")
+    assert [p["content"] for p in response.json()["data"]["profiles"]] == [
+        "user likes tea"
+    ]
+
+    response = client.post(
+        f"{PREFIX}/project/import",
+        content=json.dumps(
+            {
+                "type": "profile",
+                "user_id": other_id,
+                "content": "x",
+                "attributes": {"topic": "interest"},
+            }
+        ),
+    )
+    d = response.json()["data"]
+    assert d["invalid"] == 1 and d["profiles"] == 0
+    client.delete(f"{PREFIX}/users/{u_id}")
+    client.delete(f"{PREFIX}/users/{other_id}")
+
+
+@pytest.mark.asyncio
+async def test_api_batch_context(client, db_env, mock_event_get_embedding):
+    u_ids = []
+    for name in ["Gus", "Ana"]:
+        response = client.post(f"{PREFIX}/users", json={})
+        u_id = response.json()["data"]["id"]
+        u_ids.append(u_id)
+        p = await controllers.profile.add_user_profiles(
+            u_id,
+            DEFAULT_PROJECT_ID,
+            [f"user is called {name}"],
+            [{"topic": "basic_info", "sub_topic": "name"}],
+        )
+        assert p.ok()
+        p = await controllers.event.append_user_event(
+            u_id,
+            DEFAULT_PROJECT_ID,
+            {"event_tip": f"- {name} went to a concert", "profile_delta": []},
+        )
+        assert p.ok()
+    response = client.post(f"{PREFIX}/users", json={})
+    empty_id = response.json()["data"]["id"]
+    u_ids.append(empty_id)
+
+    response = client.post(
+        f"{PREFIX}/users/profile/batch", json={"user_ids": u_ids[::-1]}
+    )
+    d = response.json()
+    assert d["errno"] == 0
+    assert [u["user_id"] for u in d["data"]["users"]] == u_ids[::-1]
+    assert [[p["content"] for p in u["profiles"]] for u in d["data"]["users"]] == [
+        [],
+        ["user is called Ana"],
+        ["user is called Gus"],
+    ]
+
+    # Same contexts as one request per user
+    response = client.post(f"{PREFIX}/users/context/batch", json={"user_ids": u_ids})
+    d = response.json()
+    assert d["errno"] == 0
+    for u_id, user in zip(u_ids, d["data"]["users"]):
+        assert user["user_id"] == u_id
+        response = client.get(f"{PREFIX}/users/context/{u_id}")
+        assert user["context"] == response.json()["data"]["context"]
+    assert "Gus went to a concert" in d["data"]["users"][0]["context"]
+
+    chats = [{"role": "user", "content": "Who likes concerts?"}]
+    with patch(
+        "memobase_server.controllers.event_gist.get_embedding"
+    ) as mock_get_embedding:
+        async_mock = AsyncMock()
+        async_mock.ok = Mock(return_value=True)
+        async_mock.data = Mock(
+            return_value=np.array([[0.1 for _ in range(CONFIG.embedding_dim)]])
+        )
+        mock_get_embedding.return_value = async_mock
+        response = client.post(
+            f"{PREFIX}/users/context/batch",
+            json={"user_ids": u_ids, "chats": chats},
+        )
+        d = response.json()
+        assert d["errno"] == 0
+        assert mock_get_embedding.call_count == 1
+        assert "Ana went to a concert" in d["data"]["users"][1]["context"]
+
+    response = client.post(
+        f"{PREFIX}/users/context/batch",
+        json={"user_ids": u_ids * (CONFIG.max_batch_context_users // 3 + 1)},
+    )
+    assert response.json()["errno"] == 400
+    for u_id in u_ids:
+        client.delete(f"{PREFIX}/users/{u_id}")
+
+
 @pytest.mark.asyncio
 async def test_api_project_invalid_profile_config(client, db_env):
     response = client.post(
@@ -1,5 +1,6 @@
 import pytest
 import numpy as np
+from uuid import uuid4
 from unittest.mock import patch, AsyncMock, Mock
 from memobase_server.env import CONFIG
 from memobase_server.controllers import full as controllers
@@ -454,3 +455,634 @@ async def test_filter_user_events_edge_cases(db_env, mock_event_get_embedding):
     # Cleanup
     p = await controllers.user.delete_user(u_id, DEFAULT_PROJECT_ID)
     assert p.ok()
+
+
+@pytest.mark.asyncio
+async def test_user_context_event_topk(db_env):
+    from memobase_server.models.utils import Promise
+
+    p = await controllers.user.create_user(res.UserData(), DEFAULT_PROJECT_ID)
+    assert p.ok()
+    u_id = p.data().id
+    context_kwargs = dict(
+        prefer_topics=None,
+        only_topics=None,
+        max_subtopic_size=None,
+        topic_limits={},
+        require_event_summary=False,
+        chats=[],
+        event_similarity_threshold=0.2,
+        time_range_in_days=180,
+    )
+    with patch(
+        "memobase_server.controllers.context.get_user_event_gists",
+        AsyncMock(return_value=Promise.resolve(res.UserEventGistsData(gists=[]))),
+    ) as mock_gists:
+        # The event budget bounds the gists fetched, up to 60
+        for max_token_size, ratio, fill_window, topk in [
+            (200, 0.5, False, 10),
+            (200, 0.5, True, 20),
+            (2000, 0.6, False, 60),
+        ]:
+            p = await controllers.context.assemble_user_context(
+                u_id,
+                DEFAULT_PROJECT_ID,
+                max_token_size=max_token_size,
+                profile_event_ratio=ratio,
+                fill_window_with_events=fill_window,
+                **context_kwargs,
+            )
+            assert p.ok()
+            assert mock_gists.call_args.kwargs["topk"] == topk
+
+    p = await controllers.user.delete_user(u_id, DEFAULT_PROJECT_ID)
+    assert p.ok()
+
+
+@pytest.mark.asyncio
+async def test_user_context_snapshot(db_env, mock_event_get_embedding):
+    p = await controllers.user.create_user(res.UserData(), DEFAULT_PROJECT_ID)
+    assert p.ok()
+    u_id = p.data().id
+    p = await controllers.profile.add_user_profiles(
+        u_id,
+        DEFAULT_PROJECT_ID,
+        ["Gus"],
+        [{"topic": "basic_info", "sub_topic": "name"}],
+    )
+    assert p.ok()
+
+    context_kwargs = dict(
+        max_token_size=1000,
+        prefer_topics=None,
+        only_topics=None,
+        max_subtopic_size=None,
+        topic_limits={},
+        profile_event_ratio=0.6,
+        require_event_summary=False,
+        chats=[],
+        event_similarity_threshold=0.2,
+        time_range_in_days=180,
+    )
+    p = await controllers.context.get_user_context(
+        u_id, DEFAULT_PROJECT_ID, **context_kwargs
+    )
+    assert p.ok()
+    assert "Gus" in p.data().context
+    assert (
+        len(
+            await controllers.context_snapshot.get_context_snapshot_params(
+                u_id, DEFAULT_PROJECT_ID
+            )
+        )
+        == 1
+    )
+
+    # A hit is served without touching profiles or events
+    with patch(
+        "memobase_server.controllers.context.assemble_user_context"
+    ) as mock_assemble:
+        p = await controllers.context.get_user_context(
+            u_id, DEFAULT_PROJECT_ID, **context_kwargs
+        )
+        assert p.ok()
+        assert "Gus" in p.data().context
+        mock_assemble.assert_not_called()
+
+    # Mutations invalidate, the flush pipeline re-materializes
+    p = await controllers.event.append_user_event(
+        u_id,
+        DEFAULT_PROJECT_ID,
+        {"event_tip": "- Gus adopted a cat", "profile_delta": []},
+    )
+    assert p.ok()
+    p = await controllers.context.refresh_user_context_snapshots(
+        u_id, DEFAULT_PROJECT_ID
+    )
+    assert p.ok()
+    with patch(
+        "memobase_server.controllers.context.assemble_user_context"
+    ) as mock_assemble:
+        p = await controllers.context.get_user_context(
+            u_id, DEFAULT_PROJECT_ID, **context_kwargs
+        )
+        assert "Gus adopted a cat" in p.data().context
+        mock_assemble.assert_not_called()
+
+    # A memory write landing while a context is assembled keeps it out of the snapshot
+    (snapshot_params,) = await controllers.context_snapshot.get_context_snapshot_params(
+        u_id, DEFAULT_PROJECT_ID
+    )
+    assemble = controllers.context.assemble_user_context
+
+    async def assemble_racing_a_write(*args, **kwargs):
+        p = await assemble(*args, **kwargs)
+        await controllers.context_snapshot.invalidate_user_context_snapshots(
+            u_id, DEFAULT_PROJECT_ID
+        )
+        return p
+
+    await controllers.context_snapshot.invalidate_user_context_snapshots(
+        u_id, DEFAULT_PROJECT_ID
+    )
+    with patch(
+        "memobase_server.controllers.context.assemble_user_context",
+        assemble_racing_a_write,
+    ):
+        p = await controllers.context.get_user_context(
+            u_id, DEFAULT_PROJECT_ID, **context_kwargs
+        )
+        assert p.ok()
+        p = await controllers.context.get_users_context(
+            [u_id], DEFAULT_PROJECT_ID, **context_kwargs
+        )
+        assert p.ok()
+        p = await controllers.context.refresh_user_context_snapshots(
+            u_id, DEFAULT_PROJECT_ID
+        )
+        assert p.ok()
+    assert (
+        await controllers.context_snapshot.get_context_snapshot(
+            u_id, DEFAULT_PROJECT_ID, snapshot_params
+        )
+        is None
+    )
+
+    p = await controllers.user.delete_user(u_id, DEFAULT_PROJECT_ID)
+    assert p.ok()
+
+
+@pytest.mark.asyncio
+async def test_user_profile_cache_single_flight(db_env):
+    import asyncio
+    from memobase_server.connectors import get_redis_client
+
+    p = await controllers.user.create_user(res.UserData(), DEFAULT_PROJECT_ID)
+    assert p.ok()
+    u_id = p.data().id
+    p = await controllers.profile.add_user_profiles(
+        u_id,
+        DEFAULT_PROJECT_ID,
+        ["Gus"],
+        [{"topic": "basic_info", "sub_topic": "name"}],
+    )
+    assert p.ok()
+
+    # Mutations write the fresh snapshot through to the cache
+    with patch(
+        "memobase_server.controllers.profile.load_user_profiles",
+        wraps=controllers.profile.load_user_profiles,
+    ) as mock_load:
+        p = await controllers.profile.get_user_profiles(u_id, DEFAULT_PROJECT_ID)
+        assert p.ok() and len(p.data().profiles) == 1
+        assert mock_load.call_count == 0
+
+    # The Redis copy is used once the in-process copy is gone
+    controllers.profile.PROFILE_LRU_CACHE.pop(
+        controllers.profile.user_profiles_cache_key(u_id, DEFAULT_PROJECT_ID)
+    )
+    with patch(
+        "memobase_server.controllers.profile.load_user_profiles",
+        wraps=controllers.profile.load_user_profiles,
+    ) as mock_load:
+        p = await controllers.profile.get_user_profiles(u_id, DEFAULT_PROJECT_ID)
+        assert p.ok() and p.data().profiles[0].content == "Gus"
+        assert p.data().profiles[0].attributes["sub_topic"] == "name"
+        assert mock_load.call_count == 0
+
+    # A write from another worker bumps the version, local copies are stale now
+    async with get_redis_client() as redis_client:
+        await redis_client.incr(
+            controllers.profile.user_profiles_version_key(u_id, DEFAULT_PROJECT_ID)
+        )
+    with patch(
+        "memobase_server.controllers.profile.load_user_profiles",
+        wraps=controllers.profile.load_user_profiles,
+    ) as mock_load:
+        ps = await asyncio.gather(
+            *[
+                controllers.profile.get_user_profiles(u_id, DEFAULT_PROJECT_ID)
+                for _ in range(10)
+            ]
+        )
+        assert all(p.ok() and len(p.data().profiles) == 1 for p in ps)
+        assert mock_load.call_count == 1
+
+    p = await controllers.user.delete_user(u_id, DEFAULT_PROJECT_ID)
+    assert p.ok()
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_user_profiles(db_env):
+    from sqlalchemy import event
+    from memobase_server.connectors import DB_ENGINE
+
+    p = await controllers.user.create_user(res.UserData(), DEFAULT_PROJECT_ID)
+    assert p.ok()
+    u_id = p.data().id
+    p = await controllers.profile.add_user_profiles(
+        u_id,
+        DEFAULT_PROJECT_ID,
+        [f"value {i}" for i in range(200)],
+        [{"topic": "test", "sub_topic": f"sub_{i}"} for i in range(200)],
+    )
+    assert p.ok()
+    profile_ids = p.data().ids
+
+    statements = []
+
+    def count_statements(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(DB_ENGINE, "before_cursor_execute", count_statements)
+    try:
+        p = await controllers.profile.update_user_profiles(
+            u_id,
+            DEFAULT_PROJECT_ID,
+            [str(pid) for pid in profile_ids] + [str(uuid4())],
+            [f"new value {i}" for i in range(201)],
+            [None] * 100
+            + [{"topic": "test", "sub_topic": f"new_sub_{i}"} for i in range(100, 201)],
+        )
+    finally:
+        event.remove(DB_ENGINE, "before_cursor_execute", count_statements)
+    assert p.ok()
+    # Only the 200 existing profiles are touched, the unknown id is skipped
+    assert len(p.data().ids) == 200
+    update_statements = [
+        s for s in statements if s.lstrip().upper().startswith("UPDATE")
+    ]
+    assert len(update_statements) == 1
+    assert not any(
+        s.lstrip().upper().startswith("SELECT") and "user_profiles" in s
+        for s in statements[: statements.index(update_statements[0])]
+    )
+
+    p = await controllers.profile.get_user_profiles(u_id, DEFAULT_PROJECT_ID)
+    assert p.ok()
+    profiles = {str(pr.id): pr for pr in p.data().profiles}
+    assert profiles[str(profile_ids[0])].content == "new value 0"
+    assert profiles[str(profile_ids[0])].attributes["sub_topic"] == "sub_0"
+    assert profiles[str(profile_ids[150])].attributes["sub_topic"] == "new_sub_150"
+
+    p = await controllers.user.delete_user(u_id, DEFAULT_PROJECT_ID)
+    assert p.ok()
+
+
+@pytest.mark.asyncio
+async def test_user_blobs_cursor_pagination(db_env):
+    p = await controllers.user.create_user(res.UserData(), DEFAULT_PROJECT_ID)
+    assert p.ok()
+    u_id = p.data().id
+    for i in range(25):
+        p = await controllers.blob.insert_blob(
+            u_id,
+            DEFAULT_PROJECT_ID,
+            res.BlobData(
+                blob_type=BlobType.chat,
+                blob_data={"messages": [{"role": "user", "content": f"Hello {i}"}]},
+            ),
+        )
+        assert p.ok()
+
+    offset_ids = []
+    for page in range(3):
+        p = await controllers.user.get_user_all_blobs(
+            u_id, DEFAULT_PROJECT_ID, BlobType.chat, page=page, page_size=10
+        )
+        assert p.ok()
+        offset_ids.extend(p.data().ids)
+
+    cursor_ids = []
+    cursor = None
+    while True:
+        p = await controllers.user.get_user_all_blobs(
+            u_id, DEFAULT_PROJECT_ID, BlobType.chat, page_size=10, cursor=cursor
+        )
+        assert p.ok()
+        cursor_ids.extend(p.data().ids)
+        cursor = p.data().next_cursor
+        if cursor is None:
+            break
+    assert len(cursor_ids) == 25
+    assert cursor_ids == offset_ids
+
+    p = await controllers.user.get_user_all_blobs(
+        u_id, DEFAULT_PROJECT_ID, BlobType.chat, cursor="not-a-cursor"
+    )
+    assert not p.ok() and p.code() == res.CODE.BAD_REQUEST
+
+    p = await controllers.user.delete_user(u_id, DEFAULT_PROJECT_ID)
+    assert p.ok()
+
+
+@pytest.mark.asyncio
+async def test_user_events_cursor_pagination(db_env, mock_event_get_embedding):
+    from sqlalchemy import update
+    from datetime import datetime, timedelta, timezone
+    from memobase_server.connectors import Session
+    from memobase_server.models.database import UserEvent
+
+    p = await controllers.user.create_user(res.UserData(), DEFAULT_PROJECT_ID)
+    assert p.ok()
+    u_id = p.data().id
+    tips = ["- event 0", "- event 1 " + "long " * 200, "- event 2", "- event 3"]
+    event_ids = []
+    for tip in tips:
+        p = await controllers.event.append_user_event(
+            u_id, DEFAULT_PROJECT_ID, {"event_tip": tip}
+        )
+        assert p.ok()
+        event_ids.append(p.data())
+    # Spread the events over time, the oldest one outside the default window
+    with Session() as session:
+        for age, e_id in zip([60, 3, 2, 1], event_ids):
+            session.execute(
+                update(UserEvent)
+                .where(UserEvent.id == e_id)
+                .values(created_at=datetime.now(timezone.utc) - timedelta(days=age))
+            )
+        session.commit()
+
+    p = await controllers.event.get_user_events(u_id, DEFAULT_PROJECT_ID, topk=10)
+    assert p.ok() and len(p.data().events) == 3
+
+    async def walk(max_token_size=None):
+        pages, cursor = [], None
+        while True:
+            p = await controllers.event.get_user_events(
+                u_id, DEFAULT_PROJECT_ID, topk=3, time_range_in_days=0, cursor=cursor
+            )
+            assert p.ok()
+            p = await controllers.event.truncate_events(p.data(), max_token_size)
+            pages.append([e.event_data.event_tip for e in p.data().events])
+            cursor = p.data().next_cursor
+            if cursor is None:
+                return pages
+
+    assert await walk() == [tips[:0:-1], tips[:1]]
+    # The long event never fits, the walk steps past it instead of stopping
+    assert await walk(max_token_size=50) == [
+        ["- event 3", "- event 2"],
+        [],
+        ["- event 0"],
+    ]
+
+    p = await controllers.user.delete_user(u_id, DEFAULT_PROJECT_ID)
+    assert p.ok()
+
+
+@pytest.mark.asyncio
+async def test_project_users_counters(db_env):
+    p = await controllers.user.create_user(res.UserData(), DEFAULT_PROJECT_ID)
+    assert p.ok()
+    u_id = p.data().id
+
+    p = await controllers.profile.add_user_profiles(
+        u_id,
+        DEFAULT_PROJECT_ID,
+        ["Gus", "likes cats", "lives in Paris"],
+        [
+            {"topic": "basic_info", "sub_topic": "name"},
+            {"topic": "interest", "sub_topic": "pets"},
+            {"topic": "basic_info", "sub_topic": "city"},
+        ],
+    )
+    assert p.ok()
+    profile_ids = p.data().ids
+    for i in range(2):
+        p = await controllers.event.append_user_event(
+            u_id,
+            DEFAULT_PROJECT_ID,
+            {"event_tip": f"- event {i}", "profile_delta": []},
+        )
+        assert p.ok()
+    p = await controllers.profile.delete_user_profiles(
+        u_id, DEFAULT_PROJECT_ID, profile_ids[:1]
+    )
+    assert p.ok()
+
+    p = await controllers.project.get_project_users(
+        DEFAULT_PROJECT_ID, search=str(u_id)
+    )
+    assert p.ok()
+    assert p.data().count == 1
+    user = p.data().users[0]
+    assert user["profile_count"] == 2
+    assert user["event_count"] == 2
+
+    p = await controllers.project.get_project_users(
+        DEFAULT_PROJECT_ID, order_by="profile_count"
+    )
+    assert p.ok()
+    assert p.data().count >= 1
+    assert [u["profile_count"] for u in p.data().users] == sorted(
+        [u["profile_count"] for u in p.data().users], reverse=True
+    )
+
+    p = await controllers.user.delete_user(u_id, DEFAULT_PROJECT_ID)
+    assert p.ok()
+
+
+@pytest.mark.asyncio
+async def test_event_tags_sync(db_env):
+    p = await controllers.user.create_user(res.UserData(), DEFAULT_PROJECT_ID)
+    assert p.ok()
+    u_id = p.data().id
+
+    p = await controllers.event.append_user_event(
+        u_id,
+        DEFAULT_PROJECT_ID,
+        {
+            "event_tip": "- Gus quit his job",
+            "event_tags": [{"tag": "emotion", "value": "sad"}],
+        },
+    )
+    assert p.ok()
+    event_id = p.data()
+
+    p = await controllers.event.filter_user_events(
+        u_id, DEFAULT_PROJECT_ID, event_tag_equal={"emotion": "sad"}
+    )
+    assert [e.id for e in p.data().events] == [event_id]
+
+    # Values are bound parameters, not spliced into JSON
+    p = await controllers.event.filter_user_events(
+        u_id, DEFAULT_PROJECT_ID, event_tag_equal={"emotion": 'sad"}, {"tag": "x'}
+    )
+    assert p.ok() and p.data().events == []
+
+    p = await controllers.event.update_user_event(
+        u_id,
+        DEFAULT_PROJECT_ID,
+        event_id,
+        {"event_tags": [{"tag": "emotion", "value": "relieved"}]},
+    )
+    assert p.ok()
+    p = await controllers.event.filter_user_events(
+        u_id, DEFAULT_PROJECT_ID, event_tag_equal={"emotion": "sad"}
+    )
+    assert p.data().events == []
+    p = await controllers.event.filter_user_events(
+        u_id, DEFAULT_PROJECT_ID, has_event_tag=["emotion"]
+    )
+    assert [e.id for e in p.data().events] == [event_id]
+
+    p = await controllers.user.delete_user(u_id, DEFAULT_PROJECT_ID)
+    assert p.ok()
+
+
+@pytest.mark.asyncio
+async def test_search_user_event_gists_hybrid(db_env, mock_event_get_embedding):
+    p = await controllers.user.create_user(res.UserData(), DEFAULT_PROJECT_ID)
+    assert p.ok()
+    u_id = p.data().id
+    for tip in [
+        "- Gus moved to Marseille on 2024-03-02",
+        "- Gus adopted a cat",
+        "- Gus started learning the piano",
+    ]:
+        p = await controllers.event.append_user_event(
+            u_id, DEFAULT_PROJECT_ID, {"event_tip": tip}
+        )
+        assert p.ok()
+
+    p = await controllers.event_gist.search_user_event_gists(
+        u_id, DEFAULT_PROJECT_ID, "Marseille", search_method="lexical"
+    )
+    assert p.ok()
+    assert [g.gist_data.content for g in p.data().gists] == [
+        "- Gus moved to Marseille on 2024-03-02"
+    ]
+    # "the" is a stopword, it doesn't pull in "learning the piano"
+    p = await controllers.event_gist.search_user_event_gists(
+        u_id, DEFAULT_PROJECT_ID, "the cat", search_method="lexical"
+    )
+    assert p.ok()
+    assert [g.gist_data.content for g in p.data().gists] == ["- Gus adopted a cat"]
+
+    with patch(
+        "memobase_server.controllers.event_gist.get_embedding",
+        mock_event_get_embedding,
+    ):
+        p = await controllers.event_gist.search_user_event_gists(
+            u_id, DEFAULT_PROJECT_ID, "moving to Marseille", search_method="hybrid"
+        )
+    assert p.ok()
+    gists = p.data().gists
+    assert len(gists) == 3
+    assert "Marseille" in gists[0].gist_data.content
+    assert all(g.similarity is not None for g in gists)
+    assert gists[0].score > gists[1].score
+
+    # Lexical retrieval keeps working without the embedding provider
+    with patch.object(CONFIG, "enable_event_embedding", False):
+        p = await controllers.event_gist.search_user_event_gists(
+            u_id, DEFAULT_PROJECT_ID, "2024-03-02", search_method="vector"
+        )
+        assert not p.ok()
+        p = await controllers.event_gist.search_user_event_gists(
+            u_id, DEFAULT_PROJECT_ID, "2024-03-02", search_method="hybrid"
+        )
+        assert p.ok()
+        assert len(p.data().gists) == 1
+        assert p.data().gists[0].similarity is None
+
+    p = await controllers.user.delete_user(u_id, DEFAULT_PROJECT_ID)
+    assert p.ok()
+
+
+@pytest.mark.asyncio
+async def test_search_user_event_gists_recency(db_env, mock_event_get_embedding):
+    from sqlalchemy import update
+    from datetime import datetime, timedelta, timezone
+    from memobase_server.connectors import Session
+    from memobase_server.models.database import UserEventGist
+
+    p = await controllers.user.create_user(res.UserData(), DEFAULT_PROJECT_ID)
+    assert p.ok()
+    u_id = p.data().id
+    ages = {"- Gus went hiking": 400, "- Gus went sailing": 30, "- Gus went diving": 1}
+    for tip in ages:
+        p = await controllers.event.append_user_event(
+            u_id, DEFAULT_PROJECT_ID, {"event_tip": tip}
+        )
+        assert p.ok()
+    with Session() as session:
+        for tip, age in ages.items():
+            session.execute(
+                update(UserEventGist)
+                .where(
+                    UserEventGist.user_id == u_id,
+                    UserEventGist.gist_data["content"].astext == tip,
+                )
+                .values(created_at=datetime.now(timezone.utc) - timedelta(days=age))
+            )
+        session.commit()
+
+    with patch(
+        "memobase_server.controllers.event_gist.get_embedding",
+        mock_event_get_embedding,
+    ):
+        # Hard window: the 400-day-old gist is filtered out
+        p = await controllers.event_gist.search_user_event_gists(
+            u_id, DEFAULT_PROJECT_ID, "trips", time_range_in_days=180
+        )
+        assert p.ok()
+        assert len(p.data().gists) == 2
+
+        # Decay: every gist is a candidate, equally similar ones sort by age
+        p = await controllers.event_gist.search_user_event_gists(
+            u_id,
+            DEFAULT_PROJECT_ID,
+            "trips",
+            time_range_in_days=180,
+            search_method="vector",
+            recency_half_life_days=30,
+            recency_weight=0.5,
+        )
+        assert p.ok()
+        gists = p.data().gists
+        assert [g.gist_data.content for g in gists] == [
+            "- Gus went diving",
+            "- Gus went sailing",
+            "- Gus went hiking",
+        ]
+        # One half-life old: 0.5 * similarity + 0.5 * 0.5
+        assert gists[1].score == pytest.approx(0.75, abs=0.01)
+
+    p = await controllers.user.delete_user(u_id, DEFAULT_PROJECT_ID)
+    assert p.ok()
+
+
+@pytest.mark.asyncio
+async def test_export_snapshot(db_env):
+    import json
+
+    p = await controllers.user.create_user(res.UserData(), DEFAULT_PROJECT_ID)
+    assert p.ok()
+    u_id = p.data().id
+    p = await controllers.profile.add_user_profiles(
+        u_id,
+        DEFAULT_PROJECT_ID,
+        ["Gus"],
+        [{"topic": "basic_info", "sub_topic": "name"}],
+    )
+    assert p.ok()
+
+    lines = controllers.export.iter_export_lines(DEFAULT_PROJECT_ID, u_id)
+    chunks = [next(lines)]
+    # Written after the export started, after its snapshot was taken
+    p = await controllers.profile.add_user_profiles(
+        u_id,
+        DEFAULT_PROJECT_ID,
+        ["Paris"],
+        [{"topic": "basic_info", "sub_topic": "city"}],
+    )
+    assert p.ok()
+    chunks.extend(lines)
+    records = [json.loads(line) for line in b"".join(chunks).splitlines()]
+    assert [r.get("content") for r in records if r["type"] == "profile"] == ["Gus"]
+
+    p = await controllers.user.delete_user(u_id, DEFAULT_PROJECT_ID)
+    assert p.ok()
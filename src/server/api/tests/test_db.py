@@ -1,10 +1,54 @@
 import pytest
+import numpy as np
+from unittest.mock import patch
+from base64 import b64encode
+from uuid import uuid4
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine, text, select, insert, delete
 from sqlalchemy.inspection import inspect
-from memobase_server.models.database import User, GeneralBlob, UserProfile
+from sqlalchemy.orm import Session as OrmSession, sessionmaker
+from memobase_server.models.database import (
+    REG,
+    Project,
+    User,
+    GeneralBlob,
+    UserProfile,
+    UserEvent,
+    UserEventGist,
+    UserEventTag,
+    DEFAULT_PROJECT_ID,
+)
+from memobase_server.models.response import ImportData
+from memobase_server.controllers.bulk_import import (
+    IMPORT_RECORD,
+    ImportBatch,
+    write_import_batch,
+)
+from memobase_server.maintenance.partitions import (
+    setup_partitions,
+    ensure_partitions,
+    add_months,
+    list_partitions,
+    is_partitioned,
+    drop_expired_partitions,
+    partition_name,
+    month_start,
+)
 from memobase_server.models.blob import BlobType
+from memobase_server.llms.embeddings.utils import decode_embeddings
+from memobase_server.maintenance.embeddings import (
+    setup_embedding_storage,
+    embedding_column_types,
+)
+from memobase_server.maintenance.reembed import reembed_table, reembed_checkpoint_key
+from memobase_server.models.utils import Promise
+from memobase_server.utils import binary_prefilter
+from memobase_server.env import CONFIG
 from memobase_server.connectors import (
     Session,
     DB_ENGINE,
+    get_redis_client,
+    create_missing_indexes,
 )
 
 
@@ -49,3 +93,582 @@ def test_general_blob_model(db_env):
         user = session.query(User).filter_by(id=test_user_id).first()
         session.delete(user)
         session.commit()
+
+
+def test_embedding_roundtrip(db_env):
+    vectors = np.random.randn(3, CONFIG.embedding_dim).astype(np.float32) * 1e-3
+    decoded = decode_embeddings(
+        [b64encode(vectors[0].astype("<f4").tobytes()).decode()]
+        + [v.tolist() for v in vectors[1:]]
+    )
+    assert decoded.dtype == np.float32
+    assert (decoded == vectors).all()
+
+    with Session() as session:
+        user = User(additional_fields={})
+        session.add(user)
+        session.commit()
+        event = UserEvent(event_data={}, user_id=user.id, embedding=decoded[0])
+        session.add(event)
+        session.commit()
+        session.expire_all()
+        stored = session.get(UserEvent, (event.id, event.project_id)).embedding
+        assert (np.asarray(stored, dtype=np.float32) == vectors[0]).all()
+        session.delete(user)
+        session.commit()
+
+
+def test_event_partitioning(db_env):
+    # Run the conversion in a scratch schema so the shared tables stay untouched
+    schema = f"test_partitions_{uuid4().hex[:8]}"
+    engine = create_engine(
+        DB_ENGINE.url, connect_args={"options": f"-csearch_path={schema},public"}
+    )
+    with engine.connect() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+        conn.commit()
+    now = datetime.now(timezone.utc)
+    try:
+        REG.metadata.create_all(engine, checkfirst=False)
+        with OrmSession(engine) as session:
+            Project.initialize_root_project(session)
+            user = User(additional_fields={})
+            session.add(user)
+            session.commit()
+            old_event = UserEvent(event_data={}, user_id=user.id)
+            session.add(old_event)
+            session.flush()
+            old_event.created_at = now - timedelta(days=400)
+            session.add(
+                UserEventGist(gist_data={}, event_id=old_event.id, user_id=user.id)
+            )
+            session.commit()
+            user_id, old_event_id = user.id, old_event.id
+
+            setup_partitions(session)
+            setup_partitions(session)
+            assert is_partitioned(session, "user_events")
+            assert is_partitioned(session, "user_event_gists")
+            partitions = dict(list_partitions(session, "user_events"))
+            assert {
+                "user_events_legacy",
+                "user_events_default",
+                partition_name("user_events", month_start(now)),
+            } <= set(partitions)
+
+            new_event = UserEvent(event_data={}, user_id=user_id)
+            session.add(new_event)
+            session.flush()
+            session.add(
+                UserEventTag(
+                    event_id=new_event.id, user_id=user_id, tag="mood", value="happy"
+                )
+            )
+            session.commit()
+            assert session.get(User, (user_id, user.project_id)).event_count == 1
+
+            # A row past the pre-created months lands in the default partition,
+            # creating its month later moves it out
+            future = add_months(month_start(now), 6)
+            future_event = UserEvent(event_data={}, user_id=user_id)
+            session.add(future_event)
+            session.flush()
+            future_event.created_at = future
+            session.commit()
+            assert (
+                session.execute(
+                    text("SELECT count(*) FROM user_events_default")
+                ).scalar()
+                == 1
+            )
+            assert partition_name("user_events", future) in ensure_partitions(
+                session, months_ahead=6
+            )
+            assert session.execute(
+                text("SELECT tableoid::regclass::text FROM user_events WHERE id = :id"),
+                {"id": future_event.id},
+            ).scalar() == partition_name("user_events", future)
+            assert session.get(User, (user_id, user.project_id)).event_count == 2
+            session.execute(
+                text("DELETE FROM user_events WHERE id = :id"), {"id": future_event.id}
+            )
+            session.commit()
+            assert session.execute(
+                text(
+                    "SELECT tableoid::regclass::text FROM user_events "
+                    "WHERE created_at > now() - interval '1 day'"
+                )
+            ).scalar() == partition_name("user_events", month_start(now))
+            plan = "\n".join(
+                session.execute(
+                    text("EXPLAIN SELECT * FROM user_events WHERE created_at > :since"),
+                    {"since": now - timedelta(days=30)},
+                ).scalars()
+            )
+            assert "user_events_legacy" not in plan
+
+            # Deleting an event still removes its gists without the FK
+            session.execute(
+                text("DELETE FROM user_events WHERE id = :id"), {"id": old_event_id}
+            )
+            session.commit()
+            assert (
+                session.execute(text("SELECT count(*) FROM user_event_gists")).scalar()
+                == 0
+            )
+
+            session.execute(
+                text("DELETE FROM user_events WHERE id = :id"), {"id": new_event.id}
+            )
+            session.commit()
+            assert (
+                session.execute(text("SELECT count(*) FROM user_event_tags")).scalar()
+                == 0
+            )
+            assert session.get(User, (user_id, user.project_id)).event_count == 0
+            session.add(UserEvent(event_data={}, user_id=user_id))
+            session.commit()
+
+            dropped = drop_expired_partitions(session, retention_days=365)
+            assert "user_events_legacy" in dropped
+            assert (
+                session.execute(text("SELECT count(*) FROM user_events")).scalar() == 1
+            )
+    finally:
+        with engine.connect() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+            conn.commit()
+        engine.dispose()
+
+
+def test_import_into_partitioned_tables(db_env):
+    schema = f"test_import_{uuid4().hex[:8]}"
+    engine = create_engine(
+        DB_ENGINE.url, connect_args={"options": f"-csearch_path={schema},public"}
+    )
+    with engine.connect() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+        conn.commit()
+    try:
+        REG.metadata.create_all(engine, checkfirst=False)
+        with OrmSession(engine) as session:
+            Project.initialize_root_project(session)
+            setup_partitions(session)
+        user_id, event_id = uuid4(), uuid4()
+        records = [
+            {"type": "user", "id": str(user_id)},
+            {
+                "type": "event",
+                "id": str(event_id),
+                "user_id": str(user_id),
+                "event_data": {"event_tip": "moved to Paris"},
+            },
+            {
+                "type": "gist",
+                "user_id": str(user_id),
+                "event_id": str(event_id),
+                "gist_data": {"content": "moved to Paris"},
+            },
+        ]
+        with patch(
+            "memobase_server.controllers.bulk_import.Session", sessionmaker(engine)
+        ):
+            for expected_events in (1, 0):
+                batch = ImportBatch()
+                for record in records:
+                    batch.add(IMPORT_RECORD.validate_python(record))
+                stats = ImportData()
+                write_import_batch(DEFAULT_PROJECT_ID, batch, stats)
+                assert stats.invalid == 0
+                assert stats.events == expected_events
+        # The replay skipped the event and user, the gist had no ID to match
+        with OrmSession(engine) as session:
+            assert (
+                session.execute(text("SELECT count(*) FROM user_events")).scalar() == 1
+            )
+            assert session.get(User, (user_id, DEFAULT_PROJECT_ID)).event_count == 1
+    finally:
+        with engine.connect() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+            conn.commit()
+        engine.dispose()
+
+
+def test_embedding_storage_conversion(db_env):
+    with Session() as session:
+        version = session.execute(
+            text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        ).scalar()
+    if tuple(int(v) for v in version.split(".")[:2]) < (0, 7):
+        pytest.skip("halfvec and binary_quantize need pgvector >= 0.7")
+
+    schema = f"test_embeddings_{uuid4().hex[:8]}"
+    engine = create_engine(
+        DB_ENGINE.url, connect_args={"options": f"-csearch_path={schema},public"}
+    )
+    with engine.connect() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+        conn.commit()
+    dim = CONFIG.embedding_dim
+    try:
+        REG.metadata.create_all(engine, checkfirst=False)
+        with OrmSession(engine) as session:
+            Project.initialize_root_project(session)
+            user = User(additional_fields={})
+            session.add(user)
+            session.commit()
+            near = UserEvent(
+                event_data={}, user_id=user.id, embedding=np.ones(dim, np.float32)
+            )
+            far = UserEvent(
+                event_data={}, user_id=user.id, embedding=-np.ones(dim, np.float32)
+            )
+            session.add_all([near, far])
+            session.commit()
+
+            assert setup_embedding_storage(session, "binary") == [
+                "user_events",
+                "user_event_gists",
+            ]
+            assert embedding_column_types(session, "user_events") == {
+                "embedding": f"halfvec({dim})",
+                "embedding_bit": f"bit({dim})",
+            }
+            assert setup_embedding_storage(session, "binary") == []
+
+            query_embedding = np.full(dim, 0.5, np.float32)
+            nearest = session.execute(
+                select(UserEvent.id).where(
+                    binary_prefilter(
+                        UserEvent,
+                        query_embedding,
+                        [UserEvent.user_id == user.id],
+                        1,
+                    )
+                )
+            ).scalars()
+            assert list(nearest) == [near.id]
+
+            assert setup_embedding_storage(session, "vector") == [
+                "user_events",
+                "user_event_gists",
+            ]
+            assert embedding_column_types(session, "user_events") == {
+                "embedding": f"vector({dim})"
+            }
+    finally:
+        with engine.connect() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+            conn.commit()
+        engine.dispose()
+
+
+def test_embedding_dim_reset(db_env, monkeypatch):
+    schema = f"test_embedding_dim_{uuid4().hex[:8]}"
+    engine = create_engine(
+        DB_ENGINE.url, connect_args={"options": f"-csearch_path={schema},public"}
+    )
+    with engine.connect() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+        conn.commit()
+    dim = CONFIG.embedding_dim
+    try:
+        REG.metadata.create_all(engine, checkfirst=False)
+        with OrmSession(engine) as session:
+            for table in ["user_events", "user_event_gists"]:
+                session.execute(
+                    text(f"ALTER TABLE {table} ALTER COLUMN embedding TYPE vector(8)")
+                )
+            Project.initialize_root_project(session)
+            session.add(User(additional_fields={}))
+            session.commit()
+            session.execute(text("""
+                INSERT INTO user_events (id, project_id, user_id, event_data, embedding)
+                SELECT gen_random_uuid(), project_id, id, '{}', '[1,1,1,1,1,1,1,1]'
+                FROM users
+                """))
+            session.commit()
+
+            # Refused by default, the dimension check reports it instead
+            assert setup_embedding_storage(session, "vector") == []
+            monkeypatch.setattr(CONFIG, "embedding_reset_on_dim_change", True)
+            assert setup_embedding_storage(session, "vector") == [
+                "user_events",
+                "user_event_gists",
+            ]
+            assert embedding_column_types(session, "user_events") == {
+                "embedding": f"vector({dim})"
+            }
+            assert (
+                session.execute(
+                    text("SELECT count(*) FROM user_events WHERE embedding IS NULL")
+                ).scalar()
+                == 1
+            )
+    finally:
+        with engine.connect() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+            conn.commit()
+        engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_reembed_resumes(db_env):
+    project_id = f"test_reembed_{uuid4().hex[:8]}"
+    with Session() as session:
+        # The ORM refuses new projects, insert around it for an isolated scope
+        session.execute(
+            insert(Project).values(
+                id=uuid4(), project_id=project_id, project_secret="secret"
+            )
+        )
+        session.commit()
+        user = User(additional_fields={}, project_id=project_id)
+        session.add(user)
+        session.commit()
+        event = UserEvent(event_data={}, user_id=user.id, project_id=project_id)
+        session.add(event)
+        session.commit()
+        session.add_all(
+            [
+                UserEventGist(
+                    gist_data={"content": f"- gist {i}"},
+                    event_id=event.id,
+                    user_id=user.id,
+                    project_id=project_id,
+                )
+                for i in range(5)
+            ]
+        )
+        session.commit()
+        user_id = user.id
+
+    calls = []
+
+    async def fake_get_embedding(project_id, texts, phase="document", model=None):
+        calls.append(len(texts))
+        if len(calls) == 2:
+            raise RuntimeError("interrupted")
+        return Promise.resolve(
+            np.full((len(texts), CONFIG.embedding_dim), len(calls), np.float32)
+        )
+
+    with patch("memobase_server.maintenance.reembed.get_embedding", fake_get_embedding):
+        with pytest.raises(RuntimeError):
+            await reembed_table(
+                "user_event_gists",
+                project_id=project_id,
+                batch_size=2,
+                concurrency=1,
+                restart=True,
+            )
+        async with get_redis_client() as redis_client:
+            assert await redis_client.exists(
+                reembed_checkpoint_key("user_event_gists", False, project_id)
+            )
+            assert not await redis_client.exists(
+                reembed_checkpoint_key("user_event_gists", False)
+            )
+        stats = await reembed_table(
+            "user_event_gists", project_id=project_id, batch_size=2, concurrency=1
+        )
+    assert stats == {"table": "user_event_gists", "updated": 3, "failed": 0}
+    # The first window was checkpointed, the resumed run starts after it
+    assert calls == [2, 2, 2, 1]
+
+    with Session() as session:
+        embeddings = session.execute(
+            select(UserEventGist.embedding)
+            .where(UserEventGist.project_id == project_id)
+            .order_by(UserEventGist.id)
+        ).scalars()
+        assert [float(e[0]) for e in embeddings] == [1, 1, 3, 3, 4]
+        session.delete(session.get(User, (user_id, project_id)))
+        session.execute(delete(Project).where(Project.project_id == project_id))
+        session.commit()
+
+
+@pytest.mark.parametrize(
+    "table_name,extra_filter,order,index_name",
+    [
+        (
+            "user_events",
+            "",
+            "created_at DESC, id DESC",
+            "idx_user_events_user_id_project_id_created_at",
+        ),
+        (
+            "user_event_gists",
+            "",
+            "created_at DESC, id DESC",
+            "idx_user_event_gists_user_id_project_id_created_at",
+        ),
+        (
+            "user_statuses",
+            "AND type = 'roleplay'",
+            "created_at DESC, id DESC",
+            "idx_user_statuses_user_id_type_created_at",
+        ),
+        (
+            "general_blobs",
+            "AND blob_type = 'chat'",
+            "created_at, id",
+            "idx_general_blobs_user_id_blob_type_created_at",
+        ),
+    ],
+)
+def test_recency_index_plans(db_env, table_name, extra_filter, order, index_name):
+    with Session() as session:
+        session.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = "\n".join(
+            session.execute(
+                text(f"""
+                EXPLAIN SELECT id FROM {table_name}
+                WHERE user_id = :user_id AND project_id = :project_id {extra_filter}
+                AND created_at > now() - interval '30 days'
+                ORDER BY {order} LIMIT 10
+                """),
+                {"user_id": uuid4(), "project_id": "__root__"},
+            ).scalars()
+        )
+        session.rollback()
+    # Partitions carry the index as `{partition}_{suffix}`
+    assert index_name.removeprefix(f"idx_{table_name}_") in plan
+    nodes = [line.strip().removeprefix("->").strip() for line in plan.splitlines()]
+    if not any(node.startswith(("Append", "Merge Append")) for node in nodes):
+        # The index order serves the ORDER BY directly
+        assert not any(node.startswith("Sort") for node in nodes)
+
+
+def test_create_missing_indexes_lock(db_env):
+    import threading
+
+    schema = f"test_indexes_{uuid4().hex[:8]}"
+    engine = create_engine(
+        DB_ENGINE.url, connect_args={"options": f"-csearch_path={schema},public"}
+    )
+    index_name = "idx_user_events_user_id_project_id"
+    lock = text("SELECT pg_advisory_lock(hashtext('create_missing_indexes'))")
+    unlock = text("SELECT pg_advisory_unlock(hashtext('create_missing_indexes'))")
+
+    def has_index():
+        with engine.connect() as conn:
+            return index_name in {
+                i["name"] for i in inspect(conn).get_indexes("user_events")
+            }
+
+    with engine.connect() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+        conn.commit()
+    try:
+        REG.metadata.create_all(engine, checkfirst=False)
+        with engine.connect() as conn:
+            conn.execute(text(f"DROP INDEX {index_name}"))
+            conn.commit()
+        with engine.connect() as holder:
+            holder.execute(lock)
+            # Another worker is building, this one waits its turn
+            worker = threading.Thread(target=create_missing_indexes, args=(engine,))
+            worker.start()
+            worker.join(0.5)
+            assert worker.is_alive() and not has_index()
+            holder.execute(unlock)
+            holder.commit()
+        worker.join(30)
+        assert not worker.is_alive() and has_index()
+    finally:
+        with engine.connect() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+            conn.commit()
+        engine.dispose()
+
+
+def test_search_vector_opt_in(db_env):
+    schema = f"test_search_vector_{uuid4().hex[:8]}"
+    engine = create_engine(
+        DB_ENGINE.url, connect_args={"options": f"-csearch_path={schema},public"}
+    )
+
+    def columns():
+        with engine.connect() as conn:
+            return {c["name"] for c in inspect(conn).get_columns("user_event_gists")}
+
+    with engine.connect() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+        conn.commit()
+    try:
+        REG.metadata.create_all(engine, checkfirst=False)
+        # A table from before lexical search
+        with engine.connect() as conn:
+            conn.execute(text("ALTER TABLE user_event_gists DROP COLUMN search_vector"))
+            conn.commit()
+        with OrmSession(engine) as session:
+            assert not UserEventGist.install_search_vector(session)
+        assert "search_vector" not in columns()
+        # Startup leaves its index for the maintenance command
+        create_missing_indexes(engine)
+
+        with OrmSession(engine) as session:
+            assert UserEventGist.install_search_vector(session, add_column=True)
+            assert UserEventGist.install_search_vector(session)
+        create_missing_indexes(engine)
+        assert "search_vector" in columns()
+        with engine.connect() as conn:
+            indexes = {i["name"] for i in inspect(conn).get_indexes("user_event_gists")}
+        assert "idx_user_event_gists_search_vector" in indexes
+    finally:
+        with engine.connect() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+            conn.commit()
+        engine.dispose()
+
+
+def test_event_tags_backfill(db_env):
+    schema = f"test_tags_{uuid4().hex[:8]}"
+    engine = create_engine(
+        DB_ENGINE.url, connect_args={"options": f"-csearch_path={schema},public"}
+    )
+    with engine.connect() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+        conn.commit()
+    try:
+        REG.metadata.create_all(engine, checkfirst=False)
+        with OrmSession(engine) as session:
+            Project.initialize_root_project(session)
+            user = User(additional_fields={})
+            session.add(user)
+            session.commit()
+            old, new = [
+                UserEvent(
+                    event_data={"event_tags": [{"tag": "mood", "value": value}]},
+                    user_id=user.id,
+                )
+                for value in ["sad", "happy"]
+            ]
+            session.add_all([old, new])
+            session.commit()
+            # Written with its tags after the table existed
+            session.add(
+                UserEventTag(
+                    event_id=new.id, user_id=user.id, tag="mood", value="happy"
+                )
+            )
+            session.commit()
+
+            def tags():
+                return sorted(
+                    session.execute(select(UserEventTag.value)).scalars().all()
+                )
+
+            UserEventTag.backfill(session)
+            assert tags() == ["happy", "sad"]
+            # Done once, later startups skip it
+            session.execute(delete(UserEventTag))
+            session.commit()
+            UserEventTag.backfill(session)
+            assert tags() == []
+    finally:
+        with engine.connect() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+            conn.commit()
+        engine.dispose()
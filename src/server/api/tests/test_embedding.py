@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+import numpy as np
+from memobase_server.llms.embeddings.batcher import EmbeddingBatcher
+from memobase_server.llms.embeddings.local_embedding import fit_embedding_dim
+from memobase_server.env import Config
+
+
+@pytest.mark.asyncio
+async def test_embedding_batcher_coalesces():
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return np.array([[len(t)] for t in texts], dtype=np.float32)
+
+    batcher = EmbeddingBatcher(embed, max_batch_size=4, max_wait_ms=50)
+    results = await asyncio.gather(
+        *[batcher.embed(["x" * i]) for i in range(1, 6)], batcher.embed(["ab", "abc"])
+    )
+    for i, r in enumerate(results[:5], start=1):
+        assert r.tolist() == [[i]]
+    assert results[5].tolist() == [[2], [3]]
+    # Cut at max_batch_size, then the rest in one more batch
+    assert [len(c) for c in calls] == [4, 3]
+
+
+@pytest.mark.asyncio
+async def test_embedding_batcher_propagates_errors():
+    def embed(texts):
+        raise RuntimeError("model failed")
+
+    batcher = EmbeddingBatcher(embed, max_wait_ms=10)
+    results = await asyncio.gather(
+        batcher.embed(["a"]), batcher.embed(["b"]), return_exceptions=True
+    )
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+    batcher.embed_fn = lambda texts: np.zeros((len(texts), 2), dtype=np.float32)
+    assert (await batcher.embed(["c"])).shape == (1, 2)
+
+
+def test_fit_embedding_dim():
+    vectors = np.array([[3, 4, 12], [1, 0, 0]], dtype=np.float32)
+    assert fit_embedding_dim(vectors, 3) is vectors
+    fitted = fit_embedding_dim(vectors, 2, matryoshka=True)
+    assert np.allclose(fitted, [[0.6, 0.8], [1, 0]])
+    with pytest.raises(ValueError):
+        fit_embedding_dim(vectors, 4, matryoshka=True)
+    # Slicing the vectors of other models ruins retrieval
+    with pytest.raises(ValueError):
+        fit_embedding_dim(vectors, 2)
+
+
+def test_local_embedding_config():
+    config = Config(
+        llm_api_key="secret",
+        embedding_provider="local",
+        embedding_model="text-embedding-3-small",
+    )
+    assert config.embedding_model == "BAAI/bge-small-en-v1.5"
+    assert config.embedding_dim == 384
+    with pytest.raises(AssertionError, match="set embedding_dim to 384"):
+        Config(
+            llm_api_key="secret",
+            embedding_provider="local",
+            embedding_model="BAAI/bge-small-en-v1.5",
+            embedding_dim=256,
+        )
+    config = Config(
+        llm_api_key="secret",
+        embedding_provider="local",
+        embedding_model="nomic-ai/nomic-embed-text-v1.5",
+        embedding_dim=256,
+    )
+    assert config.embedding_dim == 256
+
+
+@pytest.mark.asyncio
+async def test_openai_embedding_encoding(monkeypatch):
+    from base64 import b64encode
+    from types import SimpleNamespace
+    from memobase_server.env import CONFIG
+    from importlib import import_module
+
+    module = import_module("memobase_server.llms.embeddings.openai_embedding")
+
+    vector = np.array([0.5, -1.25], dtype="<f4")
+    requests = []
+
+    async def create(**kwargs):
+        requests.append(kwargs["encoding_format"])
+        embedding = (
+            b64encode(vector.tobytes()).decode()
+            if kwargs["encoding_format"] == "base64"
+            else vector.tolist()
+        )
+        return SimpleNamespace(
+            data=[SimpleNamespace(embedding=embedding)],
+            usage=SimpleNamespace(prompt_tokens=1, total_tokens=1),
+        )
+
+    client = SimpleNamespace(embeddings=SimpleNamespace(create=create))
+    monkeypatch.setattr(module, "get_openai_async_client_instance", lambda: client)
+    assert CONFIG.embedding_encoding == "float"
+    for encoding in ["float", "base64"]:
+        monkeypatch.setattr(CONFIG, "embedding_encoding", encoding)
+        result = await module.openai_embedding("model", ["text"])
+        assert result.tolist() == [vector.tolist()]
+    assert requests == ["float", "base64"]